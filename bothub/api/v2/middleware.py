@@ -1,5 +1,17 @@
+import json
+import logging
+import threading
+
+import elasticapm
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.utils import translation
 
+from bothub.api.v2.profiling import QueryProfile, get_view_name
+from bothub.authentication.cache import UserAuthorizationsMemo
+
+logger = logging.getLogger(__name__)
+
 
 class UserLanguageMiddleware:
     def __init__(self, get_response):
@@ -19,3 +31,74 @@ class UserLanguageMiddleware:
         response = self.get_response(request)
 
         return response
+
+
+class UserAuthorizationsMemoMiddleware:
+    """
+    Memoizes the user authorizations resolved during each request, so the
+    permissions and serializers checking them again do not hit the cache
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with UserAuthorizationsMemo():
+            return self.get_response(request)
+
+
+class QueryProfilerMiddleware:
+    """
+    Profiles the SQL queries, elasticsearch requests and response size of
+    each request (QUERY_PROFILER), reporting them as APM labels and, with
+    QUERY_PROFILER_REPORT, as JSON lines appended to that file.
+    """
+
+    report_lock = threading.Lock()
+
+    def __init__(self, get_response):
+        if not settings.QUERY_PROFILER:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryProfile() as profile:
+            response = self.get_response(request)
+
+        view_name, query_budget = getattr(request, "profiled_view", (None, None))
+        if view_name is None:
+            return response
+
+        entry = {
+            "view": view_name,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "response_size": None if response.streaming else len(response.content),
+            **profile.as_dict(),
+            "query_budget": query_budget,
+            "over_budget": query_budget is not None
+            and profile.query_count > query_budget,
+        }
+        self.report(entry)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profiled_view = get_view_name(view_func, request.method)
+
+    def report(self, entry):
+        elasticapm.label(
+            db_query_count=entry["query_count"],
+            db_duplicate_queries=entry["duplicate_queries"],
+            db_time_ms=entry["db_time_ms"],
+            es_requests=entry["es_requests"],
+            response_size=entry["response_size"],
+        )
+        if entry["over_budget"]:
+            logger.warning(
+                f"{entry['view']} made {entry['query_count']} queries, "
+                f"budget of {entry['query_budget']}"
+            )
+        if settings.QUERY_PROFILER_REPORT:
+            with self.report_lock, open(settings.QUERY_PROFILER_REPORT, "a") as report:
+                report.write(json.dumps(entry) + "\n")
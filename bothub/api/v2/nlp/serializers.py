@@ -1,7 +1,15 @@
+from collections import Counter
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
 
+from bothub.celery import app as celery_app
+from bothub.common.reports import increment_reports
 from bothub.common.models import (
     QAKnowledgeBase,
     QALogs,
@@ -16,6 +24,15 @@ class NLPSerializer(serializers.Serializer):
     pass
 
 
+class RepositoryUpdateInterpretersChangedSerializer(serializers.Serializer):
+    version_languages = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False
+    )
+    # Only the version languages trained after it, all of them when not given
+    since = serializers.DateTimeField(required=False)
+    rasa_version = serializers.CharField(default=settings.BOTHUB_NLP_RASA_VERSION)
+
+
 class RepositoryNLPLogIntentSerializer(serializers.ModelSerializer):
     class Meta:
         model = RepositoryNLPLogIntent
@@ -68,6 +85,109 @@ class RepositoryNLPLogSerializer(serializers.ModelSerializer):
         return instance
 
 
+class RepositoryNLPLogListSerializer(serializers.ListSerializer):
+    """
+    Saves a batch of logs with bulk inserts: the intents are inserted together,
+    the reports are incremented with a single upsert and the logs are indexed in
+    Elasticsearch with one bulk request, instead of the per log signals.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list) and len(data) > settings.NLP_LOG_BATCH_MAX_SIZE:
+            raise serializers.ValidationError(
+                {
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        _("Send at most {} logs per request.").format(
+                            settings.NLP_LOG_BATCH_MAX_SIZE
+                        )
+                    ]
+                },
+                code="max_length",
+            )
+        attrs = super().to_internal_value(data)
+
+        # Resolves the related objects of the whole batch with one query each
+        version_languages = RepositoryVersionLanguage.objects.in_bulk(
+            {log.get("repository_version_language") for log in attrs}
+        )
+        authorizations = RepositoryAuthorization.objects.in_bulk(
+            {log.get("user") for log in attrs}
+        )
+
+        errors = []
+        for log in attrs:
+            log_errors = {}
+            version_language = version_languages.get(
+                log.get("repository_version_language")
+            )
+            if version_language is None:
+                log_errors["repository_version_language"] = [
+                    _("Invalid pk - object does not exist.")
+                ]
+            authorization = authorizations.get(log.get("user"))
+            if authorization is None:
+                log_errors["user"] = [_("Invalid pk - object does not exist.")]
+            errors.append(log_errors)
+            log.update(
+                {"repository_version_language": version_language, "user": authorization}
+            )
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        logs = []
+        logs_intents = []
+        for data in validated_data:
+            repository_auth = data.pop("user")
+            if str(repository_auth.pk) in settings.REPOSITORY_BLOCK_USER_LOGS:
+                continue
+            logs_intents.append(data.pop("log_intent", []))
+            logs.append(RepositoryNLPLog(user_id=repository_auth.user_id, **data))
+
+        if not logs:
+            return logs
+
+        report_date = timezone.now().date()
+        with transaction.atomic():
+            RepositoryNLPLog.objects.bulk_create(logs)
+            RepositoryNLPLogIntent.objects.bulk_create(
+                [
+                    RepositoryNLPLogIntent(repository_nlp_log=log, **intent)
+                    for log, intents in zip(logs, logs_intents)
+                    for intent in intents
+                ]
+            )
+            increment_reports(
+                Counter(
+                    (log.repository_version_language_id, log.user_id, report_date)
+                    for log in logs
+                )
+            )
+
+            if settings.USE_ELASTICSEARCH:
+                nlp_log_ids = [log.pk for log in logs]
+                transaction.on_commit(
+                    lambda: celery_app.send_task(
+                        "es_handle_nlp_logs",
+                        args=[nlp_log_ids],
+                        queue=settings.ELASTICSEARCH_CUSTOM_QUEUE,
+                    )
+                )
+
+        return logs
+
+
+class RepositoryNLPLogBatchSerializer(RepositoryNLPLogSerializer):
+    class Meta(RepositoryNLPLogSerializer.Meta):
+        list_serializer_class = RepositoryNLPLogListSerializer
+
+    # Resolved in bulk by RepositoryNLPLogListSerializer.validate
+    repository_version_language = serializers.IntegerField(write_only=True)
+    user = serializers.UUIDField(write_only=True)
+
+
 class RepositoryQANLPLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = QALogs
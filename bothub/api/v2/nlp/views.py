@@ -1,30 +1,48 @@
 import base64
+import hashlib
+import io
+import json
+from datetime import timedelta
+from urllib.parse import urlencode
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
+from django.http import Http404, HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import parse_etags
 from django.utils.translation import gettext_lazy as _
 from rest_framework import exceptions
-from rest_framework import mixins, pagination
+from rest_framework import mixins, pagination, status
 from rest_framework.decorators import action
-from rest_framework.exceptions import PermissionDenied, ValidationError as DRFValidationError
+from rest_framework.exceptions import (
+    NotFound,
+    PermissionDenied,
+    ValidationError as DRFValidationError,
+)
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
 from bothub.api.v2.nlp.serializers import (
     NLPSerializer,
+    RepositoryNLPLogBatchSerializer,
     RepositoryNLPLogSerializer,
     RepositoryQANLPLogSerializer,
+    RepositoryUpdateInterpretersChangedSerializer,
 )
 from bothub.api.v2.knowledge_base.serializers import QAtextSerializer
 
 from bothub.authentication.authorization import NLPAuthentication
+from bothub.authentication.cache import get_cached_authorization
 from bothub.authentication.models import User
 from bothub.common import languages
+from bothub.common.artifacts import get_artifact_store
 from bothub.common.models import (
     QALogs,
+    Repository,
     RepositoryAuthorization,
     RepositoryVersion,
     RepositoryVersionLanguage,
@@ -44,12 +62,55 @@ def check_auth(request):
     try:
         auth = request.META.get("HTTP_AUTHORIZATION").split()
         auth = auth[1]
-        return RepositoryAuthorization.objects.get(uuid=auth)
+        return get_cached_authorization(auth)
     except Exception:
         msg = _("Invalid token header.")
         raise exceptions.AuthenticationFailed(msg)
 
 
+def get_url_authorization(request, pk):
+    """
+    Resolved authorization of the token of the URL, taken from the cache like
+    the one of the header, so nothing is loaded before it is checked
+    """
+    check_auth(request)
+    try:
+        return get_cached_authorization(pk)
+    except (RepositoryAuthorization.DoesNotExist, ValidationError, ValueError):
+        raise Http404
+
+
+def get_authorization_repository(repository_authorization):
+    return get_object_or_404(Repository, pk=repository_authorization.repository_id)
+
+
+def interpreter_etag(total_training_end, training_end_at, rasa_version):
+    """
+    ETag of the interpreter of a version language, it changes on each
+    training. Weak, the URL of the model may differ between the responses.
+    """
+    trained_at = training_end_at.timestamp() if training_end_at else ""
+    digest = hashlib.sha1(
+        f"{total_training_end}:{trained_at}:{rasa_version}".encode()
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(etag, if_none_match):
+    """Weak comparison of ``etag`` with the ones of an If-None-Match header"""
+    etags = parse_etags(if_none_match or "")
+    return "*" in etags or etag.replace("W/", "", 1) in [
+        tag.replace("W/", "", 1) for tag in etags
+    ]
+
+
+def stream_rasa_training_data(examples):
+    yield '{"rasa_nlu_data": {"common_examples": ['
+    for index, example in enumerate(examples):
+        yield ("," if index else "") + json.dumps(example)
+    yield "]}}"
+
+
 class NLPPagination(pagination.PageNumberPagination):
     page_size = 200
 
@@ -64,19 +125,19 @@ class RepositoryAuthorizationTrainViewSet(
     authentication_classes = [NLPAuthentication]
 
     def retrieve(self, request, *args, **kwargs):
-        check_auth(request)
-        repository_auth = self.get_object()
+        repository_auth = get_url_authorization(request, kwargs.get("pk"))
 
         if not repository_auth.can_contribute:
             raise PermissionDenied()
 
+        repository = get_authorization_repository(repository_auth)
         repository_version = request.query_params.get("repository_version")
         if repository_version:
-            current_version = repository_auth.repository.get_specific_version_id(
+            current_version = repository.get_specific_version_id(
                 repository_version, str(request.query_params.get("language"))
             )
         else:
-            current_version = repository_auth.repository.current_version(
+            current_version = repository.current_version(
                 str(request.query_params.get("language"))
             )
 
@@ -84,7 +145,7 @@ class RepositoryAuthorizationTrainViewSet(
             {
                 "ready_for_train": current_version.ready_for_train,
                 "current_version_id": current_version.id,
-                "repository_authorization_user_id": repository_auth.user.id,
+                "repository_authorization_user_id": repository_auth.user_id,
                 "language": current_version.language,
                 "algorithm": current_version.repository_version.repository.algorithm,
                 "use_name_entities": current_version.repository_version.repository.use_name_entities,
@@ -130,6 +191,36 @@ class RepositoryAuthorizationTrainViewSet(
 
         return self.get_paginated_response(examples_return)
 
+    @action(detail=True, methods=["GET"], url_name="export_examples", lookup_field=[])
+    def export_examples(self, request, **kwargs):
+        """
+        Streams every training example of the version language in a single
+        response, as one JSON object per line or, with output=rasa, as a rasa
+        NLU training data document.
+        """
+        repository_authorization = check_auth(request)
+
+        if not repository_authorization.can_contribute:
+            raise PermissionDenied()
+
+        version_language = get_object_or_404(
+            RepositoryVersionLanguage,
+            pk=request.query_params.get("repository_version"),
+            repository_version__repository_id=repository_authorization.repository_id,
+        )
+        examples = version_language.training_examples(
+            intent=request.query_params.get("intent")
+        )
+
+        if request.query_params.get("output") == "rasa":
+            return StreamingHttpResponse(
+                stream_rasa_training_data(examples), content_type="application/json"
+            )
+        return StreamingHttpResponse(
+            (json.dumps(example) + "\n" for example in examples),
+            content_type="application/x-ndjson",
+        )
+
     @action(detail=True, methods=["POST"], url_name="save_queue_id", lookup_field=[])
     def save_queue_id(self, request, **kwargs):
         repository_authorization = check_auth(request)
@@ -217,12 +308,12 @@ class RepositoryAuthorizationTrainLanguagesViewSet(
     authentication_classes = [NLPAuthentication]
 
     def retrieve(self, request, *args, **kwargs):
-        check_auth(request)
-        repository_authorization = self.get_object()
+        repository_authorization = get_url_authorization(request, kwargs.get("pk"))
 
         if not repository_authorization.can_contribute:
             raise PermissionDenied()
 
+        repository = get_authorization_repository(repository_authorization)
         repository_version = request.query_params.get("repository_version")
 
         response = []
@@ -230,19 +321,17 @@ class RepositoryAuthorizationTrainLanguagesViewSet(
         for language in settings.SUPPORTED_LANGUAGES:
 
             if repository_version:
-                current_version = repository_authorization.repository.get_specific_version_id(
+                current_version = repository.get_specific_version_id(
                     repository_version, language
                 )
             else:
-                current_version = repository_authorization.repository.current_version(
-                    language
-                )
+                current_version = repository.current_version(language)
 
             if current_version.ready_for_train:
                 response.append(
                     {
                         "current_version_id": current_version.id,
-                        "repository_authorization_user_id": repository_authorization.user.id,
+                        "repository_authorization_user_id": repository_authorization.user_id,
                         "language": current_version.language,
                         "algorithm": current_version.repository_version.repository.algorithm,
                         "use_name_entities": current_version.repository_version.repository.use_name_entities,
@@ -261,10 +350,8 @@ class RepositoryAuthorizationParseViewSet(mixins.RetrieveModelMixin, GenericView
     authentication_classes = []
 
     def retrieve(self, request, *args, **kwargs):
-        check_auth(request)
-        repository_authorization = self.get_object()
-
-        repository = repository_authorization.repository
+        repository_authorization = get_url_authorization(request, kwargs.get("pk"))
+        repository = get_authorization_repository(repository_authorization)
 
         language = request.query_params.get("language")
         repository_version = request.query_params.get("repository_version")
@@ -326,9 +413,8 @@ class RepositoryAuthorizationInfoViewSet(mixins.RetrieveModelMixin, GenericViewS
     authentication_classes = []
 
     def retrieve(self, request, *args, **kwargs):
-        check_auth(request)
-        repository_authorization = self.get_object()
-        repository = repository_authorization.repository
+        repository_authorization = get_url_authorization(request, kwargs.get("pk"))
+        repository = get_authorization_repository(repository_authorization)
 
         repository_version = request.query_params.get("repository_version")
         repository_version_language = request.query_params.get(
@@ -359,14 +445,13 @@ class RepositoryAuthorizationInfoViewSet(mixins.RetrieveModelMixin, GenericViewS
 
     @action(detail=True, methods=["GET"], url_name="get_current_configuration")
     def get_current_configuration(self, request, **kwargs):
-        check_auth(request)
-        repository_authorization = self.get_object()
-        repository = repository_authorization.repository
+        repository_authorization = get_url_authorization(request, kwargs.get("pk"))
+        repository = get_authorization_repository(repository_authorization)
 
         return Response(
             {
                 "language": repository.language,
-                "user_id": repository_authorization.user.pk,
+                "user_id": repository_authorization.user_id,
                 "algorithm": repository.algorithm,
                 "use_name_entities": repository.use_name_entities,
                 "use_competing_intents": repository.use_competing_intents,
@@ -382,13 +467,12 @@ class RepositoryAuthorizationEvaluateViewSet(mixins.RetrieveModelMixin, GenericV
     authentication_classes = [NLPAuthentication]
 
     def retrieve(self, request, *args, **kwargs):
-        check_auth(request)
-        repository_authorization = self.get_object()
+        repository_authorization = get_url_authorization(request, kwargs.get("pk"))
 
         if not repository_authorization.can_contribute:
             raise PermissionDenied()
 
-        repository = repository_authorization.repository
+        repository = get_authorization_repository(repository_authorization)
 
         repository_version = request.query_params.get("repository_version")
 
@@ -406,7 +490,7 @@ class RepositoryAuthorizationEvaluateViewSet(mixins.RetrieveModelMixin, GenericV
                 "update": False if update is None else True,
                 "repository_version": update.pk,
                 "language": update.language,
-                "user_id": repository_authorization.user.pk,
+                "user_id": repository_authorization.user_id,
                 "algorithm": update.algorithm,
                 "use_name_entities": update.use_name_entities,
                 "use_competing_intents": update.use_competing_intents,
@@ -578,8 +662,7 @@ class RepositoryAuthorizationAutomaticEvaluateViewSet(
     authentication_classes = [NLPAuthentication]
 
     def retrieve(self, request, *args, **kwargs):
-        check_auth(request)
-        repository_authorization = self.get_object()
+        repository_authorization = get_url_authorization(request, kwargs.get("pk"))
 
         if not repository_authorization.can_contribute:
             raise PermissionDenied()
@@ -587,7 +670,7 @@ class RepositoryAuthorizationAutomaticEvaluateViewSet(
         language = request.query_params.get("language")
         repository_version = request.query_params.get("repository_version")
 
-        repository = repository_authorization.repository
+        repository = get_authorization_repository(repository_authorization)
 
         if repository_version:
             repository_version_language = repository.get_specific_version_id(
@@ -610,7 +693,7 @@ class RepositoryAuthorizationAutomaticEvaluateViewSet(
             {
                 "language": repository.language,
                 "repository_version_language_id": repository_version_language.pk,
-                "user_id": repository_authorization.user.pk,
+                "user_id": repository_authorization.user_id,
                 "algorithm": repository.algorithm,
                 "use_name_entities": repository.use_name_entities,
                 "use_competing_intents": repository.use_competing_intents,
@@ -655,6 +738,15 @@ class RepositoryUpdateInterpretersViewSet(
         )
         no_bot_data = request.query_params.get("no_bot_data")
 
+        etag = interpreter_etag(
+            update.total_training_end, update.training_end_at, rasa_version
+        )
+        if etag_matches(etag, request.headers.get("If-None-Match")):
+            # Not trained since, the trainer is not even loaded
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+
         validator = URLValidator()
         aws = False
 
@@ -669,14 +761,29 @@ class RepositoryUpdateInterpretersViewSet(
                 }
             )
 
-        try:
-            validator(str(update.get_trainer(rasa_version).bot_data))
-            bot_data = update.get_trainer(rasa_version).bot_data
+        trainer = update.get_trainer(rasa_version)
+        store = get_artifact_store()
+        if trainer.bot_data_sha256 and store:
+            bot_data = store.url(trainer.bot_data_sha256) or (
+                request.build_absolute_uri(
+                    reverse(
+                        "repository-nlp-update-interpreters-bot-data",
+                        kwargs={"pk": update.pk},
+                    )
+                )
+                + "?"
+                + urlencode({"rasa_version": rasa_version})
+            )
             aws = True
-        except ValidationError:
-            bot_data = update.get_trainer(rasa_version).bot_data
-        except Exception:
-            bot_data = b""
+        else:
+            try:
+                validator(str(trainer.bot_data))
+                bot_data = trainer.bot_data
+                aws = True
+            except ValidationError:
+                bot_data = trainer.bot_data
+            except Exception:
+                bot_data = b""
 
         return Response(
             {
@@ -685,10 +792,92 @@ class RepositoryUpdateInterpretersViewSet(
                 "total_training_end": update.total_training_end,
                 "language": update.language,
                 "bot_data": str(bot_data),
+                "bot_data_sha256": trainer.bot_data_sha256,
                 "from_aws": aws,
+            },
+            headers={"ETag": etag},
+        )
+
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_name="changed",
+        serializer_class=RepositoryUpdateInterpretersChangedSerializer,
+    )
+    def changed(self, request, **kwargs):
+        """
+        Which of the given version languages were trained since ``since``,
+        with the ETag retrieve would answer for each of them, in a single
+        query. ``checked_at`` is the ``since`` of the next call, moved back by
+        INTERPRETERS_CHANGED_MARGIN as training_end_at is set before the
+        training is committed; the versions seen again keep their ETag.
+        """
+        check_auth(request)
+
+        serializer = RepositoryUpdateInterpretersChangedSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        checked_at = timezone.now() - timedelta(
+            seconds=settings.INTERPRETERS_CHANGED_MARGIN
+        )
+        updates = RepositoryVersionLanguage.objects.filter(
+            pk__in=data.get("version_languages"), training_end_at__isnull=False
+        )
+        if data.get("since"):
+            updates = updates.filter(training_end_at__gt=data.get("since"))
+
+        return Response(
+            {
+                "checked_at": checked_at,
+                "changed": [
+                    {
+                        "version_id": pk,
+                        "total_training_end": total_training_end,
+                        "training_end_at": training_end_at,
+                        "etag": interpreter_etag(
+                            total_training_end,
+                            training_end_at,
+                            data.get("rasa_version"),
+                        ),
+                    }
+                    for pk, total_training_end, training_end_at in updates.order_by(
+                        "pk"
+                    ).values_list("pk", "total_training_end", "training_end_at")
+                ],
             }
         )
 
+    @action(detail=True, methods=["GET"], url_path="bot_data", url_name="bot-data")
+    def bot_data(self, request, **kwargs):
+        """
+        Streams the trained model kept in the artifact store, its sha256 is
+        the ETag so the NLP can skip downloading a model it already has
+        """
+        check_auth(request)
+
+        update = self.get_object()
+        trainer = update.get_trainer(
+            request.query_params.get("rasa_version", settings.BOTHUB_NLP_RASA_VERSION)
+        )
+        store = get_artifact_store()
+        if not trainer.bot_data_sha256 or not store:
+            raise NotFound()
+
+        etag = f'"{trainer.bot_data_sha256}"'
+        if etag_matches(etag, request.headers.get("If-None-Match")):
+            response = HttpResponseNotModified()
+        else:
+            response = StreamingHttpResponse(
+                store.iter_chunks(trainer.bot_data_sha256),
+                content_type="application/gzip",
+            )
+            size = store.size(trainer.bot_data_sha256)
+            if size is not None:
+                response["Content-Length"] = size
+        response["ETag"] = etag
+        return response
+
     def create(self, request, *args, **kwargs):
         repository_authorization = check_auth(request)
 
@@ -700,7 +889,13 @@ class RepositoryUpdateInterpretersViewSet(
             "rasa_version", settings.BOTHUB_NLP_RASA_VERSION
         )
         repository = get_object_or_404(RepositoryVersionLanguage, pk=id)
-        if settings.AWS_SEND:
+        store = get_artifact_store()
+        if store:
+            bot_data = base64.b64decode(request.data.get("bot_data"))
+            repository.save_training(
+                "", rasa_version, bot_data_sha256=store.put(io.BytesIO(bot_data))
+            )
+        elif settings.AWS_SEND:
             bot_data = base64.b64decode(request.data.get("bot_data"))
             repository.save_training(send_bot_data_file_aws(id, bot_data), rasa_version)
         else:
@@ -714,6 +909,23 @@ class RepositoryNLPLogsViewSet(mixins.CreateModelMixin, GenericViewSet):
     permission_classes = [AllowAny]
     authentication_classes = [NLPAuthentication]
 
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_name="batch",
+        serializer_class=RepositoryNLPLogBatchSerializer,
+    )
+    def batch(self, request, **kwargs):
+        """
+        Saves a list of logs at once, with the same fields of the create
+        """
+        serializer = RepositoryNLPLogBatchSerializer(
+            data=request.data, many=True, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        logs = serializer.save()
+        return Response({"count": len(logs)}, status=status.HTTP_201_CREATED)
+
 
 class RepositoryQANLPLogsViewSet(mixins.CreateModelMixin, GenericViewSet):
     queryset = QALogs.objects
@@ -731,12 +943,11 @@ class RepositoryAuthorizationKnowledgeBaseViewSet(
     authentication_classes = [NLPAuthentication]
 
     def retrieve(self, request, *args, **kwargs):
-        check_auth(request)
-        repository_authorization = self.get_object()
+        repository_authorization = get_url_authorization(request, kwargs.get("pk"))
         if not repository_authorization.can_contribute:
             raise PermissionDenied()
 
-        repository = repository_authorization.repository
+        repository = get_authorization_repository(repository_authorization)
 
         knowledge_base_pk = request.query_params.get("knowledge_base_id")
         language = request.query_params.get("language")
@@ -771,19 +982,19 @@ class RepositoryAuthorizationExamplesViewSet(mixins.RetrieveModelMixin, GenericV
     authentication_classes = [NLPAuthentication]
 
     def retrieve(self, request, *args, **kwargs):
-        check_auth(request)
-        repo_authorization = self.get_object()
+        repo_authorization = get_url_authorization(request, kwargs.get("pk"))
 
         if not repo_authorization.can_contribute:
             raise PermissionDenied()
 
+        repository = get_authorization_repository(repo_authorization)
         repository_version = request.query_params.get("repository_version")
         if repository_version:
-            current_version = repo_authorization.repository.get_specific_version_id(
+            current_version = repository.get_specific_version_id(
                 repository_version, str(request.query_params.get("language"))
             )
         else:
-            current_version = repo_authorization.repository.current_version(
+            current_version = repository.current_version(
                 str(request.query_params.get("language"))
             )
 
@@ -0,0 +1,196 @@
+import functools
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.db import connections
+
+_local = threading.local()
+
+# Lists of placeholders change with the number of values, "IN (%s, %s)" and
+# "IN (%s)" are the same query for the duplicates detection
+_PLACEHOLDERS_LIST = re.compile(r"\bIN \((?:\s*%s\s*,)*\s*%s\s*\)")
+
+
+def query_signature(sql):
+    return _PLACEHOLDERS_LIST.sub("IN (%s, ...)", sql)
+
+
+def _active_profiles():
+    if not hasattr(_local, "profiles"):
+        _local.profiles = []
+    return _local.profiles
+
+
+def _install_elasticsearch_hook():
+    """
+    Counts the requests made by the elasticsearch client, every client (and
+    thread) goes through Transport.perform_request.
+    """
+    from elasticsearch import Transport
+
+    if getattr(Transport.perform_request, "profiled", False):
+        return
+
+    perform_request = Transport.perform_request
+
+    @functools.wraps(perform_request)
+    def profiled_perform_request(*args, **kwargs):
+        for profile in _active_profiles():
+            profile.es_requests += 1
+        return perform_request(*args, **kwargs)
+
+    profiled_perform_request.profiled = True
+    Transport.perform_request = profiled_perform_request
+
+
+class QueryProfile:
+    """
+    Records the SQL queries (and their time) and the elasticsearch requests
+    made in the current thread while it is active, it is used as a context
+    manager:
+
+        with QueryProfile() as profile:
+            ...
+        profile.query_count, profile.duplicates
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.es_requests = 0
+        self.elapsed = 0
+        self._exit_stack = None
+        self._started_at = None
+
+    def __enter__(self):
+        _install_elasticsearch_hook()
+        self._exit_stack = ExitStack()
+        for connection in connections.all():
+            self._exit_stack.enter_context(connection.execute_wrapper(self._execute))
+        _active_profiles().append(self)
+        self._started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.elapsed = time.perf_counter() - self._started_at
+        _active_profiles().remove(self)
+        self._exit_stack.close()
+
+    def _execute(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started_at))
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    @property
+    def db_time(self):
+        return sum(duration for sql, duration in self.queries)
+
+    @property
+    def duplicates(self):
+        """
+        {signature: count} of the queries ran more than once, usually a query
+        made per item of a list (N+1)
+        """
+        counts = Counter(query_signature(sql) for sql, duration in self.queries)
+        return {
+            signature: count for signature, count in counts.most_common() if count > 1
+        }
+
+    def as_dict(self):
+        duplicates = self.duplicates
+        return {
+            "query_count": self.query_count,
+            "duplicate_queries": sum(duplicates.values()) - len(duplicates),
+            "duplicates": [
+                {"sql": signature, "count": count}
+                for signature, count in list(duplicates.items())[:10]
+            ],
+            "db_time_ms": round(self.db_time * 1000, 2),
+            "es_requests": self.es_requests,
+            "elapsed_ms": round(self.elapsed * 1000, 2),
+        }
+
+
+def get_view_name(view_func, method):
+    """
+    Name of the view ("module.ViewSet.action" for viewsets) handling the
+    request and its declared query budget, if any
+    """
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return f"{view_func.__module__}.{view_func.__name__}", None
+
+    name = f"{view_class.__module__}.{view_class.__name__}"
+    action = (getattr(view_func, "actions", None) or {}).get(method.lower())
+    if action is None:
+        return name, getattr(view_class, "query_budget", None)
+    return f"{name}.{action}", (getattr(view_class, "query_budgets", None) or {}).get(
+        action
+    )
+
+
+def summarize(entries):
+    """
+    Aggregates the profiled requests, as written by QueryProfilerMiddleware,
+    by view
+    """
+    views = {}
+    for entry in entries:
+        view = views.setdefault(
+            entry["view"],
+            {
+                "requests": 0,
+                "query_count_max": 0,
+                "query_count_total": 0,
+                "duplicate_queries_max": 0,
+                "db_time_ms_total": 0,
+                "es_requests_total": 0,
+                "response_size_max": 0,
+                "query_budget": entry.get("query_budget"),
+                "over_budget": 0,
+                "duplicates": Counter(),
+            },
+        )
+        view["requests"] += 1
+        view["query_count_max"] = max(view["query_count_max"], entry["query_count"])
+        view["query_count_total"] += entry["query_count"]
+        view["duplicate_queries_max"] = max(
+            view["duplicate_queries_max"], entry["duplicate_queries"]
+        )
+        view["db_time_ms_total"] += entry["db_time_ms"]
+        view["es_requests_total"] += entry["es_requests"]
+        view["response_size_max"] = max(
+            view["response_size_max"], entry.get("response_size") or 0
+        )
+        view["over_budget"] += int(bool(entry.get("over_budget")))
+        for duplicate in entry.get("duplicates", []):
+            view["duplicates"][duplicate["sql"]] = max(
+                view["duplicates"][duplicate["sql"]], duplicate["count"]
+            )
+
+    for view in views.values():
+        view["query_count_mean"] = round(
+            view.pop("query_count_total") / view["requests"], 2
+        )
+        view["db_time_ms_mean"] = round(
+            view.pop("db_time_ms_total") / view["requests"], 2
+        )
+        view["duplicates"] = [
+            {"sql": sql, "count": count}
+            for sql, count in view["duplicates"].most_common(10)
+        ]
+    return dict(
+        sorted(
+            views.items(),
+            key=lambda item: item[1]["query_count_max"],
+            reverse=True,
+        )
+    )
@@ -0,0 +1,384 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, Manager
+from django.utils.functional import cached_property
+from rest_framework import serializers
+
+from bothub.common.models import (
+    QAKnowledgeBase,
+    Repository,
+    RepositoryEntity,
+    RepositoryEntityGroup,
+    RepositoryEvaluate,
+    RepositoryExample,
+    RepositoryIntent,
+    RepositoryScore,
+    RepositoryTranslatedExample,
+    RepositoryVersionLanguage,
+)
+
+
+class RepositoryVersionAggregates:
+    """
+    Counts and lists shown for a repository version (intents, entities,
+    groups, languages...) computed for every serialized version at once, with
+    one grouped query per kind of data instead of queries per intent/group.
+    """
+
+    context_key = "repository_version_aggregates"
+
+    def __init__(self, repository_versions):
+        self.repository_versions = {
+            repository_version.pk: repository_version
+            for repository_version in repository_versions
+        }
+
+    def __contains__(self, repository_version):
+        return repository_version.pk in self.repository_versions
+
+    @cached_property
+    def _examples(self):
+        return RepositoryExample.objects.filter(
+            repository_version_language__repository_version__in=list(
+                self.repository_versions
+            )
+        ).order_by()
+
+    @cached_property
+    def _intents_examples_count(self):
+        counts = defaultdict(dict)
+        for version_id, intent_id, count in self._examples.values_list(
+            "repository_version_language__repository_version", "intent"
+        ).annotate(count=Count("pk")):
+            counts[version_id][intent_id] = count
+        return counts
+
+    @cached_property
+    def _intents(self):
+        intents = defaultdict(list)
+        for intent in RepositoryIntent.objects.filter(
+            repository_version__in=list(self.repository_versions)
+        ):
+            intents[intent.repository_version_id].append(intent)
+        return intents
+
+    @cached_property
+    def _entities(self):
+        used_entities = set(
+            self._examples.exclude(entities__entity__value__isnull=True)
+            .values_list(
+                "repository_version_language__repository_version",
+                "entities__entity__value",
+            )
+            .distinct()
+        )
+        entities = defaultdict(list)
+        for entity in RepositoryEntity.objects.filter(
+            repository_version__in=list(self.repository_versions)
+        ):
+            if (entity.repository_version_id, entity.value) in used_entities:
+                entities[entity.repository_version_id].append(entity)
+        return entities
+
+    @cached_property
+    def _groups(self):
+        groups = defaultdict(list)
+        for group in (
+            RepositoryEntityGroup.objects.filter(
+                repository_version__in=list(self.repository_versions)
+            )
+            .select_related("repository_version")
+            .prefetch_related("entities")
+        ):
+            groups[group.repository_version_id].append(group)
+        return groups
+
+    @cached_property
+    def _groups_examples_count(self):
+        """
+        Examples (one per entity marked) by entity group, None for the entities
+        without group, of each version
+        """
+        counts = defaultdict(dict)
+        for version_id, group_id, count in (
+            self._examples.filter(
+                entities__entity__repository_version=F(
+                    "repository_version_language__repository_version"
+                )
+            )
+            .values_list(
+                "repository_version_language__repository_version",
+                "entities__entity__group",
+            )
+            .annotate(count=Count("pk"))
+        ):
+            counts[version_id][group_id] = count
+        return counts
+
+    @cached_property
+    def _languages(self):
+        languages = defaultdict(set)
+        for version_id, language in self._examples.values_list(
+            "repository_version_language__repository_version",
+            "repository_version_language__language",
+        ).distinct():
+            languages[version_id].add(language)
+        for version_id, language in (
+            RepositoryTranslatedExample.objects.filter(
+                original_example__repository_version_language__repository_version__in=list(
+                    self.repository_versions
+                )
+            )
+            .values_list(
+                "original_example__repository_version_language__repository_version",
+                "language",
+            )
+            .distinct()
+            .order_by()
+        ):
+            languages[version_id].add(language)
+        return languages
+
+    @cached_property
+    def _evaluations_count(self):
+        counts = defaultdict(dict)
+        for version_id, language, count in (
+            RepositoryEvaluate.objects.filter(
+                repository_version_language__repository_version__in=list(
+                    self.repository_versions
+                )
+            )
+            .values_list(
+                "repository_version_language__repository_version",
+                "repository_version_language__language",
+            )
+            .annotate(count=Count("pk"))
+            .order_by()
+        ):
+            counts[version_id][language] = count
+        return counts
+
+    def examples_count(self, repository_version):
+        return sum(self._intents_examples_count[repository_version.pk].values())
+
+    def intents(self, repository_version):
+        counts = self._intents_examples_count[repository_version.pk]
+        return [
+            {
+                "value": intent.text,
+                "id": intent.pk,
+                "examples__count": counts.get(intent.pk, 0),
+            }
+            for intent in self._intents[repository_version.pk]
+        ]
+
+    def intents_list(self, repository_version):
+        counts = self._intents_examples_count[repository_version.pk]
+        return [
+            intent.text
+            for intent in self._intents[repository_version.pk]
+            if intent.pk in counts
+        ]
+
+    def entities(self, repository_version):
+        return [
+            {"value": entity.value, "id": entity.pk}
+            for entity in self._entities[repository_version.pk]
+        ]
+
+    def groups_list(self, repository_version):
+        return [group.value for group in self._groups[repository_version.pk]]
+
+    def groups(self, repository_version):
+        counts = self._groups_examples_count[repository_version.pk]
+        return [
+            {
+                "repository": group.repository_version.repository_id,
+                "value": group.value,
+                "group_id": group.pk,
+                "entities": [
+                    {"entity_id": entity.pk, "value": entity.value}
+                    for entity in group.entities.all()
+                ],
+                "examples__count": counts.get(group.pk, 0),
+            }
+            for group in self._groups[repository_version.pk]
+        ]
+
+    def other_group(self, repository_version):
+        return {
+            "repository": repository_version.repository_id,
+            "value": "other",
+            "entities": [
+                {"entity_id": entity.pk, "value": entity.value}
+                for entity in self._entities[repository_version.pk]
+                if entity.group_id is None
+            ],
+            "examples__count": self._groups_examples_count[repository_version.pk].get(
+                None, 0
+            ),
+        }
+
+    def available_languages(self, repository_version):
+        repository = repository_version.repository
+        if repository.repository_type == Repository.TYPE_CONTENT:
+            return repository.available_languages()
+        return list(self._languages[repository_version.pk] | {repository.language})
+
+    def evaluate_languages_count(self, repository_version):
+        counts = self._evaluations_count[repository_version.pk]
+        return {
+            language: counts.get(language, 0)
+            for language in self.available_languages(repository_version)
+        }
+
+
+class RepositoryAggregates:
+    """
+    Data of the default version of repositories shown in the repositories
+    lists, computed for every serialized repository at once.
+    """
+
+    context_key = "repository_aggregates"
+
+    def __init__(self, repositories):
+        self.repositories = {repository.pk: repository for repository in repositories}
+
+    def __contains__(self, repository):
+        return repository.pk in self.repositories
+
+    @cached_property
+    def _default_examples(self):
+        return RepositoryExample.objects.filter(
+            repository_version_language__repository_version__repository__in=list(
+                self.repositories
+            ),
+            repository_version_language__repository_version__is_default=True,
+        ).order_by()
+
+    @cached_property
+    def _formatted_intents(self):
+        intents = defaultdict(list)
+        for intent in (
+            self._default_examples.values(
+                "repository_version_language__repository_version__repository",
+                "intent__text",
+                "intent__pk",
+            )
+            .order_by("intent__pk")
+            .annotate(examples_count=Count("intent__pk"))
+        ):
+            intents[
+                intent["repository_version_language__repository_version__repository"]
+            ].append(
+                {
+                    "value": intent.get("intent__text"),
+                    "id": intent.get("intent__pk"),
+                    "examples__count": intent.get("examples_count"),
+                }
+            )
+        return intents
+
+    @cached_property
+    def _languages(self):
+        languages = defaultdict(set)
+        for repository_id, language in self._default_examples.values_list(
+            "repository_version_language__repository_version__repository",
+            "repository_version_language__language",
+        ).distinct():
+            languages[repository_id].add(language)
+        for repository_id, language in (
+            RepositoryTranslatedExample.objects.filter(
+                original_example__in=self._default_examples
+            )
+            .values_list(
+                "original_example__repository_version_language__repository_version__repository",
+                "language",
+            )
+            .distinct()
+            .order_by()
+        ):
+            languages[repository_id].add(language)
+        return languages
+
+    @cached_property
+    def _current_versions(self):
+        return {
+            version_language.repository_version.repository_id: version_language
+            for version_language in RepositoryVersionLanguage.objects.filter(
+                repository_version__repository__in=list(self.repositories),
+                repository_version__is_default=True,
+                language=F("repository_version__repository__language"),
+            ).select_related("repository_version")
+        }
+
+    @cached_property
+    def _scores(self):
+        return {
+            score.repository_id: score
+            for score in RepositoryScore.objects.filter(
+                repository__in=list(self.repositories)
+            )
+        }
+
+    @cached_property
+    def _knowledge_bases_count(self):
+        return dict(
+            QAKnowledgeBase.objects.filter(repository__in=list(self.repositories))
+            .values_list("repository")
+            .annotate(count=Count("pk"))
+            .order_by()
+        )
+
+    def formatted_intents(self, repository):
+        return self._formatted_intents[repository.pk]
+
+    def available_languages(self, repository):
+        if repository.repository_type == Repository.TYPE_CONTENT:
+            return repository.available_languages()
+        return list(self._languages[repository.pk] | {repository.language})
+
+    def current_version(self, repository):
+        version_language = self._current_versions.get(repository.pk)
+        if version_language is None:
+            # Creates the missing default version
+            version_language = repository.current_version()
+        return version_language
+
+    def repository_score(self, repository):
+        score = self._scores.get(repository.pk)
+        if score is None:
+            score, created = repository.repository_score.get_or_create()
+        return score
+
+    def count_knowledge_bases(self, repository):
+        return self._knowledge_bases_count.get(repository.pk, 0)
+
+
+class AggregatesSerializerMixin:
+    """
+    Gives the serializer fields access to the aggregates (``aggregates_class``)
+    of the serialized objects. They are kept in the serializer context, so a
+    view can precompute them, otherwise they are computed on first use for all
+    the objects of the list being serialized.
+    """
+
+    aggregates_class = None
+
+    def get_aggregated_object(self, obj):
+        return obj
+
+    def get_aggregates(self, obj):
+        aggregated = self.get_aggregated_object(obj)
+        aggregates = self.context.get(self.aggregates_class.context_key)
+        if aggregates is None or aggregated not in aggregates:
+            instances = [obj]
+            if isinstance(self.parent, serializers.ListSerializer) and not isinstance(
+                self.parent.instance, Manager
+            ):
+                instances = self.parent.instance
+            aggregates = self.aggregates_class(
+                self.get_aggregated_object(instance) for instance in instances
+            )
+            self.context[self.aggregates_class.context_key] = aggregates
+        return aggregates
@@ -0,0 +1,190 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from bothub.common.models import (
+    RepositoryEntity,
+    RepositoryExample,
+    RepositoryExampleEntity,
+    RepositoryIntent,
+    RepositoryVersionLanguage,
+    RepositoryVersionLanguageStats,
+)
+from bothub.common.tasks import handle_saves
+from .serializers import RepositoryExampleImportSerializer
+
+
+class ExamplesImporter:
+    """
+    Imports the examples of an uploaded file into a repository version in
+    batches of EXAMPLES_IMPORT_BATCH_SIZE: the intents and entities of a batch
+    are resolved and created together, the examples are written with
+    bulk_create and the version languages updated once per batch.
+
+    Examples whose text is already in the version language are not imported,
+    they are ``duplicated`` when they have the same intent and ``not_added``
+    (like the invalid ones) otherwise.
+    """
+
+    def __init__(self, repository_version, batch_size=None):
+        self.repository_version = repository_version
+        self.repository = repository_version.repository
+        self.batch_size = batch_size or settings.EXAMPLES_IMPORT_BATCH_SIZE
+        self.added = 0
+        self.duplicated = []
+        self.not_added = []
+        self._version_languages = {}
+        self._texts = {}
+        self._intents = None
+        self._entities = None
+
+    def run(self, examples):
+        batch = []
+        for example in examples:
+            batch.append(example)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+
+        if self.added:
+            RepositoryVersionLanguageStats.mark_dirty([self.repository_version.pk])
+        return self
+
+    def import_batch(self, batch):
+        valid = []
+        for example in batch:
+            serializer = RepositoryExampleImportSerializer(data=example)
+            if not serializer.is_valid():
+                self.not_added.append(example)
+                continue
+
+            data = serializer.validated_data
+            version_language = self.get_version_language(data.get("language"))
+            texts = self.get_texts(version_language)
+            if data["text"] in texts:
+                if texts[data["text"]] == data["intent"]:
+                    self.duplicated.append(example)
+                else:
+                    self.not_added.append(example)
+                continue
+
+            texts[data["text"]] = data["intent"]
+            valid.append((version_language, data))
+
+        if not valid:
+            return
+
+        intents = self.get_intents({data["intent"] for _, data in valid})
+        entities = self.get_entities(
+            {entity["entity"] for _, data in valid for entity in data["entities"]}
+        )
+        now = timezone.now()
+
+        with transaction.atomic():
+            examples = RepositoryExample.objects.bulk_create(
+                [
+                    RepositoryExample(
+                        repository_version_language=version_language,
+                        text=data["text"],
+                        intent_id=intents[data["intent"]],
+                        is_corrected=data["is_corrected"],
+                        last_update=now,
+                    )
+                    for version_language, data in valid
+                ]
+            )
+            RepositoryExampleEntity.objects.bulk_create(
+                [
+                    RepositoryExampleEntity(
+                        repository_example=example,
+                        start=entity["start"],
+                        end=entity["end"],
+                        entity_id=entities[entity["entity"]],
+                    )
+                    for example, (_, data) in zip(examples, valid)
+                    for entity in data["entities"]
+                ]
+            )
+            RepositoryVersionLanguage.objects.filter(
+                pk__in={version_language.pk for version_language, _ in valid}
+            ).update(last_update=now)
+
+            if settings.USE_ELASTICSEARCH:
+                # bulk_create doesn't send the signals that index the examples
+                example_ids = [example.pk for example in examples]
+                transaction.on_commit(
+                    lambda: handle_saves.apply_async(
+                        args=[
+                            {RepositoryExample._meta.label_lower: example_ids},
+                            time.time(),
+                        ],
+                        queue=settings.ELASTICSEARCH_CUSTOM_QUEUE,
+                    )
+                )
+
+        self.added += len(examples)
+
+    def get_version_language(self, language):
+        language = language or None
+        if language not in self._version_languages:
+            self._version_languages[language] = self.repository.get_specific_version_id(
+                repository_version=self.repository_version.pk, language=language
+            )
+        return self._version_languages[language]
+
+    def get_texts(self, version_language):
+        """
+        {text: intent} of the examples of ``version_language``, loaded once
+        and kept up to date with the imported ones
+        """
+        if version_language.pk not in self._texts:
+            self._texts[version_language.pk] = dict(
+                RepositoryExample.objects.filter(
+                    repository_version_language=version_language
+                ).values_list("text", "intent__text")
+            )
+        return self._texts[version_language.pk]
+
+    def get_intents(self, texts):
+        if self._intents is None:
+            self._intents = dict(
+                RepositoryIntent.objects.filter(
+                    repository_version=self.repository_version
+                ).values_list("text", "pk")
+            )
+        self._create_missing(RepositoryIntent, "text", texts, self._intents)
+        return self._intents
+
+    def get_entities(self, values):
+        if self._entities is None:
+            self._entities = dict(
+                RepositoryEntity.objects.filter(
+                    repository_version=self.repository_version
+                ).values_list("value", "pk")
+            )
+        self._create_missing(RepositoryEntity, "value", values, self._entities)
+        return self._entities
+
+    def _create_missing(self, model, field, values, pks):
+        missing = set(values) - pks.keys()
+        if not missing:
+            return
+
+        # Ignoring conflicts, they could be created by a concurrent request
+        model.objects.bulk_create(
+            [
+                model(repository_version=self.repository_version, **{field: value})
+                for value in missing
+            ],
+            ignore_conflicts=True,
+        )
+        pks.update(
+            model.objects.filter(
+                repository_version=self.repository_version,
+                **{f"{field}__in": missing},
+            ).values_list(field, "pk")
+        )
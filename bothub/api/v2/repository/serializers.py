@@ -1,5 +1,6 @@
 from bothub.common.documents.repositoryqanlplog import RepositoryQANLPLogDocument
 from django.conf import settings
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
@@ -12,6 +13,7 @@ from bothub import utils
 from bothub.api.v2.example.serializers import RepositoryExampleEntitySerializer
 from bothub.api.v2.fields import (
     EntityText,
+    EntityValueField,
     ModelMultipleChoiceField,
     RepositoryVersionRelatedField,
     TextField,
@@ -29,7 +31,6 @@ from bothub.common.models import (
     RepositoryCategory,
     RepositoryEntity,
     RepositoryEntityGroup,
-    RepositoryEvaluate,
     RepositoryExample,
     RepositoryExampleEntity,
     RepositoryIntent,
@@ -44,9 +45,13 @@ from bothub.common.models import (
     RepositoryVote,
     RequestRepositoryAuthorization,
     RepositoryVersionLanguage,
-    QAKnowledgeBase,
 )
 from bothub.utils import classifier_choice
+from .aggregates import (
+    AggregatesSerializerMixin,
+    RepositoryAggregates,
+    RepositoryVersionAggregates,
+)
 from .validators import (
     APIExceptionCustom,
     CanContributeInRepositoryValidator,
@@ -213,7 +218,9 @@ class RepositoryAuthorizationSerializer(serializers.ModelSerializer):
         return None
 
 
-class RepositoryTranslatorInfoSerializer(serializers.ModelSerializer):
+class RepositoryTranslatorInfoSerializer(
+    AggregatesSerializerMixin, serializers.ModelSerializer
+):
     class Meta:
         model = RepositoryTranslator
         fields = [
@@ -241,6 +248,8 @@ class RepositoryTranslatorInfoSerializer(serializers.ModelSerializer):
         read_only = fields
         ref_name = None
 
+    aggregates_class = RepositoryVersionAggregates
+
     repository_version_id = serializers.PrimaryKeyRelatedField(
         read_only=True,
         style={"show": False},
@@ -299,25 +308,16 @@ class RepositoryTranslatorInfoSerializer(serializers.ModelSerializer):
         LANGUAGE_CHOICES, label=_("Language"), source="language"
     )
 
+    def get_aggregated_object(self, obj):
+        return obj.repository_version_language.repository_version
+
     def get_entities(self, obj):
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=obj.repository_version_language.repository_version
-        )
-        return (
-            obj.repository_version_language.repository_version.current_entities(
-                queryset=queryset,
-                version_default=obj.repository_version_language.repository_version.is_default,
-            )
-            .values("value", "id")
-            .distinct()
-        )
+        repository_version = self.get_aggregated_object(obj)
+        return self.get_aggregates(obj).entities(repository_version)
 
     def get_groups_list(self, obj):
-        return (
-            obj.repository_version_language.repository_version.groups.distinct()
-            .values_list("value", flat=True)
-            .distinct()
-        )
+        repository_version = self.get_aggregated_object(obj)
+        return self.get_aggregates(obj).groups_list(repository_version)
 
     def get_owner(self, obj):
         return {
@@ -326,120 +326,32 @@ class RepositoryTranslatorInfoSerializer(serializers.ModelSerializer):
         }
 
     def get_intents(self, obj):
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=obj.repository_version_language.repository_version
-        )
-
+        repository_version = self.get_aggregated_object(obj)
         return IntentSerializer(
-            map(
-                lambda intent: {
-                    "value": intent.text,
-                    "id": intent.pk,
-                    "examples__count": obj.repository_version_language.repository_version.repository.examples(
-                        queryset=queryset,
-                        version_default=obj.repository_version_language.repository_version.is_default,
-                    )
-                    .filter(intent=intent)
-                    .count(),
-                },
-                obj.repository_version_language.repository_version.version_intents.all(),
-            ),
-            many=True,
+            self.get_aggregates(obj).intents(repository_version), many=True
         ).data
 
     def get_intents_list(self, obj):
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=obj.repository_version_language.repository_version
-        )
-        return obj.repository_version_language.repository_version.repository.intents(
-            queryset=queryset,
-            version_default=obj.repository_version_language.repository_version.is_default,
-        )
+        repository_version = self.get_aggregated_object(obj)
+        return self.get_aggregates(obj).intents_list(repository_version)
 
     def get_categories_list(self, obj):
         return RepositoryCategorySerializer(
-            obj.repository_version_language.repository_version.repository.categories,
+            obj.repository_version_language.repository_version.repository.categories.all(),
             many=True,
         ).data
 
     def get_groups(self, obj):
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=obj.repository_version_language.repository_version
-        )
-
-        current_groups = (
-            obj.repository_version_language.repository_version.groups.distinct()
-        )
-
-        return list(
-            map(
-                lambda group: {
-                    "repository": group.repository_version.repository.pk,
-                    "value": group.value,
-                    "group_id": group.pk,
-                    "entities": list(
-                        map(
-                            lambda e: {"entity_id": e.pk, "value": e.value},
-                            group.other_entities(
-                                queryset=queryset,
-                                version_default=obj.repository_version_language.repository_version.is_default,
-                            )
-                            if group.value == "other"
-                            else group.entities.all(),
-                        )
-                    ),
-                    "examples__count": (
-                        group.repository.examples(
-                            queryset=queryset,
-                            version_default=obj.repository_version_language.repository_version.is_default,
-                        )
-                        .filter(entities__entity__in=group.other_entities())
-                        .count()
-                    )
-                    if group.value == "other"
-                    else group.examples(
-                        queryset=queryset,
-                        version_default=obj.repository_version_language.repository_version.is_default,
-                    ).count(),
-                },
-                current_groups,
-            )
-        )
+        repository_version = self.get_aggregated_object(obj)
+        return self.get_aggregates(obj).groups(repository_version)
 
     def get_other_group(self, obj):
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=obj.repository_version_language.repository_version
-        )
-
-        group = obj.repository_version_language.repository_version.other_entities(
-            queryset=queryset,
-            version_default=obj.repository_version_language.repository_version.is_default,
-        )
-
-        return {
-            "repository": obj.repository_version_language.repository_version.repository.pk,
-            "value": "other",
-            "entities": list(
-                map(lambda e: {"entity_id": e.pk, "value": e.value}, group)
-            ),
-            "examples__count": (
-                obj.repository_version_language.repository_version.repository.examples(
-                    queryset=queryset,
-                    version_default=obj.repository_version_language.repository_version.is_default,
-                )
-                .filter(entities__entity__in=group)
-                .count()
-            ),
-        }
+        repository_version = self.get_aggregated_object(obj)
+        return self.get_aggregates(obj).other_group(repository_version)
 
     def get_examples__count(self, obj):
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=obj.repository_version_language.repository_version
-        )
-        return obj.repository_version_language.repository_version.repository.examples(
-            queryset=queryset,
-            version_default=obj.repository_version_language.repository_version.is_default,
-        ).count()
+        repository_version = self.get_aggregated_object(obj)
+        return self.get_aggregates(obj).examples_count(repository_version)
 
     def get_absolute_url(self, obj):
         return (
@@ -447,7 +359,7 @@ class RepositoryTranslatorInfoSerializer(serializers.ModelSerializer):
         )
 
 
-class NewRepositorySerializer(serializers.ModelSerializer):
+class NewRepositorySerializer(AggregatesSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = RepositoryVersion
         fields = [
@@ -510,6 +422,8 @@ class NewRepositorySerializer(serializers.ModelSerializer):
         ]
         ref_name = None
 
+    aggregates_class = RepositoryVersionAggregates
+
     repository_version_id = serializers.PrimaryKeyRelatedField(
         read_only=True, style={"show": False}, source="pk"
     )
@@ -622,46 +536,35 @@ class NewRepositorySerializer(serializers.ModelSerializer):
     )
 
     def get_authorizations(self, obj):
-        auths = RepositoryAuthorization.objects.filter(
-            repository=obj.repository
-        ).exclude(role=RepositoryAuthorization.ROLE_NOT_SETTED)
+        auths = list(
+            RepositoryAuthorization.objects.filter(repository=obj.repository)
+            .exclude(role=RepositoryAuthorization.ROLE_NOT_SETTED)
+            .select_related("user")
+        )
         return {
-            "count": auths.count(),
+            "count": len(auths),
             "users": [
                 {"nickname": i.user.nickname, "name": i.user.name} for i in auths
             ],
         }
 
     def get_ready_for_parse(self, obj):
-        q = (
-            RepositoryNLPTrain.objects.filter(
-                repositoryversionlanguage__repository_version=obj
-            )
-            .exclude(bot_data__isnull=True)
-            .exclude(bot_data__exact="")
+        q = RepositoryNLPTrain.objects.filter(
+            repositoryversionlanguage__repository_version=obj
+        ).exclude(
+            Q(bot_data__isnull=True) | Q(bot_data__exact=""),
+            bot_data_sha256__exact="",
         )
-        return True if q.count() > 0 else False
+        return q.exists()
 
     def get_available_languages(self, obj):
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=obj
-        )
-        return obj.repository.available_languages(
-            queryset=queryset, version_default=obj.is_default
-        )
+        return self.get_aggregates(obj).available_languages(obj)
 
     def get_entities(self, obj):
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=obj
-        )
-        return (
-            obj.current_entities(queryset=queryset, version_default=obj.is_default)
-            .values("value", "id")
-            .distinct()
-        )
+        return self.get_aggregates(obj).entities(obj)
 
     def get_groups_list(self, obj):
-        return obj.groups.distinct().values_list("value", flat=True).distinct()
+        return self.get_aggregates(obj).groups_list(obj)
 
     def get_owner(self, obj):
         return {
@@ -670,124 +573,27 @@ class NewRepositorySerializer(serializers.ModelSerializer):
         }
 
     def get_intents(self, obj):
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=obj
-        )
-
-        return IntentSerializer(
-            map(
-                lambda intent: {
-                    "value": intent.text,
-                    "id": intent.pk,
-                    "examples__count": obj.repository.examples(
-                        queryset=queryset, version_default=obj.is_default
-                    )
-                    .filter(intent=intent)
-                    .count(),
-                },
-                obj.version_intents.all(),
-            ),
-            many=True,
-        ).data
+        return IntentSerializer(self.get_aggregates(obj).intents(obj), many=True).data
 
     def get_intents_list(self, obj):
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=obj
-        )
-        return obj.repository.intents(queryset=queryset, version_default=obj.is_default)
+        return self.get_aggregates(obj).intents_list(obj)
 
     def get_categories_list(self, obj):
-        return RepositoryCategorySerializer(obj.repository.categories, many=True).data
+        return RepositoryCategorySerializer(
+            obj.repository.categories.all(), many=True
+        ).data
 
     def get_groups(self, obj):
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=obj
-        )
-
-        current_groups = obj.groups.distinct()
-
-        return list(
-            map(
-                lambda group: {
-                    "repository": group.repository_version.repository.pk,
-                    "value": group.value,
-                    "group_id": group.pk,
-                    "entities": list(
-                        map(
-                            lambda e: {"entity_id": e.pk, "value": e.value},
-                            group.other_entities(
-                                queryset=queryset, version_default=obj.is_default
-                            )
-                            if group.value == "other"
-                            else group.entities.all(),
-                        )
-                    ),
-                    "examples__count": (
-                        group.repository.examples(
-                            queryset=queryset, version_default=obj.is_default
-                        )
-                        .filter(entities__entity__in=group.other_entities())
-                        .count()
-                    )
-                    if group.value == "other"
-                    else group.examples(
-                        queryset=queryset, version_default=obj.is_default
-                    ).count(),
-                },
-                current_groups,
-            )
-        )
+        return self.get_aggregates(obj).groups(obj)
 
     def get_other_group(self, obj):
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=obj
-        )
-
-        group = obj.other_entities(queryset=queryset, version_default=obj.is_default)
-
-        return {
-            "repository": obj.repository.pk,
-            "value": "other",
-            "entities": list(
-                map(lambda e: {"entity_id": e.pk, "value": e.value}, group)
-            ),
-            "examples__count": (
-                obj.repository.examples(
-                    queryset=queryset, version_default=obj.is_default
-                )
-                .filter(entities__entity__in=group)
-                .count()
-            ),
-        }
+        return self.get_aggregates(obj).other_group(obj)
 
     def get_examples__count(self, obj):
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=obj
-        )
-        return obj.repository.examples(
-            queryset=queryset, version_default=obj.is_default
-        ).count()
+        return self.get_aggregates(obj).examples_count(obj)
 
     def get_evaluate_languages_count(self, obj):
-        queryset = RepositoryEvaluate.objects.filter(
-            repository_version_language__repository_version=obj
-        )
-        return dict(
-            map(
-                lambda x: (
-                    x,
-                    obj.repository.evaluations(
-                        language=x, queryset=queryset, version_default=obj.is_default
-                    ).count(),
-                ),
-                obj.repository.available_languages(
-                    queryset=RepositoryExample.objects.filter(
-                        repository_version_language__repository_version=obj
-                    ),
-                    version_default=obj.is_default,
-                ),
-            )
-        )
+        return self.get_aggregates(obj).evaluate_languages_count(obj)
 
     def get_absolute_url(self, obj):
         return obj.repository.get_absolute_url()
@@ -902,7 +708,7 @@ class RepositoryTrainInfoSerializer(serializers.ModelSerializer):
     languages_warnings = serializers.ListField(source="warnings")
 
 
-class RepositorySerializer(serializers.ModelSerializer):
+class RepositorySerializer(AggregatesSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Repository
         fields = [
@@ -932,6 +738,8 @@ class RepositorySerializer(serializers.ModelSerializer):
         read_only = ["uuid", "created_at"]
         ref_name = None
 
+    aggregates_class = RepositoryAggregates
+
     uuid = serializers.UUIDField(style={"show": False}, read_only=True)
     slug = serializers.SlugField(style={"show": False}, read_only=True)
     repository_type = serializers.ChoiceField(
@@ -946,6 +754,7 @@ class RepositorySerializer(serializers.ModelSerializer):
         default=Repository.ALGORITHM_TRANSFORMER_NETWORK_DIET_BERT,
         label=_("Algorithm"),
     )
+    available_languages = serializers.SerializerMethodField(style={"show": False})
     intents = serializers.SerializerMethodField(style={"show": False})
     use_competing_intents = serializers.BooleanField(
         style={"show": False, "only_settings": True},
@@ -1039,25 +848,30 @@ class RepositorySerializer(serializers.ModelSerializer):
 
         return repository
 
+    def get_available_languages(self, obj):
+        return self.get_aggregates(obj).available_languages(obj)
+
     def get_intents(self, obj):
-        return obj.get_formatted_intents()
+        return self.get_aggregates(obj).formatted_intents(obj)
 
     def get_categories_list(self, obj):
-        return RepositoryCategorySerializer(obj.categories, many=True).data
+        return RepositoryCategorySerializer(obj.categories.all(), many=True).data
 
     def get_version_default(self, obj):
+        current_version = self.get_aggregates(obj).current_version(obj)
         return {
-            "id": obj.current_version().repository_version.pk,
-            "repository_version_language_id": obj.current_version().pk,
-            "name": obj.current_version().repository_version.name,
+            "id": current_version.repository_version.pk,
+            "repository_version_language_id": current_version.pk,
+            "name": current_version.repository_version.name,
         }
 
     def get_repository_score(self, obj):
-        score, created = obj.repository_score.get_or_create()
-        return RepositoryScoreSerializer(score).data
+        return RepositoryScoreSerializer(
+            self.get_aggregates(obj).repository_score(obj)
+        ).data
 
     def get_count_knowledge_bases(self, obj):
-        return QAKnowledgeBase.objects.filter(repository=obj).count()
+        return self.get_aggregates(obj).count_knowledge_bases(obj)
 
 
 class RepositoryPermissionSerializer(serializers.ModelSerializer):
@@ -1131,7 +945,7 @@ class RepositoryVotesSerializer(serializers.ModelSerializer):
         return vote
 
 
-class ShortRepositorySerializer(serializers.ModelSerializer):
+class ShortRepositorySerializer(AggregatesSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Repository
         fields = [
@@ -1158,6 +972,8 @@ class ShortRepositorySerializer(serializers.ModelSerializer):
         read_only = fields
         ref_name = None
 
+    aggregates_class = RepositoryAggregates
+
     categories = RepositoryCategorySerializer(many=True, read_only=True)
     categories_list = serializers.SlugRelatedField(
         source="categories", slug_field="name", many=True, read_only=True
@@ -1166,31 +982,37 @@ class ShortRepositorySerializer(serializers.ModelSerializer):
         source="owner", slug_field="nickname", read_only=True
     )
     absolute_url = serializers.SerializerMethodField()
+    available_languages = serializers.SerializerMethodField(style={"show": False})
     intents = serializers.SerializerMethodField(style={"show": False})
     votes = RepositoryVotesSerializer(many=True, read_only=True)
     version_default = serializers.SerializerMethodField(style={"show": False})
     repository_score = serializers.SerializerMethodField(style={"show": False})
     count_knowledge_bases = serializers.SerializerMethodField(style={"show": False})
 
+    def get_available_languages(self, obj):
+        return self.get_aggregates(obj).available_languages(obj)
+
     def get_intents(self, obj):
-        return obj.get_formatted_intents()
+        return self.get_aggregates(obj).formatted_intents(obj)
 
     def get_absolute_url(self, obj):
         return obj.get_absolute_url()
 
     def get_version_default(self, obj):
+        current_version = self.get_aggregates(obj).current_version(obj)
         return {
-            "id": obj.current_version().repository_version.pk,
-            "repository_version_language_id": obj.current_version().pk,
-            "name": obj.current_version().repository_version.name,
+            "id": current_version.repository_version.pk,
+            "repository_version_language_id": current_version.pk,
+            "name": current_version.repository_version.name,
         }
 
     def get_repository_score(self, obj):
-        score, created = obj.repository_score.get_or_create()
-        return RepositoryScoreSerializer(score).data
+        return RepositoryScoreSerializer(
+            self.get_aggregates(obj).repository_score(obj)
+        ).data
 
     def get_count_knowledge_bases(self, obj):
-        return QAKnowledgeBase.objects.filter(repository=obj).count()
+        return self.get_aggregates(obj).count_knowledge_bases(obj)
 
 
 class RepositoryContributionsSerializer(serializers.ModelSerializer):
@@ -1520,6 +1342,36 @@ class RepositoryUpload(serializers.Serializer):
     pass
 
 
+class RepositoryExampleImportEntitySerializer(serializers.Serializer):
+    start = serializers.IntegerField(min_value=0)
+    end = serializers.IntegerField(min_value=0)
+    entity = EntityValueField()
+
+
+class RepositoryExampleImportSerializer(serializers.Serializer):
+    """
+    Validates an example of an uploaded file, it has the same rules of
+    RepositoryExampleSerializer but no database lookups, the repository,
+    version and permissions are checked once for the whole file.
+    """
+
+    text = EntityText(
+        validators=[
+            ExampleTextHasLettersValidator(),
+            ExampleTextHasLimitedWordsValidator(),
+        ],
+    )
+    intent = serializers.CharField(
+        max_length=RepositoryIntent._meta.get_field("text").max_length,
+        validators=[IntentValidator()],
+    )
+    language = serializers.ChoiceField(
+        languages.LANGUAGE_CHOICES, allow_blank=True, required=False
+    )
+    is_corrected = serializers.BooleanField(default=False)
+    entities = RepositoryExampleImportEntitySerializer(many=True)
+
+
 class RepositoryNLPLogSerializer(DocumentSerializer):
     class Meta:
         document = RepositoryNLPLogDocument
@@ -1622,6 +1474,8 @@ class RepositoryQueueTaskSerializer(serializers.ModelSerializer):
             "from_queue_codes",
             "type_processing",
             "processing_codes",
+            "total",
+            "processed",
         ]
         ref_name = None
 
@@ -1,9 +1,12 @@
 import json
 import uuid
 
+from celery.result import AsyncResult
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
@@ -64,9 +67,16 @@ from bothub.common.models import (
     RepositoryVersionLanguage,
     Organization,
 )
-from bothub.common.usecase.repositorylog.export import ExportRepositoryLogUseCase
+from bothub.common.usecase.repositorylog.export import (
+    EXPORT_CONTENT_TYPES,
+    EXPORT_TASK_CACHE_KEY,
+)
+from bothub.storage import get_storage
+from bothub.utils import iter_json_array
 
 from ..metadata import Metadata
+from .aggregates import RepositoryAggregates
+from .importer import ExamplesImporter
 from .filters import (
     RepositoriesFilter,
     RepositoryAuthorizationFilter,
@@ -153,6 +163,8 @@ class NewRepositoryViewSet(
     serializer_class = NewRepositorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly, RepositoryInfoPermission]
     metadata_class = Metadata
+    # Maximum number of queries by action, see QueryProfilerMiddleware
+    query_budgets = {"retrieve": 31, "languagesstatus": 20}
 
     @action(
         detail=True,
@@ -488,7 +500,11 @@ class RepositoryTrainInfoViewSet(
 
 
 class RepositoryTranslatorInfoViewSet(mixins.RetrieveModelMixin, GenericViewSet):
-    queryset = RepositoryTranslator.objects
+    queryset = RepositoryTranslator.objects.select_related(
+        "repository_version_language__repository_version__repository__owner"
+    ).prefetch_related(
+        "repository_version_language__repository_version__repository__categories"
+    )
     lookup_field = "uuid"
     serializer_class = RepositoryTranslatorInfoSerializer
     authentication_classes = [TranslatorAuthentication]
@@ -511,6 +527,7 @@ class RepositoryViewSet(
     serializer_class = RepositorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly, RepositoryPermission]
     metadata_class = Metadata
+    query_budgets = {"languagesstatus": 20}
 
     @method_decorator(name="list", decorator=swagger_auto_schema(deprecated=True))
     @action(
@@ -875,7 +892,13 @@ class RepositoriesViewSet(mixins.ListModelMixin, GenericViewSet):
     """
 
     serializer_class = ShortRepositorySerializer
-    queryset = Repository.objects.all().publics().order_by_relevance()
+    queryset = (
+        Repository.objects.all()
+        .publics()
+        .order_by_relevance()
+        .select_related("owner")
+        .prefetch_related("categories", "votes")
+    )
     filter_class = RepositoriesFilter
     filter_backends = [DjangoFilterBackend, SearchFilter]
     search_fields = ["$name", "^name", "=name"]
@@ -903,7 +926,14 @@ class RepositoriesViewSet(mixins.ListModelMixin, GenericViewSet):
                 authorizations__uuid__in=authorizations
             )
 
-        serialized_data = ShortRepositorySerializer(repositories, many=True)
+        repositories = repositories.select_related("owner").prefetch_related(
+            "categories", "votes"
+        )
+        serialized_data = ShortRepositorySerializer(
+            repositories,
+            many=True,
+            context={RepositoryAggregates.context_key: RepositoryAggregates(repositories)},
+        )
         return Response(serialized_data.data)
 
 
@@ -1228,40 +1258,30 @@ class RepositoryExampleViewSet(
         except DjangoValidationError:
             raise PermissionDenied()
 
+        if repository_version.repository_id != repository.pk:
+            raise PermissionDenied()
+
         user_authorization = repository.get_user_authorization(request.user)
         if not user_authorization.can_write:
             raise PermissionDenied()
 
         f = request.FILES.get("file")
         try:
-            json_data = json.loads(f.read().decode())
+            # The file is parsed as it is imported, an invalid document
+            # discards the batches imported before the error
+            with transaction.atomic():
+                importer = ExamplesImporter(repository_version).run(
+                    iter_json_array(f.chunks())
+                )
         except json.decoder.JSONDecodeError:
             raise UnsupportedMediaType("json")
 
-        count_added = 0
-        not_added = []
-
-        for data in json_data:
-            response_data = data
-            response_data["repository"] = request.data.get("repository")
-            response_data["repository_version"] = repository_version.pk
-
-            intent, created = RepositoryIntent.objects.get_or_create(
-                text=response_data.get("intent"), repository_version=repository_version
-            )
-
-            response_data.update({"intent": intent.pk})
-
-            serializer = RepositoryExampleSerializer(
-                data=response_data, context={"request": request}
-            )
-            if serializer.is_valid():
-                serializer.save()
-                count_added += 1
-            else:
-                not_added.append(data)
-
-        return Response({"added": count_added, "not_added": not_added})
+        return Response(
+            {
+                "added": importer.added,
+                "not_added": importer.not_added + importer.duplicated,
+            }
+        )
 
     @action(
         detail=True,
@@ -1370,7 +1390,6 @@ class RepositoryNLPLogExportViewSet(DocumentViewSet):
         NestedFilteringFilterBackend,
     ]
     pagination_class = LimitOffsetPagination
-    limit = settings.REPOSITORY_NLP_LOG_LIMIT
     search_fields = ["text"]
     filter_fields = {
         "repository_uuid": "repository_uuid",
@@ -1391,10 +1410,6 @@ class RepositoryNLPLogExportViewSet(DocumentViewSet):
         },
     }
 
-    def filter_queryset(self, queryset):
-        queryset = super().filter_queryset(queryset)
-        return queryset[: self.limit]
-
     def get_queryset(self):
         params = {
             "repository_uuid": self.request.query_params.get("repository_uuid", None),
@@ -1408,15 +1423,59 @@ class RepositoryNLPLogExportViewSet(DocumentViewSet):
         RepositoryNLPLogFilter(params=params, user=self.request.user)
         return super().get_queryset()
 
-    def get_xlsx(self, queryset):
-        usecase = ExportRepositoryLogUseCase()
-        xlsx_response = usecase.create_xlsx_response(queryset)
-        return xlsx_response
-
     def list(self, request, *args, **kwargs):
+        """
+        Starts the export of all the logs matching the filters, as xlsx or
+        csv (``file_format``), its ``id`` is polled on the status action
+        """
+        file_format = request.query_params.get("file_format", "xlsx")
+        if file_format not in EXPORT_CONTENT_TYPES:
+            raise ValidationError(
+                {
+                    "file_format": _("Must be one of: {}").format(
+                        ", ".join(EXPORT_CONTENT_TYPES)
+                    )
+                }
+            )
+
         queryset = self.filter_queryset(self.get_queryset())
-        xlsx_response = self.get_xlsx(queryset)
-        return xlsx_response
+        task = celery_app.send_task(
+            "export_nlp_logs",
+            args=[queryset.to_dict(), request.user.pk, file_format],
+        )
+        cache.set(
+            EXPORT_TASK_CACHE_KEY.format(task.task_id),
+            request.user.pk,
+            settings.NLP_LOG_EXPORT_TIMEOUT,
+        )
+        return Response(
+            {"id": task.task_id, "status": "PENDING"}, status=status.HTTP_202_ACCEPTED
+        )
+
+    @action(
+        detail=False,
+        methods=["GET"],
+        url_name="status",
+        url_path="status/(?P<task_id>[^/.]+)",
+    )
+    def export_status(self, request, task_id=None, **kwargs):
+        """
+        Status of the export ``task_id`` started by the user, with the number
+        of logs written so far and the temporary URL of the file once it is
+        done. Any other task is not found.
+        """
+        user = cache.get(EXPORT_TASK_CACHE_KEY.format(task_id))
+        if user is None:
+            raise NotFound()
+        if user != request.user.pk:
+            raise PermissionDenied()
+
+        result = AsyncResult(task_id, app=celery_app)
+        info = result.info if isinstance(result.info, dict) else {}
+        data = {"id": task_id, "status": result.state, "rows": info.get("rows", 0)}
+        if result.successful() and info.get("file_name"):
+            data["file"] = get_storage().url(info.get("file_name"))
+        return Response(data)
 
 
 class RepositoryQANLPLogViewSet(DocumentViewSet):
@@ -1476,43 +1535,37 @@ class RasaUploadViewSet(
     parser_classes = (MultiPartParser,)
     metadata_class = Metadata
 
-    def update(self, request, *args, **kwargs):  # pragma: no cover
+    def update(self, request, *args, **kwargs):
         serializer = RasaUploadSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         serializer_rasa = RasaSerializer(data=json.load(request.data.get("file")))
         serializer_rasa.is_valid(raise_exception=True)
         
-        errors = []
-        
-        for example in serializer_rasa.data.get("rasa_nlu_data", {}).get(
-            "common_examples", []
-        ):
-            if RepositoryExample.objects.filter(
-                repository_version_language__repository_version=kwargs.get("pk"),
-                text=example["text"],
-                intent__text=example["intent"],
-                repository_version_language__language=serializer.data.get("language"),
-            ).count():
-                continue
-
-            example["repository"] = kwargs.get("repository__uuid")
-            example["repository_version"] = kwargs.get("pk")
-            example["language"] = serializer.data.get("language")
-
-            serializer_example = RepositoryExampleSerializer(
-                data=example, context={"request": request}
+        repository_version = get_object_or_404(
+            RepositoryVersion,
+            pk=kwargs.get("pk"),
+            repository__uuid=kwargs.get("repository__uuid"),
+        )
+        authorization = repository_version.repository.get_user_authorization(
+            request.user
+        )
+        if not authorization.can_contribute:
+            raise PermissionDenied()
+
+        language = serializer.data.get("language")
+        importer = ExamplesImporter(repository_version).run(
+            dict(example, language=language)
+            for example in serializer_rasa.data.get("rasa_nlu_data", {}).get(
+                "common_examples", []
             )
-            if serializer_example.is_valid():
-                serializer_example.save()
-            else:
-                errors.append(example)
+        )
 
         output_data = {
             "rasa_nlu_data": {
                 "regex_features": serializer_rasa.data.get("regex_features", []),
                 "entity_synonyms": serializer_rasa.data.get("entity_synonyms", []),
-                "common_examples": errors
+                "common_examples": importer.not_added,
             }
         }
 
@@ -235,7 +235,9 @@ router.register(
 )
 router.register("repository/nlp/authorization/langs", NLPLangsViewSet)
 router.register(
-    "repository/nlp/update_interpreters", RepositoryUpdateInterpretersViewSet
+    "repository/nlp/update_interpreters",
+    RepositoryUpdateInterpretersViewSet,
+    basename="repository-nlp-update-interpreters",
 )
 router.register(
     "repository/nlp/authorization/knowledge-base",
@@ -1,17 +1,25 @@
 import json
+import tempfile
+from unittest import mock
+
 import requests
 
 from django.conf import settings
+from django.core.cache import cache
 from django.test import RequestFactory
 from django.test import tag
 from django.test import TestCase
+from django.test import override_settings
+from django.utils import timezone
 from django_elasticsearch_dsl.registries import registry
 from rest_framework import status
 
 from bothub.api.v2.nlp.views import RepositoryNLPLogsViewSet
 from bothub.api.v2.repository.views import RepositoryNLPLogViewSet
+from bothub.api.v2.repository.views import RepositoryNLPLogExportViewSet
 from bothub.api.v2.zeroshot.views import ZeroShotFastPredictAPIView
 from bothub.api.v2.tests.utils import create_user_and_token
+from bothub.common.usecase.repositorylog.export import EXPORT_TASK_CACHE_KEY
 from bothub.common import languages
 from bothub.common.models import (
     Repository,
@@ -19,9 +27,11 @@ from bothub.common.models import (
     RepositoryNLPLog,
     RepositoryNLPLogIntent,
     RepositoryIntent,
+    RepositoryReports,
 )
 from bothub.common.models import RepositoryExample
 from bothub.common.documents.repositorynlplog import REPOSITORYNLPLOG_INDEX_NAME
+from bothub.storage import get_storage
 
 
 @tag("elastic")
@@ -253,6 +263,100 @@ class ListRepositoryNLPLogTestCase(TestCase):
         self.assertEqual(len(content_data.get("results")[0].get("log_intent")), 4)
 
 
+class RepositoryNLPLogBatchTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+        self.owner, self.owner_token = create_user_and_token("owner")
+
+        self.repository = Repository.objects.create(
+            owner=self.owner,
+            name="Testing",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+        self.repository_auth = RepositoryAuthorization.objects.create(
+            user=self.owner, repository=self.repository, role=3
+        )
+
+    def get_log(self, text, **kwargs):
+        log = {
+            "text": text,
+            "user_agent": "python-requests/2.20.1",
+            "from_backend": False,
+            "user": str(self.repository_auth.pk),
+            "repository_version_language": self.repository.current_version().pk,
+            "nlp_log": json.dumps({"intent": {"name": "greet", "confidence": 0.9}}),
+            "log_intent": [
+                {"intent": "greet", "confidence": 0.9, "is_default": True},
+                {"intent": "bye", "confidence": 0.1, "is_default": False},
+            ],
+        }
+        log.update(kwargs)
+        return log
+
+    def request(self, data):
+        request = self.factory.post(
+            "/v2/repository/nlp/log/batch/",
+            json.dumps(data),
+            content_type="application/json",
+        )
+        response = RepositoryNLPLogsViewSet.as_view({"post": "batch"})(request)
+        response.render()
+        content_data = json.loads(response.content)
+        return (response, content_data)
+
+    def test_okay(self):
+        RepositoryReports.objects.create(
+            repository_version_language=self.repository.current_version(),
+            user=self.owner,
+            report_date=timezone.now().date(),
+            count_reports=1,
+        )
+
+        logs = [self.get_log("hi"), self.get_log("hello"), self.get_log("bye")]
+        with self.assertNumQueries(7):
+            response, content_data = self.request(logs)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(content_data, {"count": 3})
+
+        self.assertEqual(
+            RepositoryNLPLog.objects.filter(
+                repository_version_language=self.repository.current_version()
+            ).count(),
+            3,
+        )
+        self.assertEqual(
+            RepositoryNLPLogIntent.objects.filter(
+                repository_nlp_log__text="hi"
+            ).count(),
+            2,
+        )
+        self.assertEqual(RepositoryReports.objects.get().count_reports, 4)
+
+    def test_invalid_version_language(self):
+        response, content_data = self.request(
+            [self.get_log("hi"), self.get_log("hello", repository_version_language=0)]
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("repository_version_language", content_data[1])
+        self.assertFalse(RepositoryNLPLog.objects.exists())
+
+    def test_max_size(self):
+        with self.settings(NLP_LOG_BATCH_MAX_SIZE=1):
+            response, content_data = self.request(
+                [self.get_log("hi"), self.get_log("hello")]
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_blocked_user(self):
+        with self.settings(REPOSITORY_BLOCK_USER_LOGS=[str(self.repository_auth.pk)]):
+            response, content_data = self.request([self.get_log("hi")])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(content_data, {"count": 0})
+        self.assertFalse(RepositoryReports.objects.exists())
+
+
 class ZeroShotLogTestCase(TestCase):
     def setUp(self) -> None:
         self.factory = RequestFactory()
@@ -307,3 +411,136 @@ class ZeroShotLogTestCase(TestCase):
         }
         response, _ = self.request(payload)
         self.assertEquals(response.status_code, 200)
+
+
+class RepositoryNLPLogExportTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+        self.owner, self.owner_token = create_user_and_token("owner")
+        self.user, self.user_token = create_user_and_token()
+
+        self.repository = Repository.objects.create(
+            owner=self.owner,
+            name="Testing",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            STORAGE_SERVICE="filesystem",
+            STORAGE_SERVICE_ROOT=directory.name,
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+            },
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+
+    def request(self, token, params):
+        authorization_header = {"HTTP_AUTHORIZATION": "Token {}".format(token.key)}
+        request = self.factory.get(
+            "/v2/repository/export-log/", params, **authorization_header
+        )
+        with mock.patch(
+            "bothub.api.v2.repository.views.celery_app.send_task",
+            return_value=mock.Mock(task_id="task"),
+        ) as send_task:
+            response = RepositoryNLPLogExportViewSet.as_view({"get": "list"})(request)
+        response.render()
+        content_data = json.loads(response.content)
+        return (response, content_data, send_task)
+
+    def request_status(self, token, result):
+        authorization_header = {"HTTP_AUTHORIZATION": "Token {}".format(token.key)}
+        request = self.factory.get(
+            "/v2/repository/export-log/status/task/", **authorization_header
+        )
+        with mock.patch(
+            "bothub.api.v2.repository.views.AsyncResult", return_value=result
+        ):
+            response = RepositoryNLPLogExportViewSet.as_view(
+                {"get": "export_status"}
+            )(request, task_id="task")
+        response.render()
+        content_data = json.loads(response.content)
+        return (response, content_data)
+
+    def test_export_started(self):
+        response, content_data, send_task = self.request(
+            self.owner_token,
+            {
+                "repository_version_language": self.repository.current_version().pk,
+                "file_format": "csv",
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(content_data, {"id": "task", "status": "PENDING"})
+
+        name, = send_task.call_args.args
+        search, user, file_format = send_task.call_args.kwargs["args"]
+        self.assertEqual(name, "export_nlp_logs")
+        self.assertIn("query", search)
+        self.assertNotIn("size", search)
+        self.assertEqual(user, self.owner.pk)
+        self.assertEqual(file_format, "csv")
+        self.assertEqual(cache.get(EXPORT_TASK_CACHE_KEY.format("task")), self.owner.pk)
+
+    def test_invalid_file_format(self):
+        response, content_data, send_task = self.request(
+            self.owner_token, {"file_format": "pdf"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("file_format", content_data)
+        send_task.assert_not_called()
+
+    def test_status(self):
+        cache.set(EXPORT_TASK_CACHE_KEY.format("task"), self.owner.pk)
+
+        response, content_data = self.request_status(
+            self.owner_token,
+            mock.Mock(
+                state="PROGRESS",
+                info={"user": self.owner.pk, "rows": 1000},
+                successful=lambda: False,
+            ),
+        )
+        self.assertEqual(
+            content_data, {"id": "task", "status": "PROGRESS", "rows": 1000}
+        )
+
+        response, content_data = self.request_status(
+            self.owner_token,
+            mock.Mock(
+                state="SUCCESS",
+                info={"user": self.owner.pk, "rows": 2, "file_name": "logs.xlsx"},
+                successful=lambda: True,
+            ),
+        )
+        self.assertEqual(content_data.get("rows"), 2)
+        self.assertEqual(content_data.get("file"), get_storage().url("logs.xlsx"))
+
+    def test_status_of_other_user(self):
+        cache.set(EXPORT_TASK_CACHE_KEY.format("task"), self.owner.pk)
+
+        response, content_data = self.request_status(
+            self.user_token,
+            mock.Mock(
+                state="SUCCESS",
+                info={"user": self.owner.pk, "rows": 2, "file_name": "logs.xlsx"},
+                successful=lambda: True,
+            ),
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_status_of_other_task(self):
+        response, content_data = self.request_status(
+            self.owner_token,
+            mock.Mock(state="SUCCESS", info={"count": 2}, successful=lambda: True),
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
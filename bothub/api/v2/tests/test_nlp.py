@@ -1,8 +1,14 @@
+import base64
 import json
+import os
+import tempfile
 import uuid
+from datetime import timedelta
 
 from django.test import TestCase
 from django.test import RequestFactory
+from django.test import override_settings
+from django.utils import timezone
 from rest_framework import status
 
 from bothub.api.v2.nlp.views import (
@@ -10,8 +16,11 @@ from bothub.api.v2.nlp.views import (
     RepositoryAuthorizationKnowledgeBaseViewSet,
     RepositoryAuthorizationExamplesViewSet,
     RepositoryAuthorizationAutomaticEvaluateViewSet,
+    RepositoryUpdateInterpretersViewSet,
 )
 from bothub.api.v2.nlp.views import RepositoryAuthorizationInfoViewSet
+from bothub.authentication.authorization import NLPAuthentication
+from bothub.authentication.cache import get_cached_authorization
 from bothub.common import languages
 from bothub.common.models import (
     RepositoryAuthorization,
@@ -23,6 +32,8 @@ from bothub.common.models import (
 )
 from bothub.common.models import RepositoryExample
 from bothub.common.models import RepositoryExampleEntity
+from bothub.common.models import RepositoryTranslatedExample
+from bothub.common.models import RepositoryTranslatedExampleEntity
 from bothub.common.models import Repository
 
 from .utils import create_user_and_token
@@ -68,7 +79,7 @@ class TrainStartTrainingTestCase(TestCase):
                 }
             ),
             content_type="application/json",
-            **authorization_header
+            **authorization_header,
         )
         response = RepositoryAuthorizationTrainViewSet.as_view(
             {"post": "start_training"}
@@ -86,6 +97,91 @@ class TrainStartTrainingTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class NLPAuthorizationCacheTestCase(TestCase):
+    def setUp(self):
+        self.owner, self.owner_token = create_user_and_token("owner")
+        self.user, self.user_token = create_user_and_token()
+
+        self.repository = Repository.objects.create(
+            owner=self.owner,
+            name="Testing",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+
+        self.repository_authorization = RepositoryAuthorization.objects.create(
+            user=self.user, repository=self.repository, role=3
+        )
+
+    def test_cached_authentication_without_queries(self):
+        get_cached_authorization(self.repository_authorization.uuid)
+
+        with self.assertNumQueries(0):
+            user, authorization = NLPAuthentication().authenticate_credentials(
+                str(self.repository_authorization.uuid)
+            )
+            self.assertTrue(authorization.can_contribute)
+            self.assertEqual(authorization.repository_id, str(self.repository.uuid))
+
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_invalidated_on_role_change(self):
+        self.assertTrue(
+            get_cached_authorization(self.repository_authorization.uuid).can_contribute
+        )
+
+        self.repository_authorization.role = RepositoryAuthorization.ROLE_USER
+        self.repository_authorization.save()
+
+        authorization = get_cached_authorization(self.repository_authorization.uuid)
+        self.assertFalse(authorization.can_contribute)
+        self.assertTrue(authorization.can_read)
+
+    def test_invalidated_on_repository_privacy_change(self):
+        repository_authorization = RepositoryAuthorization.objects.create(
+            repository=self.repository
+        )
+        self.assertTrue(
+            get_cached_authorization(repository_authorization.uuid).can_read
+        )
+
+        self.repository.is_private = True
+        self.repository.save()
+
+        self.assertFalse(
+            get_cached_authorization(repository_authorization.uuid).can_read
+        )
+
+    def test_invalidated_on_delete(self):
+        get_cached_authorization(self.repository_authorization.uuid)
+        self.repository_authorization.delete()
+
+        with self.assertRaises(RepositoryAuthorization.DoesNotExist):
+            get_cached_authorization(self.repository_authorization.uuid)
+
+    def retrieve_train(self, pk):
+        request = RequestFactory().get(
+            "/v2/repository/nlp/authorization/train/{}/".format(pk),
+            HTTP_AUTHORIZATION="Bearer {}".format(self.repository_authorization.uuid),
+        )
+        return RepositoryAuthorizationTrainViewSet.as_view({"get": "retrieve"})(
+            request, pk=pk
+        )
+
+    def test_denied_without_queries(self):
+        self.repository_authorization.role = RepositoryAuthorization.ROLE_USER
+        self.repository_authorization.save()
+        get_cached_authorization(self.repository_authorization.uuid)
+
+        with self.assertNumQueries(0):
+            response = self.retrieve_train(self.repository_authorization.uuid)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_unknown_url_authorization(self):
+        response = self.retrieve_train(uuid.uuid4())
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
 class TrainFailTestCase(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
@@ -120,7 +216,7 @@ class TrainFailTestCase(TestCase):
             "/v2/repository/nlp/authorization/train/train_fail/",
             json.dumps({"repository_version": self.repository_version_language.pk}),
             content_type="application/json",
-            **authorization_header
+            **authorization_header,
         )
         response = RepositoryAuthorizationTrainViewSet.as_view({"post": "train_fail"})(
             request
@@ -190,7 +286,7 @@ class AuthorizationInfoTestCase(TestCase):
         request = self.factory.get(
             "/v2/repository/nlp/authorization/info/{}/".format(token),
             {"repository_version": repository_version},
-            **authorization_header
+            **authorization_header,
         )
         response = RepositoryAuthorizationInfoViewSet.as_view({"get": "retrieve"})(
             request, pk=token
@@ -285,7 +381,7 @@ class AuthorizationTrainGetExamplesTestCase(TestCase):
                 "repository_version": self.repository_version_language.pk,
                 "intent": intent,
             },
-            **authorization_header
+            **authorization_header,
         )
         response = RepositoryAuthorizationTrainViewSet.as_view({"get": "get_examples"})(
             request
@@ -321,6 +417,149 @@ class AuthorizationTrainGetExamplesTestCase(TestCase):
         self.assertEqual(response.data.get("count"), 0)
 
 
+class AuthorizationTrainExportExamplesTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+        self.owner, self.owner_token = create_user_and_token("owner")
+        self.user, self.user_token = create_user_and_token()
+
+        self.repository = Repository.objects.create(
+            owner=self.owner,
+            name="Testing",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+
+        self.repository_authorization = RepositoryAuthorization.objects.create(
+            user=self.user,
+            repository=self.repository,
+            role=RepositoryAuthorization.ROLE_ADMIN,
+        )
+
+        self.repository_version = RepositoryVersion.objects.create(
+            repository=self.repository, name="test"
+        )
+
+        self.repository_version_language = RepositoryVersionLanguage.objects.create(
+            repository_version=self.repository_version,
+            language=languages.LANGUAGE_EN,
+            algorithm="neural_network_internal",
+        )
+
+        greet = RepositoryIntent.objects.create(
+            text="greet", repository_version=self.repository_version
+        )
+        farewell = RepositoryIntent.objects.create(
+            text="farewell", repository_version=self.repository_version
+        )
+
+        example = RepositoryExample.objects.create(
+            repository_version_language=self.repository_version_language,
+            text="hello douglas",
+            intent=greet,
+        )
+        RepositoryExampleEntity.objects.create(
+            repository_example=example, start=6, end=13, entity="name"
+        )
+        RepositoryExample.objects.create(
+            repository_version_language=self.repository_version_language,
+            text="bye",
+            intent=farewell,
+        )
+
+        translated = RepositoryTranslatedExample.objects.create(
+            original_example=example, language=languages.LANGUAGE_PT, text="oi douglas"
+        )
+        RepositoryTranslatedExampleEntity.objects.create(
+            repository_translated_example=translated, start=3, end=10, entity="name"
+        )
+        self.pt_version_language = self.repository_version.get_version_language(
+            languages.LANGUAGE_PT
+        )
+
+    def request(self, token, version_language, **params):
+        authorization_header = {"HTTP_AUTHORIZATION": "Bearer {}".format(token)}
+        request = self.factory.get(
+            "/v2/repository/nlp/authorization/train/export_examples/",
+            {"repository_version": version_language.pk, **params},
+            **authorization_header,
+        )
+        response = RepositoryAuthorizationTrainViewSet.as_view(
+            {"get": "export_examples"}
+        )(request)
+        return response
+
+    def test_ndjson(self):
+        response = self.request(
+            str(self.repository_authorization.uuid), self.repository_version_language
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(4):
+            content = b"".join(response.streaming_content).decode()
+
+        self.assertEqual(
+            [json.loads(line) for line in content.splitlines()],
+            [
+                {
+                    "text": "hello douglas",
+                    "intent": "greet",
+                    "entities": [
+                        {"start": 6, "end": 13, "value": "douglas", "entity": "name"}
+                    ],
+                },
+                {"text": "bye", "intent": "farewell", "entities": []},
+            ],
+        )
+
+    def test_rasa_translations(self):
+        response = self.request(
+            str(self.repository_authorization.uuid),
+            self.pt_version_language,
+            output="rasa",
+        )
+        content = json.loads(b"".join(response.streaming_content))
+
+        self.assertEqual(
+            content.get("rasa_nlu_data").get("common_examples"),
+            [
+                {
+                    "text": "oi douglas",
+                    "intent": "greet",
+                    "entities": [
+                        {"start": 3, "end": 10, "value": "douglas", "entity": "name"}
+                    ],
+                }
+            ],
+        )
+
+    def test_intent_filter(self):
+        response = self.request(
+            str(self.repository_authorization.uuid),
+            self.repository_version_language,
+            intent="farewell",
+        )
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 1)
+
+    def test_other_repository(self):
+        other_authorization = RepositoryAuthorization.objects.create(
+            user=self.owner,
+            repository=Repository.objects.create(
+                owner=self.owner,
+                name="Other",
+                slug="other",
+                language=languages.LANGUAGE_EN,
+            ),
+            role=RepositoryAuthorization.ROLE_ADMIN,
+        )
+        response = self.request(
+            str(other_authorization.uuid), self.repository_version_language
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
 class AuthorizationKnowledgeBaseTestCase(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
@@ -359,7 +598,7 @@ class AuthorizationKnowledgeBaseTestCase(TestCase):
                 "knowledge_base_id": self.knowledge_base_1.pk,
                 "language": languages.LANGUAGE_PT_BR,
             },
-            **authorization_header
+            **authorization_header,
         )
         response = RepositoryAuthorizationKnowledgeBaseViewSet.as_view(
             {"get": "retrieve"}
@@ -407,7 +646,7 @@ class InfoGetCurrentConfigurationTestCase(TestCase):
             "/v2/repository/nlp/authorization/info/{}/get_current_configuration".format(
                 token
             ),
-            **authorization_header
+            **authorization_header,
         )
         response = RepositoryAuthorizationInfoViewSet.as_view(
             {"get": "get_current_configuration"}
@@ -501,7 +740,7 @@ class AuthorizationExamplesTestCase(TestCase):
                 "repository_version": repository_version,
                 "language": languages.LANGUAGE_EN,
             },
-            **authorization_header
+            **authorization_header,
         )
         response = RepositoryAuthorizationExamplesViewSet.as_view({"get": "retrieve"})(
             request, pk=token
@@ -563,7 +802,7 @@ class RepositoryAuthorizationAutomaticEvaluateTestCase(TestCase):
                 "repository_version": repository_version,
                 "language": languages.LANGUAGE_EN,
             },
-            **authorization_header
+            **authorization_header,
         )
         response = RepositoryAuthorizationAutomaticEvaluateViewSet.as_view(
             {"get": "retrieve"}
@@ -595,3 +834,276 @@ class RepositoryAuthorizationAutomaticEvaluateTestCase(TestCase):
             content_data.get("repository_version_language_id"),
             self.repository_version_language.pk,
         )
+
+
+class UpdateInterpretersArtifactStoreTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.root = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            MODEL_ARTIFACTS_STORAGE="filesystem", MODEL_ARTIFACTS_ROOT=self.root.name
+        )
+        self.settings.enable()
+
+        self.owner, self.owner_token = create_user_and_token("owner")
+
+        self.repository = Repository.objects.create(
+            owner=self.owner,
+            name="Testing",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+
+        self.repository_authorization = RepositoryAuthorization.objects.create(
+            user=self.owner, repository=self.repository, role=3
+        )
+        self.authorization_header = {
+            "HTTP_AUTHORIZATION": "Bearer {}".format(self.repository_authorization.uuid)
+        }
+
+        self.version_language = self.repository.current_version()
+        self.other_version_language = RepositoryVersionLanguage.objects.create(
+            repository_version=RepositoryVersion.objects.create(
+                repository=self.repository, name="other"
+            ),
+            language=languages.LANGUAGE_EN,
+        )
+
+    def tearDown(self):
+        self.settings.disable()
+        self.root.cleanup()
+
+    def save_training(self, version_language, bot_data):
+        request = self.factory.post(
+            "/v2/repository/nlp/update_interpreters/",
+            {
+                "id": version_language.pk,
+                "bot_data": base64.b64encode(bot_data).decode(),
+            },
+            **self.authorization_header,
+        )
+        response = RepositoryUpdateInterpretersViewSet.as_view({"post": "create"})(
+            request
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return version_language.get_bot_data
+
+    def retrieve(self, version_language):
+        request = self.factory.get(
+            "/v2/repository/nlp/update_interpreters/{}/".format(version_language.pk),
+            **self.authorization_header,
+        )
+        response = RepositoryUpdateInterpretersViewSet.as_view({"get": "retrieve"})(
+            request, pk=version_language.pk
+        )
+        response.render()
+        return json.loads(response.content)
+
+    def download(self, version_language, **headers):
+        request = self.factory.get(
+            "/v2/repository/nlp/update_interpreters/{}/bot_data/".format(
+                version_language.pk
+            ),
+            **self.authorization_header,
+            **headers,
+        )
+        return RepositoryUpdateInterpretersViewSet.as_view({"get": "bot_data"})(
+            request, pk=version_language.pk
+        )
+
+    def test_same_model_stored_once(self):
+        trainer = self.save_training(self.version_language, b"model")
+        other_trainer = self.save_training(self.other_version_language, b"model")
+
+        self.assertEqual(trainer.bot_data, "")
+        self.assertEqual(len(trainer.bot_data_sha256), 64)
+        self.assertEqual(trainer.bot_data_sha256, other_trainer.bot_data_sha256)
+        self.assertNotEqual(trainer.pk, other_trainer.pk)
+
+        artifacts = [
+            files for directory, directories, files in os.walk(self.root.name) if files
+        ]
+        self.assertEqual(artifacts, [[f"{trainer.bot_data_sha256}.tar.gz"]])
+
+    def test_retrieve(self):
+        trainer = self.save_training(self.version_language, b"model")
+
+        content_data = self.retrieve(self.version_language)
+        self.assertEqual(content_data.get("bot_data_sha256"), trainer.bot_data_sha256)
+        self.assertTrue(content_data.get("from_aws"))
+        self.assertTrue(
+            content_data.get("bot_data").startswith(
+                "http://testserver/v2/repository/nlp/update_interpreters/"
+                f"{self.version_language.pk}/bot_data/"
+            )
+        )
+
+    def test_download(self):
+        trainer = self.save_training(self.version_language, b"model")
+
+        response = self.download(self.version_language)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), b"model")
+        self.assertEqual(response["ETag"], f'"{trainer.bot_data_sha256}"')
+        self.assertEqual(response["Content-Length"], "5")
+
+    def test_download_not_modified(self):
+        trainer = self.save_training(self.version_language, b"model")
+
+        response = self.download(
+            self.version_language,
+            HTTP_IF_NONE_MATCH=f'"{trainer.bot_data_sha256}"',
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_download_without_artifact(self):
+        response = self.download(self.version_language)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class UpdateInterpretersConditionalTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+        self.owner, self.owner_token = create_user_and_token("owner")
+
+        self.repository = Repository.objects.create(
+            owner=self.owner,
+            name="Testing",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+
+        self.repository_authorization = RepositoryAuthorization.objects.create(
+            user=self.owner, repository=self.repository, role=3
+        )
+        self.authorization_header = {
+            "HTTP_AUTHORIZATION": "Bearer {}".format(self.repository_authorization.uuid)
+        }
+
+        self.version_language = self.repository.current_version()
+        self.version_language.save_training("model", "1.0")
+        self.other_version_language = RepositoryVersionLanguage.objects.create(
+            repository_version=self.version_language.repository_version,
+            language=languages.LANGUAGE_PT,
+        )
+
+    def retrieve(self, **headers):
+        request = self.factory.get(
+            "/v2/repository/nlp/update_interpreters/{}/".format(
+                self.version_language.pk
+            ),
+            {"rasa_version": "1.0"},
+            **self.authorization_header,
+            **headers,
+        )
+        return RepositoryUpdateInterpretersViewSet.as_view({"get": "retrieve"})(
+            request, pk=self.version_language.pk
+        )
+
+    def changed(self, data):
+        request = self.factory.post(
+            "/v2/repository/nlp/update_interpreters/changed/",
+            json.dumps(data),
+            content_type="application/json",
+            **self.authorization_header,
+        )
+        response = RepositoryUpdateInterpretersViewSet.as_view({"post": "changed"})(
+            request
+        )
+        response.render()
+        content_data = json.loads(response.content)
+        return (response, content_data)
+
+    def test_not_modified(self):
+        etag = self.retrieve()["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.retrieve(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_modified_after_training(self):
+        etag = self.retrieve()["ETag"]
+
+        self.version_language.save_training("new model", "1.0")
+
+        response = self.retrieve(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data.get("bot_data"), "new model")
+
+    @override_settings(INTERPRETERS_CHANGED_MARGIN=0)
+    def test_changed(self):
+        response, content_data = self.changed(
+            {
+                "version_languages": [
+                    self.version_language.pk,
+                    self.other_version_language.pk,
+                ],
+                "rasa_version": "1.0",
+            }
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [changed.get("version_id") for changed in content_data.get("changed")],
+            [self.version_language.pk],
+        )
+        self.assertEqual(
+            content_data.get("changed")[0].get("etag"), self.retrieve()["ETag"]
+        )
+
+        with self.assertNumQueries(1):
+            response, content_data = self.changed(
+                {
+                    "version_languages": [
+                        self.version_language.pk,
+                        self.other_version_language.pk,
+                    ],
+                    "since": content_data.get("checked_at"),
+                }
+            )
+        self.assertEqual(content_data.get("changed"), [])
+
+        self.other_version_language.save_training("model", "1.0")
+
+        response, content_data = self.changed(
+            {
+                "version_languages": [
+                    self.version_language.pk,
+                    self.other_version_language.pk,
+                ],
+                "since": content_data.get("checked_at"),
+            }
+        )
+        self.assertEqual(
+            [changed.get("version_id") for changed in content_data.get("changed")],
+            [self.other_version_language.pk],
+        )
+
+    @override_settings(INTERPRETERS_CHANGED_MARGIN=60)
+    def test_changed_committed_late(self):
+        version_languages = [self.version_language.pk, self.other_version_language.pk]
+        response, content_data = self.changed({"version_languages": version_languages})
+
+        # Trained before the check, but only committed after it
+        self.other_version_language.save_training("model", "1.0")
+        RepositoryVersionLanguage.objects.filter(
+            pk=self.other_version_language.pk
+        ).update(training_end_at=timezone.now() - timedelta(seconds=30))
+
+        response, content_data = self.changed(
+            {
+                "version_languages": version_languages,
+                "since": content_data.get("checked_at"),
+            }
+        )
+        self.assertIn(
+            self.other_version_language.pk,
+            [changed.get("version_id") for changed in content_data.get("changed")],
+        )
+
+    def test_changed_invalid(self):
+        response, content_data = self.changed({"version_languages": []})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("version_languages", content_data)
@@ -0,0 +1,113 @@
+import json
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from elasticsearch import Elasticsearch
+
+from bothub.api.v2.profiling import QueryProfile, query_signature, summarize
+from bothub.api.v2.tests.utils import create_user_and_token
+from bothub.common import languages
+from bothub.common.models import Repository
+
+
+class QueryProfileTestCase(TestCase):
+    def test_duplicates(self):
+        owner, token = create_user_and_token("owner")
+        for slug in ["test-1", "test-2"]:
+            Repository.objects.create(
+                owner=owner, name="Testing", slug=slug, language=languages.LANGUAGE_EN
+            )
+
+        with QueryProfile() as profile:
+            for repository in Repository.objects.all():
+                repository.owner
+
+        self.assertEqual(profile.query_count, 3)
+        self.assertEqual(list(profile.duplicates.values()), [2])
+        self.assertEqual(profile.as_dict()["duplicate_queries"], 1)
+
+    def test_signature(self):
+        self.assertEqual(
+            query_signature('SELECT "id" FROM "t" WHERE "id" IN (%s, %s, %s)'),
+            query_signature('SELECT "id" FROM "t" WHERE "id" IN (%s)'),
+        )
+        self.assertNotEqual(
+            query_signature('SELECT "id" FROM "t" WHERE "id" IN (%s)'),
+            query_signature('SELECT "id" FROM "t" WHERE "id" = %s'),
+        )
+
+    def test_elasticsearch_requests(self):
+        client = Elasticsearch(["localhost:1"], max_retries=0)
+        with QueryProfile() as profile:
+            client.ping()
+        self.assertEqual(profile.es_requests, 1)
+
+        client.ping()
+        self.assertEqual(profile.es_requests, 1)
+
+
+class QueryProfilerMiddlewareTestCase(TestCase):
+    def setUp(self):
+        self.owner, self.owner_token = create_user_and_token("owner")
+        self.repository = Repository.objects.create(
+            owner=self.owner,
+            name="Testing",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+        self.report = tempfile.NamedTemporaryFile("r")
+        self.addCleanup(self.report.close)
+
+    def request(self):
+        Client().get(
+            f"/v2/repository/repository-details/{self.repository.uuid}/languagesstatus/",
+            HTTP_AUTHORIZATION=f"Token {self.owner_token.key}",
+        )
+
+    def test_report(self):
+        with override_settings(
+            QUERY_PROFILER=True, QUERY_PROFILER_REPORT=self.report.name
+        ):
+            self.request()
+        entries = [json.loads(line) for line in self.report]
+
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(
+            entries[0]["view"],
+            "bothub.api.v2.repository.views.RepositoryViewSet.languagesstatus",
+        )
+        self.assertEqual(entries[0]["status"], 200)
+        self.assertGreater(entries[0]["query_count"], 0)
+        self.assertGreater(entries[0]["response_size"], 0)
+        self.assertEqual(entries[0]["query_budget"], 20)
+
+    def test_disabled(self):
+        with override_settings(
+            QUERY_PROFILER=False, QUERY_PROFILER_REPORT=self.report.name
+        ):
+            self.request()
+        self.assertEqual(self.report.read(), "")
+
+    def test_profile_views_command(self):
+        with override_settings(
+            QUERY_PROFILER=True, QUERY_PROFILER_REPORT=self.report.name
+        ):
+            self.request()
+            self.request()
+        entries = [json.loads(line) for line in self.report]
+
+        out = StringIO()
+        call_command("profile_views", report=self.report.name, stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report, json.loads(json.dumps(summarize(entries))))
+        view = report[
+            "bothub.api.v2.repository.views.RepositoryViewSet.languagesstatus"
+        ]
+        self.assertEqual(view["requests"], 2)
+        self.assertEqual(
+            view["query_count_max"],
+            max(entry["query_count"] for entry in entries),
+        )
@@ -2,12 +2,17 @@ import json
 import uuid
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import RequestFactory
-from django.test import TestCase
-from django.test.client import MULTIPART_CONTENT
+from django.test import TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 
-from bothub.api.v2.repository.serializers import NewRepositorySerializer
+from bothub.api.v2.repository.serializers import (
+    NewRepositorySerializer,
+    ShortRepositorySerializer,
+)
 from bothub.api.v2.repository.views import (
     CloneRepositoryViewSet,
     RepositoriesContributionsViewSet,
@@ -21,6 +26,7 @@ from bothub.api.v2.repository.views import RepositoriesViewSet
 from bothub.api.v2.repository.views import RepositoryAuthorizationRequestsViewSet
 from bothub.api.v2.repository.views import RepositoryAuthorizationViewSet
 from bothub.api.v2.repository.views import RepositoryCategoriesView
+from bothub.api.v2.repository.views import RasaUploadViewSet
 from bothub.api.v2.repository.views import RepositoryExampleViewSet
 from bothub.api.v2.repository.views import RepositoryViewSet
 from bothub.api.v2.repository.views import RepositoryVotesViewSet
@@ -38,12 +44,16 @@ from bothub.common.models import (
 from bothub.common.models import RepositoryAuthorization
 from bothub.common.models import RepositoryCategory
 from bothub.common.models import RepositoryExample
+from bothub.common.models import RepositoryEntity
+from bothub.common.models import RepositoryEntityGroup
+from bothub.common.models import RepositoryEvaluate
 from bothub.common.models import RepositoryExampleEntity
 from bothub.common.models import RepositoryTranslatedExample
 from bothub.common.models import RepositoryVote
 from bothub.common.models import RequestRepositoryAuthorization
 
 from bothub.api.v2.tests.utils import (
+    QueryBudgetMixin,
     get_valid_mockups,
     get_invalid_mockups,
     create_repository_from_mockup,
@@ -456,6 +466,193 @@ class IntentsInRepositorySerializerTestCase(TestCase):
         self.assertEqual(intent.get("examples__count"), 1)
 
 
+class RepositorySerializersQueriesTestCase(TestCase):
+    def setUp(self):
+        self.owner, self.owner_token = create_user_and_token("owner")
+        self.category = RepositoryCategory.objects.create(name="Category 1")
+
+        self.repository = self.create_repository("test")
+        self.repository_version = self.repository.current_version().repository_version
+        self.group = RepositoryEntityGroup.objects.create(
+            repository_version=self.repository_version, value="people"
+        )
+        self.add_intent("greet")
+
+    def create_repository(self, slug):
+        repository = Repository.objects.create(
+            owner=self.owner, name="Testing", slug=slug, language=languages.LANGUAGE_EN
+        )
+        repository.categories.add(self.category)
+        return repository
+
+    def add_intent(self, text, repository=None):
+        repository = repository or self.repository
+        version_language = repository.current_version()
+        intent = RepositoryIntent.objects.create(
+            text=text, repository_version=version_language.repository_version
+        )
+        for example_text in ["hi maria", "hello maria"]:
+            example = RepositoryExample.objects.create(
+                repository_version_language=version_language,
+                text=f"{example_text} {text}",
+                intent=intent,
+            )
+            RepositoryExampleEntity.objects.create(
+                repository_example=example, start=0, end=2, entity=f"{text}_entity"
+            )
+            RepositoryExampleEntity.objects.create(
+                repository_example=example, start=3, end=8, entity=f"{text}_name"
+            )
+            RepositoryTranslatedExample.objects.create(
+                original_example=example, language=languages.LANGUAGE_PT, text="oi"
+            )
+        RepositoryEntity.objects.filter(
+            repository_version=version_language.repository_version,
+            value=f"{text}_name",
+        ).update(group=self.group)
+        RepositoryEvaluate.objects.create(
+            repository_version_language=version_language, text="hi", intent=intent
+        )
+
+    def serialize_version(self):
+        repository_version = (
+            RepositoryVersion.objects.select_related("repository__owner")
+            .prefetch_related("repository__categories")
+            .get(pk=self.repository_version.pk)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            data = NewRepositorySerializer(repository_version).data
+        return data, len(queries)
+
+    def test_new_repository_serializer(self):
+        # Creates the missing score
+        self.serialize_version()
+        data, num_queries = self.serialize_version()
+
+        self.assertEqual(data["examples__count"], 2)
+        self.assertEqual(
+            data["intents"],
+            [{"value": "greet", "id": data["intents"][0]["id"], "examples__count": 2}],
+        )
+        self.assertEqual(data["groups"][0]["examples__count"], 2)
+        self.assertEqual(
+            [entity["value"] for entity in data["groups"][0]["entities"]],
+            ["greet_name"],
+        )
+        self.assertEqual(data["other_group"]["entities"][0]["value"], "greet_entity")
+        self.assertEqual(data["other_group"]["examples__count"], 2)
+        self.assertEqual(
+            sorted(data["available_languages"]),
+            [languages.LANGUAGE_EN, languages.LANGUAGE_PT],
+        )
+        self.assertEqual(
+            data["evaluate_languages_count"],
+            {languages.LANGUAGE_EN: 1, languages.LANGUAGE_PT: 0},
+        )
+
+        for text in ["bye", "thanks", "affirmative"]:
+            self.add_intent(text)
+        data, more_num_queries = self.serialize_version()
+
+        self.assertEqual(len(data["intents"]), 4)
+        self.assertEqual(data["groups"][0]["examples__count"], 8)
+        self.assertEqual(len(data["other_group"]["entities"]), 4)
+        self.assertEqual(more_num_queries, num_queries)
+
+    def test_short_repository_serializer(self):
+        def serialize():
+            repositories = Repository.objects.select_related("owner").prefetch_related(
+                "categories", "votes"
+            )
+            with CaptureQueriesContext(connection) as queries:
+                data = ShortRepositorySerializer(repositories, many=True).data
+            return data, len(queries)
+
+        serialize()
+        data, num_queries = serialize()
+        self.assertEqual(data[0]["intents"][0]["examples__count"], 2)
+        self.assertEqual(data[0]["count_knowledge_bases"], 0)
+
+        for slug in ["test-2", "test-3"]:
+            self.add_intent("greet", self.create_repository(slug))
+        # Creates the missing scores
+        serialize()
+        data, more_num_queries = serialize()
+
+        self.assertEqual(len(data), 3)
+        self.assertEqual(more_num_queries, num_queries)
+
+
+class RepositoryQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+        self.owner, self.owner_token = create_user_and_token("owner")
+        self.user, self.user_token = create_user_and_token("user")
+
+        self.repository = Repository.objects.create(
+            owner=self.owner,
+            name="Testing",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+        self.version_language = self.repository.current_version()
+        self.repository_version = self.version_language.repository_version
+        for text in ["greet", "bye", "thanks", "affirmative", "deny"]:
+            intent = RepositoryIntent.objects.create(
+                text=text, repository_version=self.repository_version
+            )
+            RepositoryExample.objects.create(
+                repository_version_language=self.version_language,
+                text=f"{text} example",
+                intent=intent,
+            )
+        self.repository.repository_score.get_or_create()
+
+    def request(self, view, action, **kwargs):
+        request = self.factory.get(
+            "/v2/repository/", **get_authorization_header(self.user_token.key)
+        )
+        view_func = view.as_view({"get": action})
+        with self.assertQueryBudget(view.query_budgets[action]):
+            response = view_func(request, **kwargs)
+            response.render()
+        return response
+
+    def test_retrieve(self):
+        response = self.request(
+            NewRepositoryViewSet,
+            "retrieve",
+            repository__uuid=self.repository.uuid,
+            pk=self.repository_version.pk,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_languages_status(self):
+        response = self.request(
+            NewRepositoryViewSet,
+            "languagesstatus",
+            repository__uuid=self.repository.uuid,
+            pk=self.repository_version.pk,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_repository_languages_status(self):
+        response = self.request(
+            RepositoryViewSet, "languagesstatus", uuid=self.repository.uuid
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_over_budget(self):
+        with self.assertRaises(AssertionError) as context:
+            with self.assertQueryBudget(1):
+                Repository.objects.count()
+                Repository.objects.count()
+
+        self.assertIn("2 queries executed, budget of 1", str(context.exception))
+        self.assertIn("2x SELECT COUNT(*)", str(context.exception))
+
+
 class RepositoriesViewSetTestCase(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
@@ -1271,7 +1468,6 @@ class RepositoryExampleUploadTestCase(TestCase):
         )
 
     def request(self, token):
-        authorization_header = get_authorization_header(token.key if token else None)
         examples = b"""[
                     {
                         "text": "yes",
@@ -1296,7 +1492,10 @@ class RepositoryExampleUploadTestCase(TestCase):
                         "intent": "greet"
                     }
                 ]"""
+        return self.upload(examples, token)
 
+    def upload(self, examples, token):
+        authorization_header = get_authorization_header(token.key if token else None)
         uploaded_file = SimpleUploadedFile(
             "examples.json", examples, "multipart/form-data"
         )
@@ -1328,6 +1527,172 @@ class RepositoryExampleUploadTestCase(TestCase):
         response, content_data = self.request(self.user_token)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_duplicated_and_invalid(self):
+        self.request(self.owner_token)
+
+        examples = [
+            {"text": "yes", "intent": "greet", "entities": []},
+            {"text": "alright", "intent": "affirm", "entities": []},
+            {"text": "ok", "intent": "Affirm!", "entities": []},
+            {"text": "ok", "intent": "affirm"},
+            {"text": "ok", "intent": "affirm", "entities": [{"entity": "x"}]},
+            {"text": "sure", "intent": "affirm", "entities": []},
+            {"text": "sure", "intent": "affirm", "entities": []},
+            {
+                "text": "of course",
+                "intent": "affirm",
+                "entities": [{"start": 3, "end": 9, "entity": "course"}],
+            },
+        ]
+        response, content_data = self.upload(
+            json.dumps(examples).encode(), self.owner_token
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(content_data.get("added"), 2)
+        self.assertEqual(
+            content_data.get("not_added"),
+            [examples[index] for index in [1, 2, 3, 4, 0, 6]],
+        )
+
+        version_language = self.repository.current_version()
+        self.assertEqual(version_language.examples.count(), 4)
+        example = RepositoryExample.objects.get(text="of course")
+        self.assertEqual(example.intent.text, "affirm")
+        self.assertEqual(example.entities.get().entity.value, "course")
+        self.assertEqual(
+            sorted(
+                RepositoryIntent.objects.filter(
+                    repository_version=version_language.repository_version
+                ).values_list("text", flat=True)
+            ),
+            ["affirm", "greet"],
+        )
+
+    @override_settings(EXAMPLES_IMPORT_BATCH_SIZE=2)
+    def test_duplicated_and_invalid_in_batches(self):
+        self.test_duplicated_and_invalid()
+
+    def test_rasa_upload(self):
+        RepositoryExample.objects.create(
+            repository_version_language=self.repository.current_version(),
+            text="yes",
+            intent=RepositoryIntent.objects.create(
+                text="greet",
+                repository_version=self.repository.current_version().repository_version,
+            ),
+        )
+        common_examples = [
+            {"text": "yes", "intent": "greet", "entities": []},
+            {"text": "yes", "intent": "affirm", "entities": []},
+            {"text": "hi", "intent": "greet", "entities": []},
+        ]
+        rasa_file = SimpleUploadedFile(
+            "rasa.json",
+            json.dumps(
+                {
+                    "rasa_nlu_data": {
+                        "regex_features": [],
+                        "entity_synonyms": [],
+                        "common_examples": common_examples,
+                    }
+                }
+            ).encode(),
+        )
+        request = self.factory.put(
+            "/v2/repository/upload-rasa-file/",
+            encode_multipart(
+                BOUNDARY, {"file": rasa_file, "language": languages.LANGUAGE_EN}
+            ),
+            content_type=MULTIPART_CONTENT,
+            **get_authorization_header(self.owner_token.key),
+        )
+        response = RasaUploadViewSet.as_view({"put": "update"})(
+            request,
+            repository__uuid=self.repository.uuid,
+            pk=self.repository.current_version().repository_version.pk,
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(
+            response.data["rasa_nlu_data"]["common_examples"],
+            [dict(common_examples[1], language=languages.LANGUAGE_EN)],
+        )
+        self.assertTrue(RepositoryExample.objects.filter(text="hi").exists())
+
+    def test_invalid_json(self):
+        response, content_data = self.upload(b'[{"text": "yes"', self.owner_token)
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    @override_settings(EXAMPLES_IMPORT_BATCH_SIZE=1)
+    def test_invalid_json_imports_nothing(self):
+        response, content_data = self.upload(
+            b'[{"text": "yes", "intent": "greet", "entities": []}, {"text": ',
+            self.owner_token,
+        )
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        self.assertFalse(RepositoryExample.objects.exists())
+
+    def test_version_of_other_repository(self):
+        other_repository = Repository.objects.create(
+            owner=self.user.repository_owner,
+            name="Other",
+            slug="other",
+            language=languages.LANGUAGE_EN,
+        )
+        other_version = other_repository.current_version().repository_version
+
+        authorization_header = get_authorization_header(self.owner_token.key)
+        request = self.factory.post(
+            "/v2/repository/example/upload_examples/",
+            {
+                "file": SimpleUploadedFile(
+                    "examples.json",
+                    b'[{"text": "yes", "intent": "greet", "entities": []}]',
+                    "multipart/form-data",
+                ),
+                "repository": str(self.repository.uuid),
+                "repository_version": other_version.pk,
+            },
+            format="multipart",
+            **authorization_header,
+        )
+        response = RepositoryExampleViewSet.as_view({"post": "upload_examples"})(
+            request
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(RepositoryExample.objects.exists())
+
+    def test_queries_by_batch(self):
+        def upload(count):
+            examples = [
+                {
+                    "text": f"example {index}",
+                    "intent": f"intent_{index % 5}",
+                    "entities": [
+                        {"start": 0, "end": 7, "entity": f"entity_{index % 3}"}
+                    ],
+                }
+                for index in range(count)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response, content_data = self.upload(
+                    json.dumps(examples).encode(), self.owner_token
+                )
+            self.assertEqual(content_data.get("added"), count)
+            return len(queries)
+
+        # Creates the intents, entities and the authorization of the user
+        upload(10)
+        RepositoryExample.objects.all().delete()
+        # Caches the authorization of the user
+        upload(10)
+        RepositoryExample.objects.all().delete()
+        num_queries = upload(10)
+        RepositoryExample.objects.all().delete()
+        self.assertEqual(upload(100), num_queries)
+
 
 class RepositoryExampleDestroyTestCase(TestCase):
     def setUp(self):
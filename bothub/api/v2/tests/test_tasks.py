@@ -1,8 +1,12 @@
+from unittest import mock
 from uuid import uuid4
 
+from django.db import transaction
 from django.test import RequestFactory, TestCase
 from django.utils import timezone
-from bothub.common.tasks import clone_repository, clone_version
+from bothub.common.documents import RepositoryExampleDocument
+from bothub.common.signals import CelerySignalProcessor
+from bothub.common.tasks import clone_repository, clone_version, handle_saves
 from django.conf import settings
 from bothub.api.v2.tests.utils import (
     create_repository_from_mockup,
@@ -15,8 +19,15 @@ from bothub.common.models import (
     QAKnowledgeBase,
     Repository,
     RepositoryCategory,
+    RepositoryEntity,
+    RepositoryEntityGroup,
+    RepositoryEvaluate,
     RepositoryExample,
+    RepositoryExampleEntity,
     RepositoryIntent,
+    RepositoryQueueTask,
+    RepositoryTranslatedExample,
+    RepositoryTranslatedExampleEntity,
     RepositoryVersion,
     RepositoryVersionLanguage,
 )
@@ -233,3 +244,186 @@ class RepositoryCloneTestCase(TestCase):
     def test_functions(self):
         self.clone_repository_function()
         self.clone_versions_function()
+
+
+class CloneVersionTestCase(TestCase):
+    def setUp(self):
+        self.owner, self.owner_token = create_user_and_token("owner")
+        self.repository = Repository.objects.create(
+            owner=self.owner, name="Testing", slug="test", language="en"
+        )
+        self.repository_version = RepositoryVersion.objects.create(
+            repository=self.repository, name="alfa", is_default=True
+        )
+        version_language = RepositoryVersionLanguage.objects.create(
+            repository_version=self.repository_version, language="en"
+        )
+        intent = RepositoryIntent.objects.create(
+            text="greet", repository_version=self.repository_version
+        )
+        group = RepositoryEntityGroup.objects.create(
+            repository_version=self.repository_version, value="person"
+        )
+        self.entity = RepositoryEntity.objects.create(
+            repository_version=self.repository_version, value="name", group=group
+        )
+        for i in range(3):
+            example = RepositoryExample.objects.create(
+                repository_version_language=version_language,
+                text=f"hi douglas {i}",
+                intent=intent,
+            )
+            RepositoryExampleEntity.objects.create(
+                repository_example=example, start=3, end=10, entity=self.entity
+            )
+            translated = RepositoryTranslatedExample.objects.create(
+                original_example=example, language="pt", text=f"oi douglas {i}"
+            )
+            RepositoryTranslatedExampleEntity.objects.create(
+                repository_translated_example=translated,
+                start=3,
+                end=10,
+                entity=self.entity,
+            )
+        RepositoryEvaluate.objects.create(
+            repository_version_language=version_language, text="hi", intent="greet"
+        )
+
+        self.clone = RepositoryVersion.objects.create(
+            repository=self.repository, name="beta", is_deleted=True
+        )
+
+    def test_clone_version(self):
+        success = clone_version(
+            repository_id_from_original_version=self.repository.pk,
+            original_version_id=self.repository_version.pk,
+            clone_id=self.clone.pk,
+        )
+        self.assertTrue(success)
+
+        self.clone.refresh_from_db()
+        self.assertFalse(self.clone.is_deleted)
+
+        examples = RepositoryExample.objects.filter(
+            repository_version_language__repository_version=self.clone,
+            repository_version_language__language="en",
+        )
+        self.assertEqual(examples.count(), 3)
+        self.assertEqual(
+            set(examples.values_list("intent__repository_version", flat=True)),
+            {self.clone.pk},
+        )
+
+        clone_entity = RepositoryEntity.objects.get(
+            repository_version=self.clone, value="name"
+        )
+        self.assertEqual(clone_entity.group.value, "person")
+        self.assertEqual(clone_entity.group.repository_version, self.clone)
+        self.assertEqual(
+            RepositoryExampleEntity.objects.filter(
+                repository_example__in=examples, entity=clone_entity
+            ).count(),
+            3,
+        )
+
+        translations = RepositoryTranslatedExample.objects.filter(
+            original_example__in=examples
+        )
+        self.assertEqual(translations.count(), 3)
+        self.assertEqual(
+            set(translations.values_list("repository_version_language", flat=True)),
+            {self.clone.get_version_language("pt").pk},
+        )
+        self.assertEqual(
+            RepositoryTranslatedExampleEntity.objects.filter(
+                repository_translated_example__in=translations, entity=clone_entity
+            ).count(),
+            3,
+        )
+
+        self.assertEqual(
+            RepositoryEvaluate.objects.filter(
+                repository_version_language__repository_version=self.clone
+            ).count(),
+            1,
+        )
+        self.assertEqual(
+            set(
+                RepositoryQueueTask.objects.filter(
+                    repositoryversionlanguage__repository_version=self.clone
+                ).values_list("type_processing", "status")
+            ),
+            {
+                (
+                    RepositoryQueueTask.TYPE_PROCESSING_CLONE_VERSION,
+                    RepositoryQueueTask.STATUS_SUCCESS,
+                )
+            },
+        )
+
+
+class CelerySignalProcessorTestCase(TestCase):
+    def setUp(self):
+        self.owner, self.owner_token = create_user_and_token("owner")
+        self.repository = Repository.objects.create(
+            owner=self.owner, name="Test", slug="test", language="en"
+        )
+        self.intent = RepositoryIntent.objects.create(
+            text="greet",
+            repository_version=self.repository.current_version().repository_version,
+        )
+        self.examples = [
+            RepositoryExample.objects.create(
+                repository_version_language=self.repository.current_version(),
+                text=text,
+                intent=self.intent,
+            )
+            for text in ["hi", "hello"]
+        ]
+        # Only the handlers are used, without connecting the signals again
+        self.processor = CelerySignalProcessor.__new__(CelerySignalProcessor)
+
+    @mock.patch("bothub.common.signals.handle_saves")
+    def test_coalesce_transaction(self, handle_saves_task):
+        with self.settings(USE_ELASTICSEARCH=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                for example in self.examples + self.examples:
+                    self.processor.handle_save(RepositoryExample, example)
+                self.processor.handle_save(RepositoryIntent, self.intent)
+
+        handle_saves_task.apply_async.assert_called_once()
+        instances, queued_at = handle_saves_task.apply_async.call_args[1]["args"]
+        self.assertEqual(
+            sorted(instances["common.repositoryexample"]),
+            sorted(example.pk for example in self.examples),
+        )
+        self.assertEqual(instances["common.repositoryintent"], [self.intent.pk])
+
+    @mock.patch("bothub.common.signals.handle_saves")
+    def test_discard_rolled_back(self, handle_saves_task):
+        with self.settings(USE_ELASTICSEARCH=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        self.processor.handle_save(RepositoryExample, self.examples[0])
+                        raise ValueError()
+                except ValueError:
+                    pass
+                self.processor.handle_save(RepositoryExample, self.examples[1])
+
+        handle_saves_task.apply_async.assert_called_once()
+        instances, queued_at = handle_saves_task.apply_async.call_args[1]["args"]
+        self.assertEqual(
+            instances, {"common.repositoryexample": [self.examples[1].pk]}
+        )
+
+    @mock.patch.object(RepositoryExampleDocument, "update")
+    def test_handle_saves(self, update):
+        with self.settings(USE_ELASTICSEARCH=True, ELASTICSEARCH_BULK_CHUNK_SIZE=1):
+            handle_saves({"common.repositoryintent": [self.intent.pk]})
+
+        self.assertEqual(update.call_count, 2)
+        self.assertEqual(
+            sorted(call[0][0].get().pk for call in update.call_args_list),
+            sorted(example.pk for example in self.examples),
+        )
@@ -1,16 +1,29 @@
+import csv
 import json
 import uuid
+from io import BytesIO
 
+import openpyxl
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase
+from django.test import override_settings
 from django.test import RequestFactory
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 
 from bothub.common import languages
 from bothub.common.models import Repository, RepositoryExampleEntity, RepositoryIntent
 from bothub.common.models import RepositoryExample
 from bothub.common.models import RepositoryTranslatedExample
+from bothub.common.models import RepositoryTranslatedExampleEntity
+from bothub.common.models import RepositoryVersionLanguage
+from bothub.common.models import RepositoryVersionLanguageStats
 
+from bothub.api.v2.translation.exporter import XLSX_COLUMNS, XLSX_SHEET_TITLE
 from bothub.api.v2.translation.views import RepositoryTranslatedExampleViewSet
+from bothub.api.v2.translation.views import RepositoryTranslatedExporterViewSet
 
 from .utils import create_user_and_token
 
@@ -43,7 +56,7 @@ class TranslateExampleTestCase(TestCase):
             "/v2/translation/",
             json.dumps(data),
             content_type="application/json",
-            **authorization_header
+            **authorization_header,
         )
         response = RepositoryTranslatedExampleViewSet.as_view({"post": "create"})(
             request
@@ -515,3 +528,320 @@ class TranslationsViewTest(TestCase):
             content_data.get("results")[0].get("original_example"), self.example.pk
         )
         self.assertEqual(content_data.get("results")[0].get("text"), "oi")
+
+
+class RepositoryTranslatedExporterRetrieveTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+        self.owner, self.owner_token = create_user_and_token("owner")
+
+        self.repository = Repository.objects.create(
+            owner=self.owner.repository_owner,
+            name="Testing",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+        self.version = self.repository.current_version().repository_version
+        self.intent = RepositoryIntent.objects.create(
+            text="greet", repository_version=self.version
+        )
+        self.example = self.create_example("hello my name is douglas")
+        RepositoryExampleEntity.objects.create(
+            repository_example=self.example, start=0, end=5, entity="greet"
+        )
+        RepositoryExampleEntity.objects.create(
+            repository_example=self.example, start=17, end=24, entity="name"
+        )
+        self.translated = RepositoryTranslatedExample.objects.create(
+            original_example=self.example,
+            language=languages.LANGUAGE_PT,
+            text="ola meu nome é douglas",
+        )
+        RepositoryTranslatedExampleEntity.objects.create(
+            repository_translated_example=self.translated,
+            start=15,
+            end=22,
+            entity="name",
+        )
+        self.untranslated = self.create_example("bye")
+
+    def create_example(self, text):
+        return RepositoryExample.objects.create(
+            repository_version_language=self.repository.current_version(),
+            text=text,
+            intent=self.intent,
+        )
+
+    def request(self, data):
+        request = self.factory.get(
+            "/v2/repository/translation-export/",
+            dict(
+                {
+                    "of_the_language": languages.LANGUAGE_EN,
+                    "for_the_language": languages.LANGUAGE_PT,
+                },
+                **data,
+            ),
+            HTTP_AUTHORIZATION="Token {}".format(self.owner_token.key),
+        )
+        return RepositoryTranslatedExporterViewSet.as_view({"get": "retrieve"})(
+            request, repository__uuid=self.repository.uuid, pk=self.version.pk
+        )
+
+    def test_okay(self):
+        response = self.request({})
+        response.render()
+        content_data = json.loads(response.content)["data"]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(content_data.get("entities"), ["greet", "name"])
+        self.assertEqual(
+            content_data.get("translations"),
+            [
+                {
+                    "id": str(self.example.pk),
+                    "repository_version": str(self.version.pk),
+                    "language": languages.LANGUAGE_EN,
+                    "original_text": "[hello](greet) my name is [douglas](name)",
+                    "translate": "ola meu nome é [douglas](name)",
+                    "translation_error": "",
+                },
+                {
+                    "id": str(self.untranslated.pk),
+                    "repository_version": str(self.version.pk),
+                    "language": languages.LANGUAGE_EN,
+                    "original_text": "bye",
+                    "translate": "",
+                    "translation_error": "",
+                },
+            ],
+        )
+
+    def test_without_translation(self):
+        response = self.request({"with_translation": False})
+        response.render()
+        content_data = json.loads(response.content)["data"]
+
+        self.assertEqual(
+            [translation["id"] for translation in content_data.get("translations")],
+            [str(self.untranslated.pk)],
+        )
+
+    def test_queries_dont_grow_with_examples(self):
+        # Creates and then caches the authorization of the user
+        self.request({})
+        self.request({})
+        with CaptureQueriesContext(connection) as context:
+            self.request({})
+        for text in ["one", "two", "three"]:
+            example = self.create_example(text)
+            RepositoryExampleEntity.objects.create(
+                repository_example=example, start=0, end=3, entity="number"
+            )
+            RepositoryTranslatedExample.objects.create(
+                original_example=example, language=languages.LANGUAGE_PT, text=text
+            )
+
+        with self.assertNumQueries(len(context.captured_queries)):
+            self.request({})
+
+    def test_csv(self):
+        response = self.request({"output": "csv"})
+        rows = list(
+            csv.reader(
+                b"".join(response.streaming_content).decode("utf-8").splitlines()
+            )
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(rows[0], XLSX_COLUMNS[1:])
+        self.assertEqual(
+            rows[1][3:5],
+            [
+                "[hello](greet) my name is [douglas](name)",
+                "ola meu nome é [douglas](name)",
+            ],
+        )
+        self.assertEqual(len(rows), 3)
+
+    def test_xlsx(self):
+        response = self.request({"output": "xlsx"})
+        workbook = openpyxl.load_workbook(BytesIO(b"".join(response.streaming_content)))
+        rows = list(workbook[XLSX_SHEET_TITLE].iter_rows(values_only=True))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(rows[0][1:], tuple(XLSX_COLUMNS[1:]))
+        self.assertEqual(rows[1][1], str(self.example.pk))
+        self.assertEqual(rows[1][5], "ola meu nome é [douglas](name)")
+        self.assertEqual(len(rows), 3)
+
+
+class RepositoryTranslatedExporterUpdateTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+        self.owner, self.owner_token = create_user_and_token("owner")
+
+        self.repository = Repository.objects.create(
+            owner=self.owner.repository_owner,
+            name="Testing",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+        self.version = self.repository.current_version().repository_version
+        self.intent = RepositoryIntent.objects.create(
+            text="greet", repository_version=self.version
+        )
+        self.example = self.create_example("hello world")
+        RepositoryExampleEntity.objects.create(
+            repository_example=self.example, start=6, end=11, entity="place"
+        )
+        self.other_example = self.create_example("bye")
+
+    def create_example(self, text):
+        return RepositoryExample.objects.create(
+            repository_version_language=self.repository.current_version(),
+            text=text,
+            intent=self.intent,
+        )
+
+    def row(self, example_id, translation, version=None):
+        return [
+            "",
+            str(example_id),
+            str(version or self.version.pk),
+            languages.LANGUAGE_EN,
+            "",
+            translation,
+            "",
+        ]
+
+    def request(self, rows):
+        workbook = openpyxl.Workbook()
+        worksheet = workbook.active
+        worksheet.title = XLSX_SHEET_TITLE
+        worksheet.append(["Bothub"])
+        worksheet.append(XLSX_COLUMNS)
+        for row in rows:
+            worksheet.append(row)
+        file = BytesIO()
+        workbook.save(file)
+
+        request = self.factory.put(
+            "/v2/repository/translation-export/",
+            encode_multipart(
+                BOUNDARY,
+                {
+                    "language": languages.LANGUAGE_PT,
+                    "file": SimpleUploadedFile("bothub.xlsx", file.getvalue()),
+                },
+            ),
+            MULTIPART_CONTENT,
+            HTTP_AUTHORIZATION="Token {}".format(self.owner_token.key),
+        )
+        return RepositoryTranslatedExporterViewSet.as_view({"put": "update"})(
+            request, repository__uuid=self.repository.uuid, pk=self.version.pk
+        )
+
+    def test_okay(self):
+        response = self.request(
+            [
+                self.row(self.example.pk, "ola [mundo](place)"),
+                self.row(self.other_example.pk, ""),
+                self.row(0, "nada"),
+                self.row(self.other_example.pk, "tchau [mundo](place)"),
+            ]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        translated = RepositoryTranslatedExample.objects.get(
+            original_example=self.example, language=languages.LANGUAGE_PT
+        )
+        self.assertEqual(translated.text, "ola mundo")
+        self.assertEqual(translated.repository_version_language.language, "pt")
+        self.assertEqual(
+            [entity.to_dict for entity in translated.entities.all()],
+            [{"start": 4, "end": 9, "entity": "place"}],
+        )
+        self.assertFalse(self.other_example.translations.exists())
+
+        workbook = openpyxl.load_workbook(BytesIO(b"".join(response.streaming_content)))
+        rows = list(workbook[XLSX_SHEET_TITLE].iter_rows(values_only=True))
+        self.assertEqual(rows[0][0], "Bothub")
+        self.assertEqual(rows[1][1:], tuple(XLSX_COLUMNS[1:]))
+        self.assertEqual(
+            [(row[1], row[6]) for row in rows[2:]],
+            [
+                ("0", "Sentence does not exist"),
+                (str(self.other_example.pk), "Entities must match"),
+            ],
+        )
+
+    def test_replaces_translation(self):
+        translated = RepositoryTranslatedExample.objects.create(
+            original_example=self.example, language=languages.LANGUAGE_PT, text="oi"
+        )
+        RepositoryTranslatedExampleEntity.objects.create(
+            repository_translated_example=translated, start=0, end=2, entity="place"
+        )
+
+        response = self.request([self.row(self.example.pk, "ola mundo")])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(self.example.translations.values_list("text", flat=True)),
+            ["ola mundo"],
+        )
+        self.assertFalse(
+            RepositoryTranslatedExampleEntity.objects.filter(
+                repository_translated_example__original_example=self.example
+            ).exists()
+        )
+
+    def test_other_version(self):
+        response = self.request(
+            [self.row(self.example.pk, "ola mundo", version=self.version.pk + 1)]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(self.example.translations.exists())
+
+    @override_settings(EXAMPLES_IMPORT_BATCH_SIZE=1)
+    def test_other_version_in_later_batch(self):
+        response = self.request(
+            [
+                self.row(self.example.pk, "ola mundo"),
+                self.row(self.other_example.pk, "tchau", version=self.version.pk + 1),
+            ]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(self.example.translations.exists())
+
+    def test_marks_stats_dirty(self):
+        RepositoryVersionLanguageStats.get_for(
+            RepositoryVersionLanguage.objects.filter(repository_version=self.version)
+        )
+        RepositoryVersionLanguageStats.objects.update(is_dirty=False)
+
+        self.request([self.row(self.example.pk, "ola mundo")])
+
+        self.assertTrue(
+            RepositoryVersionLanguageStats.objects.filter(is_dirty=True).exists()
+        )
+
+    def test_queries_dont_grow_with_rows(self):
+        # Creates and then caches the authorization of the user
+        self.request([self.row(self.example.pk, "ola [mundo](place)")])
+        self.request([self.row(self.example.pk, "ola [mundo](place)")])
+        with CaptureQueriesContext(connection) as context:
+            self.request([self.row(self.example.pk, "ola [mundo](place)")])
+
+        examples = [self.create_example(f"hello {number}") for number in range(3)]
+        with self.assertNumQueries(len(context.captured_queries)):
+            self.request(
+                [self.row(self.example.pk, "ola [mundo](place)")]
+                + [self.row(example.pk, "ola") for example in examples]
+            )
@@ -1,6 +1,9 @@
+from contextlib import contextmanager
+
 from bothub.utils import check_module_permission
 from rest_framework.authtoken.models import Token
 
+from bothub.api.v2.profiling import QueryProfile
 from bothub.authentication.models import User
 from bothub.common import languages
 from bothub.common.models import Repository
@@ -56,3 +59,25 @@ def create_repository_from_mockup(owner, categories, **mockup):
     for category in categories:
         r.categories.add(category)
     return r
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin to check that the code doesn't make more queries than the
+    budget declared for it, unlike assertNumQueries the failure lists the
+    queries repeated (N+1) instead of asking for the exact count.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        with QueryProfile() as profile:
+            yield profile
+
+        if profile.query_count > budget:
+            duplicates = "\n".join(
+                f"{count}x {sql}" for sql, count in profile.duplicates.items()
+            )
+            self.fail(
+                f"{profile.query_count} queries executed, budget of {budget}"
+                + (f"\nRepeated queries:\n{duplicates}" if duplicates else "")
+            )
@@ -0,0 +1,200 @@
+import csv
+import tempfile
+from collections import defaultdict
+
+from django.db.models import F, Q
+from openpyxl import Workbook
+
+from bothub import utils
+from bothub.common.models import (
+    RepositoryExample,
+    RepositoryExampleEntity,
+    RepositoryTranslatedExample,
+    RepositoryTranslatedExampleEntity,
+)
+
+EXPORT_CHUNK_SIZE = 1000
+
+# Same layout read by RepositoryTranslatedExporterViewSet.update
+XLSX_SHEET_TITLE = "Translate"
+XLSX_COLUMNS = [
+    "",
+    "ID",
+    "Repository Version",
+    "Language",
+    "Original Text",
+    "Translate",
+    "Translation Error",
+]
+
+
+class Echo:
+    """File-like object returning what is written, to stream the csv rows"""
+
+    def write(self, value):
+        return value
+
+
+class TranslationsExporter:
+    """
+    Exports the examples of ``repository_version`` in ``of_the_language``
+    with their translation to ``for_the_language`` (only the untranslated
+    ones without ``with_translation``), both texts with their entities
+    marked. The examples are read in chunks of EXPORT_CHUNK_SIZE with one
+    query for each of the examples, entities, translations and translated
+    entities of the chunk.
+    """
+
+    def __init__(
+        self, repository_version, of_the_language, for_the_language, with_translation
+    ):
+        self.repository_version = repository_version
+        self.of_the_language = of_the_language
+        self.for_the_language = for_the_language
+        self.with_translation = with_translation
+        # Used as an ordered set
+        self.entities = {}
+
+    def get_examples(self):
+        examples = self.repository_version.repository.examples(
+            queryset=RepositoryExample.objects.filter(
+                repository_version_language__repository_version=self.repository_version
+            ),
+            version_default=self.repository_version.is_default,
+        ).filter(repository_version_language__language=self.of_the_language)
+
+        if not self.with_translation:
+            examples = examples.exclude(translations__language=self.for_the_language)
+        return examples.order_by("created_at", "pk").values(
+            "pk",
+            "text",
+            "created_at",
+            language=F("repository_version_language__language"),
+        )
+
+    def iter_chunks(self):
+        examples = self.get_examples()
+        last = None
+        while True:
+            chunk = examples
+            if last is not None:
+                chunk = chunk.filter(
+                    Q(created_at__gt=last["created_at"])
+                    | Q(created_at=last["created_at"], pk__gt=last["pk"])
+                )
+            chunk = list(chunk[:EXPORT_CHUNK_SIZE])
+            if not chunk:
+                return
+            yield chunk
+            last = chunk[-1]
+
+    def rows(self):
+        """
+        Yields the rows of the exported examples, the entities found are
+        collected in ``entities`` along the way
+        """
+        for chunk in self.iter_chunks():
+            example_ids = [example["pk"] for example in chunk]
+
+            entities = defaultdict(list)
+            for entity in RepositoryExampleEntity.objects.filter(
+                repository_example__in=example_ids
+            ).values(
+                "repository_example", "start", "end", entity_value=F("entity__value")
+            ):
+                entities[entity["repository_example"]].append(
+                    dict(entity, entity=entity["entity_value"])
+                )
+
+            translations = {
+                translation["original_example"]: translation
+                for translation in RepositoryTranslatedExample.objects.filter(
+                    original_example__in=example_ids, language=self.for_the_language
+                )
+                .order_by()
+                .values("pk", "original_example", "text")
+            }
+            translated_entities = defaultdict(list)
+            for entity in RepositoryTranslatedExampleEntity.objects.filter(
+                repository_translated_example__in=[
+                    translation["pk"] for translation in translations.values()
+                ]
+            ).values(
+                "repository_translated_example",
+                "start",
+                "end",
+                entity_value=F("entity__value"),
+            ):
+                translated_entities[entity["repository_translated_example"]].append(
+                    dict(entity, entity=entity["entity_value"])
+                )
+
+            for example in chunk:
+                example_entities = entities[example["pk"]]
+                for entity in sorted(example_entities, key=lambda e: e["start"]):
+                    self.entities.setdefault(entity["entity"])
+
+                translation = translations.get(example["pk"])
+                text_translated = ""
+                if translation:
+                    text_translated = utils.format_entities(
+                        translation["text"], translated_entities[translation["pk"]]
+                    )
+
+                yield {
+                    "id": str(example["pk"]),
+                    "repository_version": str(self.repository_version.pk),
+                    "language": example["language"],
+                    "original_text": utils.format_entities(
+                        example["text"], example_entities
+                    ),
+                    "translate": text_translated,
+                    "translation_error": "",
+                }
+
+    def as_dict(self):
+        translations = list(self.rows())
+        return {"entities": list(self.entities), "translations": translations}
+
+    def iter_csv(self):
+        writer = csv.writer(Echo())
+        yield writer.writerow(XLSX_COLUMNS[1:])
+        for row in self.rows():
+            yield writer.writerow(
+                [
+                    row["id"],
+                    row["repository_version"],
+                    row["language"],
+                    row["original_text"],
+                    row["translate"],
+                    row["translation_error"],
+                ]
+            )
+
+    def write_xlsx(self, file):
+        """
+        Writes the xlsx workbook to ``file`` with a write-only workbook, the
+        rows are streamed to disk instead of kept in memory
+        """
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(XLSX_SHEET_TITLE)
+        worksheet.append(XLSX_COLUMNS)
+        for row in self.rows():
+            worksheet.append(
+                [
+                    "",
+                    row["id"],
+                    row["repository_version"],
+                    row["language"],
+                    row["original_text"],
+                    row["translate"],
+                    row["translation_error"],
+                ]
+            )
+        workbook.save(file)
+
+    def xlsx_file(self):
+        file = tempfile.TemporaryFile()
+        self.write_xlsx(file)
+        file.seek(0)
+        return file
@@ -0,0 +1,217 @@
+import re
+import tempfile
+
+import openpyxl
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+from openpyxl import Workbook
+
+from bothub import utils
+from bothub.api.v2.repository.validators import APIExceptionCustom
+from bothub.common.models import (
+    RepositoryExample,
+    RepositoryExampleEntity,
+    RepositoryTranslatedExample,
+    RepositoryTranslatedExampleEntity,
+    RepositoryVersionLanguage,
+    RepositoryVersionLanguageStats,
+)
+from .exporter import XLSX_COLUMNS, XLSX_SHEET_TITLE
+
+HEADER_COLUMNS = ["ID", "Repository Version", "Language"]
+ERROR_COLUMN = XLSX_COLUMNS.index("Translation Error")
+
+
+class TranslationsImporter:
+    """
+    Imports the translations to ``language`` of a workbook exported by
+    TranslationsExporter into ``repository_version``.
+
+    The workbook is read in read-only mode and its rows are handled in
+    batches of EXAMPLES_IMPORT_BATCH_SIZE: the examples and their entities are
+    loaded once per batch to validate the rows, the previous translations are
+    replaced with one delete and the new ones written with bulk_create.
+
+    The import is a single transaction, a row of another version rolls back
+    the batches already written. The rows that couldn't be imported are kept in ``errors``, with the error
+    in the "Translation Error" column, to build the workbook returned to the
+    user with ``write_errors_xlsx``.
+    """
+
+    def __init__(self, repository_version, language, batch_size=None):
+        self.repository_version = repository_version
+        self.language = language
+        self.batch_size = batch_size or settings.EXAMPLES_IMPORT_BATCH_SIZE
+        self.imported = 0
+        self.header = []
+        self.errors = []
+        self._version_language = None
+
+    def run(self, file):
+        workbook = openpyxl.load_workbook(filename=file, read_only=True)
+        try:
+            # A row of another version in a later batch undoes the whole import
+            with transaction.atomic():
+                batch = []
+                for row in self.iter_rows(workbook[XLSX_SHEET_TITLE]):
+                    batch.append(row)
+                    if len(batch) >= self.batch_size:
+                        self.import_batch(batch)
+                        batch = []
+                if batch:
+                    self.import_batch(batch)
+        finally:
+            workbook.close()
+        return self
+
+    def iter_rows(self, worksheet):
+        """
+        Yields the rows after the header, the header and the rows before it
+        are kept in ``header``
+        """
+        found = False
+        for row in worksheet.iter_rows(values_only=True):
+            row = list(row) + [None] * (len(XLSX_COLUMNS) - len(row))
+            if found:
+                if any(row):
+                    yield row
+                continue
+            self.header.append(row)
+            found = all(value in HEADER_COLUMNS for value in row[1:4])
+
+    def import_batch(self, batch):
+        rows = []
+        for row in batch:
+            if not str(row[2]).isdigit() or int(row[2]) != self.repository_version.pk:
+                raise APIExceptionCustom(
+                    detail=_("Import version is different from the selected version")
+                )
+            if row[5]:
+                row[5] = str(row[5])
+                rows.append((re.sub("[^0-9]", "", str(row[1] or "")), row))
+
+        example_ids = {int(example_id) for example_id, row in rows if example_id}
+        examples = set(
+            RepositoryExample.objects.filter(
+                pk__in=example_ids,
+                repository_version_language__repository_version=self.repository_version,
+            )
+            .order_by()
+            .values_list("pk", flat=True)
+        )
+        entities = {}
+        for example_id, value, entity_id in RepositoryExampleEntity.objects.filter(
+            repository_example__in=examples,
+            entity__repository_version=self.repository_version,
+        ).values_list("repository_example", "entity__value", "entity"):
+            entities.setdefault(example_id, {})[value] = entity_id
+
+        # {example: (text, entities)}, the last row of an example wins
+        translations = {}
+        for example_id, row in rows:
+            example_id = int(example_id or 0)
+            if example_id not in examples:
+                self.add_error(row, "Sentence does not exist")
+                continue
+
+            translated_entities = utils.find_entities_in_example(row[5])
+            example_entities = entities.get(example_id, {})
+            if any(
+                entity["entity"] not in example_entities
+                for entity in translated_entities
+            ):
+                self.add_error(row, "Entities must match")
+                continue
+
+            translations[example_id] = (
+                utils.get_without_entity(row[5]),
+                [
+                    dict(entity, entity_id=example_entities[entity["entity"]])
+                    for entity in translated_entities
+                ],
+            )
+
+        if translations:
+            self.save(translations)
+
+    def save(self, translations):
+        version_language = self.get_version_language()
+        now = timezone.now()
+
+        with transaction.atomic():
+            replaced = RepositoryTranslatedExample.objects.filter(
+                original_example__in=translations.keys(), language=self.language
+            )
+            # Deleted without collecting the instances, the stats are marked
+            # dirty once per batch instead of by each signal
+            RepositoryTranslatedExampleEntity.objects.filter(
+                repository_translated_example__in=replaced
+            )._raw_delete(replaced.db)
+            replaced._raw_delete(replaced.db)
+
+            created = RepositoryTranslatedExample.objects.bulk_create(
+                [
+                    RepositoryTranslatedExample(
+                        repository_version_language=version_language,
+                        original_example_id=example_id,
+                        language=self.language,
+                        text=text,
+                    )
+                    for example_id, (text, entities) in translations.items()
+                ]
+            )
+            RepositoryTranslatedExampleEntity.objects.bulk_create(
+                [
+                    RepositoryTranslatedExampleEntity(
+                        repository_translated_example=translated,
+                        start=entity["start"],
+                        end=entity["end"],
+                        entity_id=entity["entity_id"],
+                    )
+                    for translated, (text, entities) in zip(
+                        created, translations.values()
+                    )
+                    for entity in entities
+                ]
+            )
+
+            RepositoryExample.objects.filter(pk__in=translations.keys()).update(
+                last_update=now
+            )
+            RepositoryVersionLanguage.objects.filter(pk=version_language.pk).update(
+                last_update=now
+            )
+            RepositoryVersionLanguageStats.mark_dirty([self.repository_version.pk])
+
+        self.imported += len(created)
+
+    def get_version_language(self):
+        if self._version_language is None:
+            self._version_language = self.repository_version.get_version_language(
+                language=self.language
+            )
+        return self._version_language
+
+    def add_error(self, row, error):
+        row = list(row)
+        row[ERROR_COLUMN] = error
+        self.errors.append(row)
+
+    def write_errors_xlsx(self, file):
+        """
+        Writes the workbook with the header and only the rows that couldn't
+        be imported
+        """
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(XLSX_SHEET_TITLE)
+        for row in self.header + self.errors:
+            worksheet.append(row)
+        workbook.save(file)
+
+    def errors_xlsx_file(self):
+        file = tempfile.TemporaryFile()
+        self.write_errors_xlsx(file)
+        file.seek(0)
+        return file
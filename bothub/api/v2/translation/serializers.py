@@ -141,3 +141,4 @@ class RepositoryTranslatedImportSerializer(serializers.Serializer):
         LANGUAGE_CHOICES, label=_("Language"), required=True
     )
     with_translation = serializers.BooleanField(default=True)
+    output = serializers.ChoiceField(["json", "csv", "xlsx"], default="json")
@@ -1,24 +1,20 @@
-import re
-
-import openpyxl
-from django.db.models import Count, Q
-from django.http import HttpResponse
+from django.http import FileResponse, StreamingHttpResponse
 from django.utils.decorators import method_decorator
 from drf_yasg2 import openapi
 from drf_yasg2.utils import swagger_auto_schema
 from openpyxl.drawing.image import Image
-from openpyxl.writer.excel import save_virtual_workbook
 from rest_framework import mixins
 from rest_framework import permissions, status
-from rest_framework.exceptions import APIException
 from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from bothub import utils, settings
+from bothub import settings
 from bothub.api.v2.metadata import Metadata
 from bothub.api.v2.mixins import MultipleFieldLookupMixin
+from bothub.api.v2.translation.exporter import TranslationsExporter
 from bothub.api.v2.translation.filters import TranslationsFilter
+from bothub.api.v2.translation.importer import TranslationsImporter
 from bothub.api.v2.translation.permissions import (
     RepositoryTranslatedExamplePermission,
     RepositoryTranslatedExampleExporterPermission,
@@ -28,13 +24,7 @@ from bothub.api.v2.translation.serializers import (
     RepositoryTranslatedExporterSerializer,
     RepositoryTranslatedImportSerializer,
 )
-from bothub.common.models import RepositoryExample
-from bothub.common.models import RepositoryExampleEntity
-from bothub.common.models import (
-    RepositoryTranslatedExample,
-    RepositoryVersion,
-    RepositoryTranslatedExampleEntity,
-)
+from bothub.common.models import RepositoryTranslatedExample, RepositoryVersion
 
 
 class RepositoryTranslatedExampleViewSet(
@@ -106,6 +96,13 @@ class RepositoryTranslatedExampleViewSet(
                 type=openapi.TYPE_STRING,
                 required=True,
             ),
+            openapi.Parameter(
+                "output",
+                openapi.IN_QUERY,
+                description="Format of the export: json, csv or xlsx",
+                type=openapi.TYPE_STRING,
+                default="json",
+            ),
         ]
     ),
 )
@@ -127,200 +124,49 @@ class RepositoryTranslatedExporterViewSet(
     parser_classes = (MultiPartParser,)
     metadata_class = Metadata
 
-    def retrieve(self, request, *args, **kwargs):  # pragma: no cover
+    def retrieve(self, request, *args, **kwargs):
         repository_version = self.get_object()
 
         serializer = RepositoryTranslatedImportSerializer(data=request.query_params)
         serializer.is_valid(raise_exception=True)
 
-        with_translation = serializer.data.get("with_translation")
-        of_the_language = serializer.data.get("of_the_language")
-        for_the_language = serializer.data.get("for_the_language")
-
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=repository_version
-        )
-
-        examples = repository_version.repository.examples(
-            queryset=queryset, version_default=repository_version.is_default
-        ).annotate(
-            translation_count=Count(
-                "translations", filter=Q(translations__language=for_the_language)
-            )
+        exporter = TranslationsExporter(
+            repository_version,
+            of_the_language=serializer.data.get("of_the_language"),
+            for_the_language=serializer.data.get("for_the_language"),
+            with_translation=serializer.data.get("with_translation"),
         )
 
-        if with_translation:
-            examples = examples.filter(
-                repository_version_language__language=of_the_language
+        output = serializer.data.get("output")
+        if output == "csv":
+            response = StreamingHttpResponse(
+                exporter.iter_csv(), content_type="text/csv"
             )
-        else:
-            examples = examples.filter(
-                repository_version_language__language=of_the_language,
-                translation_count=0,
+            response["Content-Disposition"] = "attachment; filename=bothub.csv"
+            return response
+        if output == "xlsx":
+            return FileResponse(
+                exporter.xlsx_file(),
+                as_attachment=True,
+                filename="bothub.xlsx",
+                content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             )
 
-        examples = examples.order_by("created_at")
-
-
-        entities_list = []
-        example_list = []
-
-        for example in examples:
-            entities = RepositoryExampleEntity.objects.filter(
-                repository_example=example
-            ).order_by("start")
-            text = example.text
-            count_entity = 0
-            for entity in entities:
-                if entity.entity.value not in entities_list:
-                    entities_list.append(entity.entity.value)
-                text = utils.format_entity(
-                    text=text,
-                    entity=entity.entity.value,
-                    start=entity.start + count_entity,
-                    end=entity.end + count_entity,
-                )
-                count_entity += len(entity.entity.value) + 4
-
-            translated = RepositoryTranslatedExample.objects.filter(
-                original_example=example.pk, language=for_the_language
-            )
-
-            text_translated = ""
-
-            if translated:
-                translated = translated.first()
-                text_translated = translated.text
-                entities_translate = RepositoryTranslatedExampleEntity.objects.filter(
-                    repository_translated_example=translated
-                ).order_by("start")
-                count_entity = 0
-                for entity in entities_translate:
-                    text_translated = utils.format_entity(
-                        text=text_translated,
-                        entity=entity.entity.value,
-                        start=entity.start + count_entity,
-                        end=entity.end + count_entity,
-                    )
-                    count_entity += len(entity.entity.value) + 4
-
-            example_list.append({
-                "id": str(example.pk),
-                "repository_version": str(example.repository_version_language.repository_version.pk),
-                "language": example.repository_version_language.language,
-                "original_text": str(text),
-                "translate": str(text_translated),
-                "translation_error": ""
-            })
+        return Response({"data": exporter.as_dict()}, status=status.HTTP_200_OK)
 
-        return Response({"data": {"entities": entities_list, "translations": example_list}}, status=status.HTTP_200_OK)
+    def update(self, request, *args, **kwargs):
+        repository_version = self.get_object()
 
-    def update(self, request, *args, **kwargs):  # pragma: no cover
         serializer = RepositoryTranslatedExporterSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        for_language = serializer.data.get("language", None)
-
-        workbook = openpyxl.load_workbook(filename=request.data.get("file"))
-        worksheet = workbook.get_sheet_by_name("Translate")
-        columns = ["ID", "Repository Version", "Language"]
-
-        examples_success = []
-
-        find = False
-        for count, row in enumerate(worksheet.iter_rows(), start=1):
-            if (
-                row[1].value in columns
-                and row[2].value in columns
-                and row[3].value in columns
-            ):
-                find = True
-                continue
-            if find:
-                example_id = int(re.sub("[^0-9]", "", row[1].value))
-                repository_version = int(row[2].value)
-                text_translated = row[5].value
-
-                if not int(kwargs.get("pk")) == repository_version:
-                    raise APIException(  # pragma: no cover
-                        {
-                            "detail": "Import version is different from the selected version"
-                        },
-                        code=400,
-                    )
-
-                if text_translated:
-                    example = RepositoryExample.objects.filter(
-                        pk=example_id,
-                        repository_version_language__repository_version=repository_version,
-                        repository_version_language__repository_version__repository=kwargs.get(
-                            "repository__uuid"
-                        ),
-                    )
-                    if example.count() == 0:
-                        worksheet.cell(
-                            row=count, column=7, value="Sentence does not exist"
-                        )
-                        continue
-
-                    example = example.first()
-
-                    entity_validation = False
-
-                    for entity in utils.find_entities_in_example(text_translated):
-                        original_text_count_entity = RepositoryExampleEntity.objects.filter(
-                            repository_example=example,
-                            entity__repository_version=kwargs.get("pk"),
-                            entity__value=entity.get("entity"),
-                        ).count()
-
-                        if original_text_count_entity == 0:
-                            entity_validation = True
-                            worksheet.cell(
-                                row=count, column=7, value="Entities must match"
-                            )
-                            break
-
-                    if entity_validation:
-                        continue
-
-                    translated_examples = RepositoryTranslatedExample.objects.filter(
-                        original_example=example, language=for_language
-                    )
-
-                    if translated_examples.count() > 0:
-                        translated_examples.delete()
-
-                    version_language = example.repository_version_language.repository_version.get_version_language(
-                        language=for_language
-                    )
-
-                    translated = RepositoryTranslatedExample.objects.create(
-                        repository_version_language=version_language,
-                        original_example=example,
-                        language=for_language,
-                        text=utils.get_without_entity(text_translated),
-                        clone_repository=True,
-                    )
-
-                    for translated_entity in utils.find_entities_in_example(
-                        text_translated
-                    ):
-                        RepositoryTranslatedExampleEntity.objects.create(
-                            repository_translated_example=translated,
-                            start=translated_entity["start"],
-                            end=translated_entity["end"],
-                            entity=translated_entity["entity"],
-                        )
-
-                examples_success.append(count)
-
-        for r in reversed(examples_success):
-            worksheet.delete_rows(r)
+        importer = TranslationsImporter(
+            repository_version, language=serializer.data.get("language")
+        ).run(request.data.get("file"))
 
-        response = HttpResponse(
-            content=save_virtual_workbook(workbook),
+        return FileResponse(
+            importer.errors_xlsx_file(),
+            as_attachment=True,
+            filename="bothub.xlsx",
             content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
-        response["Content-Disposition"] = "attachment; filename=bothub.xlsx"
-        return response
@@ -9,6 +9,7 @@ from mozilla_django_oidc.auth import OIDCAuthenticationBackend
 from rest_framework import exceptions
 from rest_framework.authentication import TokenAuthentication, get_authorization_header
 
+from bothub.authentication.cache import get_cached_authorization
 from bothub.common.models import (
     RepositoryTranslator,
     Repository,
@@ -68,9 +69,8 @@ class NLPAuthentication(TokenAuthentication):
         return self.authenticate_credentials(token)
 
     def authenticate_credentials(self, key):
-        model = self.get_model()
         try:
-            authorization = model.objects.get(uuid=key)
+            authorization = get_cached_authorization(key)
             if not authorization.can_translate:
                 raise exceptions.PermissionDenied()
 
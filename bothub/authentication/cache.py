@@ -0,0 +1,310 @@
+import logging
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Subquery
+from django.utils.functional import SimpleLazyObject
+
+from bothub.authentication.models import RepositoryOwner
+from bothub.common.models import (
+    OrganizationAuthorization,
+    Repository,
+    RepositoryAuthorization,
+)
+from bothub.utils import LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+NLP_AUTHORIZATION_CACHE_KEY = "nlp_authorization:{}"
+USER_AUTHORIZATION_CACHE_KEY = "user_authorization:{}:{}"
+
+# Fields of the RepositoryAuthorization cached, in the model order
+USER_AUTHORIZATION_FIELDS = ["uuid", "user_id", "repository_id", "role", "created_at"]
+
+local_authorizations = LocalLRUCache(
+    maxsize=settings.NLP_AUTHORIZATION_LOCAL_CACHE_SIZE,
+    timeout=settings.NLP_AUTHORIZATION_LOCAL_CACHE_TIMEOUT,
+)
+
+# User authorizations resolved in the current request, see UserAuthorizationsMemo
+request_authorizations = Local()
+
+
+@dataclass(frozen=True)
+class CachedRepositoryAuthorization:
+    """
+    Resolved copy of a RepositoryAuthorization (token), with the effective
+    level already computed, so permission checks do not touch the database.
+    """
+
+    uuid: str
+    user_id: Optional[int]
+    repository_id: str
+    level: int
+
+    @property
+    def pk(self):
+        return self.uuid
+
+    @property
+    def user(self):
+        if self.user_id is None:
+            return None
+        return SimpleLazyObject(lambda: RepositoryOwner.objects.get(pk=self.user_id))
+
+    @property
+    def can_read(self):
+        return self.level in [
+            RepositoryAuthorization.LEVEL_READER,
+            RepositoryAuthorization.LEVEL_CONTRIBUTOR,
+            RepositoryAuthorization.LEVEL_ADMIN,
+        ]
+
+    @property
+    def can_contribute(self):
+        return self.level in [
+            RepositoryAuthorization.LEVEL_CONTRIBUTOR,
+            RepositoryAuthorization.LEVEL_ADMIN,
+        ]
+
+    @property
+    def can_write(self):
+        return self.level in [RepositoryAuthorization.LEVEL_ADMIN]
+
+    @property
+    def can_translate(self):
+        return self.level in [
+            RepositoryAuthorization.LEVEL_CONTRIBUTOR,
+            RepositoryAuthorization.LEVEL_ADMIN,
+        ]
+
+    @property
+    def is_admin(self):
+        return self.level == RepositoryAuthorization.LEVEL_ADMIN
+
+
+def _cache_get(key):
+    try:
+        return cache.get(key)
+    except Exception as e:  # pragma: no cover
+        logger.warning(f"Could not read the authorization cache: {e}")
+        return None
+
+
+def _cache_set(key, value, timeout=None):
+    try:
+        cache.set(key, value, timeout or settings.NLP_AUTHORIZATION_CACHE_TIMEOUT)
+    except Exception as e:  # pragma: no cover
+        logger.warning(f"Could not write the authorization cache: {e}")
+
+
+def _cache_delete_many(keys):
+    try:
+        cache.delete_many(keys)
+    except Exception as e:  # pragma: no cover
+        logger.warning(f"Could not invalidate the authorization cache: {e}")
+
+
+def get_cached_authorization(token) -> CachedRepositoryAuthorization:
+    """
+    Returns the resolved authorization of ``token`` looking first at the
+    in-process cache, then at the shared cache and finally at the database.
+    Raises RepositoryAuthorization.DoesNotExist for unknown tokens.
+    """
+    key = NLP_AUTHORIZATION_CACHE_KEY.format(str(token).lower())
+
+    authorization = local_authorizations.get(key)
+    if authorization is not None:
+        return authorization
+
+    data = _cache_get(key)
+    if data is None:
+        repository_authorization = RepositoryAuthorization.objects.select_related(
+            "repository", "user"
+        ).get(uuid=token)
+        data = {
+            "uuid": str(repository_authorization.uuid),
+            "user_id": repository_authorization.user_id,
+            "repository_id": str(repository_authorization.repository_id),
+            "level": repository_authorization.level,
+        }
+        _cache_set(key, data)
+
+    authorization = CachedRepositoryAuthorization(**data)
+    local_authorizations.set(key, authorization)
+    return authorization
+
+
+def invalidate_authorizations(tokens: Iterable):
+    keys = [NLP_AUTHORIZATION_CACHE_KEY.format(str(token).lower()) for token in tokens]
+    if not keys:
+        return
+
+    def delete():
+        for key in keys:
+            local_authorizations.delete(key)
+        _cache_delete_many(keys)
+
+    delete()
+    # A request running concurrently with the transaction could cache the old
+    # record again before the change is committed, so drop it once more after it.
+    transaction.on_commit(delete)
+
+
+def invalidate_repository_authorizations(repository_id):
+    invalidate_authorizations(
+        RepositoryAuthorization.objects.filter(repository_id=repository_id).values_list(
+            "uuid", flat=True
+        )
+    )
+
+
+def invalidate_organization_authorizations(organization_id, user_id):
+    invalidate_authorizations(
+        RepositoryAuthorization.objects.filter(
+            repository__owner_id=organization_id, user_id=user_id
+        ).values_list("uuid", flat=True)
+    )
+
+
+class UserAuthorizationsMemo:
+    """
+    Context manager memoizing the user authorizations resolved while it is
+    active, wrapped around each request by UserAuthorizationsMemoMiddleware
+    """
+
+    def __enter__(self):
+        request_authorizations.data = {}
+        return self
+
+    def __exit__(self, *exc_info):
+        request_authorizations.data = None
+
+
+def _memo():
+    return getattr(request_authorizations, "data", None)
+
+
+def _get_or_create_authorization(repository, owner):
+    """
+    Returns the authorization of ``owner`` in ``repository``, the role of the
+    owner in the organization of the repository and whether it was created,
+    with a single query for an existing authorization
+    """
+    organization_roles = OrganizationAuthorization.objects.filter(
+        organization_id=repository.owner_id, user=owner
+    ).values_list("role", flat=True)
+    authorization = (
+        RepositoryAuthorization.objects.filter(user=owner, repository=repository)
+        .annotate(organization_role=Subquery(organization_roles[:1]))
+        .first()
+    )
+    if authorization is not None:
+        return authorization, authorization.organization_role or 0, False
+
+    organization_role = organization_roles.first() or 0
+    try:
+        with transaction.atomic():
+            authorization = RepositoryAuthorization.objects.create(
+                user=owner, repository=repository, role=organization_role
+            )
+    except IntegrityError:
+        # Created by a concurrent request
+        authorization = RepositoryAuthorization.objects.get(
+            user=owner, repository=repository
+        )
+        return authorization, organization_role, False
+    return authorization, organization_role, True
+
+
+def get_user_authorization(repository, user) -> RepositoryAuthorization:
+    """
+    Returns the RepositoryAuthorization of ``user`` in ``repository`` with
+    its effective role, the highest of its own role and the role of the user
+    in the organization owning the repository.
+
+    The resolved authorizations are memoized for the current request and
+    kept in the shared cache, so repeated checks do not touch the database.
+    The authorization is only written when it does not exist yet, the roles
+    of the organization members are kept in sync by
+    sync_organization_authorization instead.
+    """
+    owner = user.repository_owner
+    key = USER_AUTHORIZATION_CACHE_KEY.format(owner.pk, repository.pk)
+
+    memo = _memo()
+    data = memo.get(key) if memo is not None else None
+    if data is None:
+        data = _cache_get(key)
+    if data is None:
+        authorization, organization_role, created = _get_or_create_authorization(
+            repository, owner
+        )
+        data = {
+            field: getattr(authorization, field) for field in USER_AUTHORIZATION_FIELDS
+        }
+        data["role"] = max(authorization.role, organization_role)
+
+        def share():
+            _cache_set(key, data, settings.USER_AUTHORIZATION_CACHE_TIMEOUT)
+
+        # A new authorization is only shared once it is committed
+        if created:
+            transaction.on_commit(share)
+        else:
+            share()
+    if memo is not None:
+        memo[key] = data
+
+    authorization = RepositoryAuthorization.from_db(
+        None,
+        USER_AUTHORIZATION_FIELDS,
+        [data[field] for field in USER_AUTHORIZATION_FIELDS],
+    )
+    authorization.repository = repository
+    authorization.user = user
+    return authorization
+
+
+def invalidate_user_authorizations(user_id, repository_ids: Iterable):
+    keys = [
+        USER_AUTHORIZATION_CACHE_KEY.format(user_id, repository_id)
+        for repository_id in repository_ids
+    ]
+    if user_id is None or not keys:
+        return
+
+    def delete():
+        memo = _memo()
+        if memo is not None:
+            for key in keys:
+                memo.pop(key, None)
+        _cache_delete_many(keys)
+
+    delete()
+    transaction.on_commit(delete)
+
+
+def sync_organization_authorization(organization_authorization):
+    """
+    Raises the roles of the member in the repositories of the organization
+    to their role in it, as the effective role resolved on reads
+    """
+    RepositoryAuthorization.objects.filter(
+        repository__owner_id=organization_authorization.organization_id,
+        user_id=organization_authorization.user_id,
+        role__lt=organization_authorization.role,
+    ).update(role=organization_authorization.role)
+
+
+def invalidate_organization_user_authorizations(organization_id, user_id):
+    invalidate_user_authorizations(
+        user_id,
+        Repository.objects.filter(owner_id=organization_id).values_list(
+            "pk", flat=True
+        ),
+    )
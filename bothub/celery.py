@@ -1,6 +1,6 @@
 from __future__ import absolute_import, unicode_literals
 import os
-from celery import Celery, schedules
+from celery import Celery, schedules, signals
 
 from bothub import settings
 
@@ -24,13 +24,35 @@ app.conf.beat_schedule = {
         "task": "bothub.common.tasks.repositories_count_authorizations",
         "schedule": schedules.crontab(hour="8", minute=0),
     },
+    "repositories-count-authorizations-incremental": {
+        "task": "bothub.common.tasks.repositories_count_authorizations",
+        "schedule": schedules.crontab(minute=30),
+        "kwargs": {"incremental": True},
+    },
     "repository-score": {
         "task": "bothub.common.tasks.repository_score",
         "schedule": schedules.crontab(minute="*/5"),
     },
+    "repository-score-full": {
+        "task": "bothub.common.tasks.repository_score",
+        "schedule": schedules.crontab(hour="4", minute=0),
+        "kwargs": {"full": True},
+    },
+    "flush-repository-reports": {
+        "task": "bothub.common.tasks.flush_repository_reports",
+        "schedule": float(settings.REPOSITORY_REPORTS_FLUSH_INTERVAL),
+    },
 }
 
 
+@signals.worker_init.connect
+def preload_worker_resources(**kwargs):
+    # worker_init runs in the parent process, before the pool is forked
+    from bothub.common.helpers import preload_tokenizers
+
+    preload_tokenizers()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print("Request: {0!r}".format(self.request))
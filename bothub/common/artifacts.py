@@ -0,0 +1,115 @@
+import hashlib
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from bothub.storage import FileSystemStorage, S3Storage
+
+ARTIFACT_STORE_CLASSES = {
+    "s3": "bothub.common.artifacts.S3ArtifactStore",
+    "filesystem": "bothub.common.artifacts.FileSystemArtifactStore",
+}
+
+# Instance of each store, created on the first use in the process
+_stores = {}
+
+
+class ArtifactStore:
+    """
+    Content-addressed store of the trained models (bot_data): each artifact
+    is kept once under the sha256 of its content, so the versions sharing a
+    model (e.g. the clones) share the same artifact, and it is read back in
+    chunks of MODEL_ARTIFACTS_CHUNK_SIZE bytes.
+    """
+
+    storage_class = None
+
+    def __init__(self):
+        self.storage = self.storage_class()
+
+    @property
+    def chunk_size(self):
+        return settings.MODEL_ARTIFACTS_CHUNK_SIZE
+
+    def key(self, digest: str) -> str:
+        return f"{settings.MODEL_ARTIFACTS_PREFIX}/{digest[:2]}/{digest}.tar.gz"
+
+    def exists(self, digest: str) -> bool:
+        return self.storage.exists(self.key(digest))
+
+    def save(self, digest: str, file):
+        self.storage.upload(self.key(digest), file, content_type="application/gzip")
+
+    def open(self, digest: str):
+        """Returns a file-like object with the content of the artifact"""
+        return self.storage.open(self.key(digest))
+
+    def size(self, digest: str) -> Optional[int]:
+        return self.storage.size(self.key(digest))
+
+    def url(self, digest: str) -> Optional[str]:
+        """Temporary URL to download the artifact directly, if supported"""
+        return None
+
+    def iter_chunks(self, digest: str) -> Iterator[bytes]:
+        file = self.open(digest)
+        try:
+            while True:
+                chunk = file.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            file.close()
+
+    def put(self, file) -> str:
+        """
+        Stores the content of the seekable ``file`` unless an artifact with
+        the same content already exists, returns its sha256
+        """
+        sha256 = hashlib.sha256()
+        for chunk in iter(lambda: file.read(self.chunk_size), b""):
+            sha256.update(chunk)
+        digest = sha256.hexdigest()
+
+        if not self.exists(digest):
+            file.seek(0)
+            self.save(digest, file)
+        return digest
+
+
+class ArtifactsFileSystemStorage(FileSystemStorage):
+    @property
+    def root(self):
+        return settings.MODEL_ARTIFACTS_ROOT
+
+
+class FileSystemArtifactStore(ArtifactStore):
+    """Stores the artifacts under the MODEL_ARTIFACTS_ROOT directory"""
+
+    storage_class = ArtifactsFileSystemStorage
+
+
+class S3ArtifactStore(ArtifactStore):
+    """
+    Stores the artifacts in the BOTHUB_ENGINE_AWS_S3_BUCKET_NAME bucket,
+    downloaded through presigned URLs
+    """
+
+    storage_class = S3Storage
+
+    def url(self, digest):
+        return self.storage.url(
+            self.key(digest), settings.MODEL_ARTIFACTS_URL_EXPIRATION
+        )
+
+
+def get_artifact_store() -> Optional[ArtifactStore]:
+    """The MODEL_ARTIFACTS_STORAGE store of the process, None if disabled"""
+    storage = settings.MODEL_ARTIFACTS_STORAGE
+    if not storage:
+        return None
+    if storage not in _stores:
+        _stores[storage] = import_string(ARTIFACT_STORE_CLASSES[storage])()
+    return _stores[storage]
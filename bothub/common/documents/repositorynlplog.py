@@ -71,6 +71,17 @@ class RepositoryNLPLogDocument(TimeBasedDocument):
         model = RepositoryNLPLog
         fields = ["id", "text", "from_backend", "user_agent", "created_at"]
 
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .select_related(
+                "user",
+                "repository_version_language__repository_version__repository",
+            )
+            .prefetch_related("repository_nlp_log")
+        )
+
     def prepare_nlp_log(self, obj):
         return json.loads(obj.nlp_log)
 
@@ -1,38 +1,84 @@
-from transformers import GPT2TokenizerFast
+import logging
 import re
+import threading
+
+from transformers import GPT2TokenizerFast
 
 from django.conf import settings
-from typing import Tuple, List
+from typing import Dict, Tuple, List
+
+logger = logging.getLogger(__name__)
+
+sentence_boundary_regex = re.compile(r"(?<=[.!?])\s+(?=[^\d])")
+
+_tokenizers: Dict[str, GPT2TokenizerFast] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def get_tokenizer(name: str = "gpt2") -> GPT2TokenizerFast:
+    """
+    Returns the process-wide tokenizer registered for ``name``, loading it on
+    first use. When it is loaded in the parent process (see preload_tokenizers)
+    the forked gunicorn/celery workers share it instead of loading their own.
+    """
+    tokenizer = _tokenizers.get(name)
+    if tokenizer is None:
+        with _tokenizers_lock:
+            tokenizer = _tokenizers.get(name)
+            if tokenizer is None:
+                tokenizer = GPT2TokenizerFast.from_pretrained(name)
+                _tokenizers[name] = tokenizer
+    return tokenizer
+
+
+def preload_tokenizers():
+    """
+    Warms up the tokenizer registry before the server/worker processes fork.
+    A failure here is not fatal, the tokenizer is loaded lazily on first use.
+    """
+    try:
+        get_tokenizer()
+    except Exception as e:  # pragma: no cover
+        logger.warning(f"Could not preload tokenizers: {e}")
 
 
 class ChatGPTTokenText:
     max_tokens: int = settings.GPT_MAX_TOKENS
 
+    @staticmethod
+    def sentence_spans(text: str) -> List[Tuple[int, int]]:
+        spans = []
+        current_position = 0
+        for match in sentence_boundary_regex.finditer(text):
+            spans.append((current_position, match.start() + 1))
+            current_position = match.end()
+        return spans
+
     def count_tokens(self, text: str) -> Tuple[int, List[str]]:
-        tokenizer = GPT2TokenizerFast.from_pretrained("gpt2")
+        spans = self.sentence_spans(text)
+        if not spans:
+            return (0, [])
 
-        sentence_boundary_pattern = r'(?<=[.!?])\s+(?=[^\d])'
-        sentence_boundaries = [(m.start(), m.end()) for m in re.finditer(sentence_boundary_pattern, text)]
+        # Tokenize every sentence in a single batched call
+        token_counts = [
+            len(input_ids)
+            for input_ids in get_tokenizer()(
+                [text[start:end] for start, end in spans],
+                return_attention_mask=False,
+            )["input_ids"]
+        ]
 
         chunks = []
         current_chunk = []
         current_token_count = 0
-        current_position = 0
-        total_token_count = 0
-
-        for boundary_start, boundary_end in sentence_boundaries:
-            sentence = text[current_position : boundary_start + 1]
-            current_position = boundary_end
-
-            token_count = len(tokenizer(sentence)["input_ids"])
-            total_token_count += token_count
 
+        for span, token_count in zip(spans, token_counts):
             if current_token_count + token_count <= self.max_tokens:
-                current_chunk.append(sentence)
+                current_chunk.append(span)
                 current_token_count += token_count
             else:
-                chunks.append(''.join(current_chunk))
-                current_chunk = [sentence]
+                chunks.append("".join(text[start:end] for start, end in current_chunk))
+                current_chunk = [span]
                 current_token_count = token_count
 
-        return (total_token_count, chunks)
+        return (sum(token_counts), chunks)
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from transformers import GPT2TokenizerFast
+
+from bothub.common.helpers import ChatGPTTokenText, get_tokenizer
+
+
+SAMPLE_SENTENCE = (
+    "Our support team answers messages from Monday to Friday, 8am to 6pm. "
+    "Orders above 200 dollars ship for free! Did you know you can track them online? "
+)
+
+
+def legacy_count_tokens(text):
+    """Previous implementation: loads the tokenizer and tokenizes one sentence at a time"""
+    tokenizer = GPT2TokenizerFast.from_pretrained("gpt2")
+
+    total_token_count = 0
+    for start, end in ChatGPTTokenText.sentence_spans(text):
+        total_token_count += len(tokenizer(text[start:end])["input_ids"])
+    return total_token_count
+
+
+class Command(BaseCommand):
+    help = "Compare the token counting of knowledge base texts before/after the tokenizer registry"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", type=str, help="Text file used as input")
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def handle(self, *args, **options):
+        if options.get("file"):
+            with open(options["file"]) as f:
+                text = f.read()
+        else:
+            text = SAMPLE_SENTENCE * 100
+
+        iterations = options["iterations"]
+        validator = ChatGPTTokenText()
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            legacy_count_tokens(text)
+        legacy_elapsed = (time.perf_counter() - start) / iterations
+
+        get_tokenizer()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            validator.count_tokens(text)
+        elapsed = (time.perf_counter() - start) / iterations
+
+        print(f"Text: {len(text)} characters, {iterations} iterations")
+        print(f"Before: {legacy_elapsed * 1000:.2f} ms per text")
+        print(f"After: {elapsed * 1000:.2f} ms per text")
+        print(f"Speedup: {legacy_elapsed / elapsed:.1f}x")
@@ -0,0 +1,64 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from rest_framework.authtoken.models import Token
+
+from bothub.api.v2.profiling import summarize
+from bothub.authentication.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Profile the queries of API views, requesting the given paths or "
+        "summarizing a QUERY_PROFILER_REPORT file, the report is printed as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help="Paths requested with GET")
+        parser.add_argument(
+            "--report", type=str, help="Summarize this QUERY_PROFILER_REPORT file"
+        )
+        parser.add_argument(
+            "--user", type=str, help="Email of the user making the requests"
+        )
+        parser.add_argument("--repeat", type=int, default=1)
+        parser.add_argument("--output", type=str, help="Write the report to a file")
+
+    def handle(self, *args, **options):
+        if options["report"]:
+            with open(options["report"]) as report:
+                entries = [json.loads(line) for line in report if line.strip()]
+        elif options["paths"]:
+            entries = self.profile_paths(
+                options["paths"], options["user"], options["repeat"]
+            )
+        else:
+            raise CommandError("Give the paths to profile or a --report file")
+
+        report = json.dumps(summarize(entries), indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
+
+    def profile_paths(self, paths, user_email, repeat):
+        headers = {}
+        if user_email:
+            try:
+                user = User.objects.get(email=user_email)
+            except User.DoesNotExist:
+                raise CommandError(f"User {user_email} not found")
+            token, created = Token.objects.get_or_create(user=user)
+            headers["HTTP_AUTHORIZATION"] = f"Token {token.key}"
+
+        with tempfile.NamedTemporaryFile("r") as report, override_settings(
+            QUERY_PROFILER=True, QUERY_PROFILER_REPORT=report.name
+        ):
+            client = Client()
+            for path in paths:
+                for _ in range(repeat):
+                    client.get(path, **headers)
+            return [json.loads(line) for line in report if line.strip()]
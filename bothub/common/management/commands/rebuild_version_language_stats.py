@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from bothub.common.models import (
+    RepositoryVersionLanguage,
+    RepositoryVersionLanguageStats,
+)
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Rebuild the dataset stats of the repository version languages"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dirty",
+            action="store_true",
+            help="Only rebuild the stats flagged as dirty or not built yet",
+        )
+
+    def handle(self, *args, **options):
+        version_languages = RepositoryVersionLanguage.objects.all()
+        if options["dirty"]:
+            version_languages = version_languages.exclude(stats__is_dirty=False)
+
+        num_updated = 0
+        max_id = -1
+        while True:
+            batch = list(
+                version_languages.filter(id__gt=max_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+
+            RepositoryVersionLanguageStats.objects.filter(pk__in=batch).update(
+                is_dirty=True
+            )
+            RepositoryVersionLanguageStats.get_for(
+                RepositoryVersionLanguage.objects.filter(pk__in=batch)
+            )
+
+            num_updated += len(batch)
+            print(f" > Rebuilt {num_updated} version languages stats")
+
+            max_id = batch[-1]
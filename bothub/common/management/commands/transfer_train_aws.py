@@ -1,4 +1,7 @@
 import base64
+import os
+import time
+from concurrent import futures
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
@@ -6,24 +9,115 @@ from django.core.management.base import BaseCommand
 from bothub.common.models import RepositoryNLPTrain
 from bothub.utils import send_bot_data_file_aws
 
+BATCH_SIZE = 100
+
+
+def transfer(update):
+    """Uploads the bot_data of ``update`` (pk, bot_data), returns its url"""
+    pk, bot_data = update
+    bot_data = base64.b64decode(bot_data)
+    return send_bot_data_file_aws(pk, bot_data), len(bot_data)
+
 
 class Command(BaseCommand):
-    def handle(self, *args, **kwargs):
-        if settings.AWS_SEND:
-            repo = RepositoryNLPTrain.objects.all().exclude(bot_data__exact="")
-            for update in repo:
-                try:
-                    repository_update = RepositoryNLPTrain.objects.get(pk=update.pk)
-                    bot_data = send_bot_data_file_aws(
-                        update.pk, base64.b64decode(update.bot_data)
-                    )
-                    repository_update.bot_data = bot_data
-                    repository_update.save(update_fields=["bot_data"])
-                    print(
-                        "Updating bot_data repository_update {}".format(str(update.pk))
-                    )
-                except Exception as e:
-                    print("Error " + str(update.pk))
-                    print(str(e))
-        else:
+    help = "Move the trained models stored in the database to the aws bucket"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=8, help="Number of concurrent uploads"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Trainings loaded at once, the progress is saved after each batch",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default="transfer_train_aws.checkpoint",
+            help="File keeping the id of the last transferred training",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint, retrying the trainings that failed",
+        )
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as checkpoint:
+                return int(checkpoint.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, path, last_id):
+        # Written aside and moved, an interruption never leaves it truncated
+        with open(f"{path}.tmp", "w") as checkpoint:
+            checkpoint.write(str(last_id))
+        os.replace(f"{path}.tmp", path)
+
+    def handle(self, *args, **options):
+        if not settings.AWS_SEND:
             print("You need to configure the environment variables for AWS.")
+            return
+
+        # The ones already transferred keep the url of the model
+        trainings = RepositoryNLPTrain.objects.exclude(bot_data__exact="").exclude(
+            bot_data__startswith="http"
+        )
+        last_id = 0
+        if not options["restart"]:
+            last_id = self.read_checkpoint(options["checkpoint"])
+        if last_id:
+            print(f"Resuming after the training {last_id}")
+
+        started_at = time.monotonic()
+        num_transferred = num_failed = transferred_bytes = 0
+        with futures.ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                ids = list(
+                    trainings.filter(pk__gt=last_id)
+                    .order_by("pk")
+                    .values_list("pk", flat=True)[: options["batch_size"]]
+                )
+                if not ids:
+                    break
+
+                batch = trainings.filter(pk__gt=last_id, pk__lte=ids[-1]).order_by("pk")
+                pending = {
+                    executor.submit(transfer, update): update[0]
+                    for update in batch.values_list("pk", "bot_data").iterator()
+                }
+
+                updated = []
+                for future in futures.as_completed(pending):
+                    pk = pending[future]
+                    try:
+                        url, size = future.result()
+                    except Exception as e:
+                        url, size = "", 0
+                        print(f"Error {pk}: {e}")
+                    if not url:
+                        num_failed += 1
+                        continue
+
+                    updated.append(RepositoryNLPTrain(pk=pk, bot_data=url))
+                    transferred_bytes += size
+
+                RepositoryNLPTrain.objects.bulk_update(updated, ["bot_data"])
+                num_transferred += len(updated)
+                last_id = ids[-1]
+                self.write_checkpoint(options["checkpoint"], last_id)
+
+                elapsed = time.monotonic() - started_at
+                megabytes = transferred_bytes / 1024 / 1024
+                print(
+                    f" > Transferred {num_transferred} trainings "
+                    f"({megabytes:.1f} MB, {megabytes / elapsed:.2f} MB/s), "
+                    f"{num_failed} failed, up to the training {last_id}"
+                )
+
+        print(
+            f"Transferred {num_transferred} trainings in "
+            f"{time.monotonic() - started_at:.1f}s, {num_failed} failed"
+        )
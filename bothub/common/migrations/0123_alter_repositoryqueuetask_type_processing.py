@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0122_rename_categories_zeroshotlogs_options'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='repositoryqueuetask',
+            name='type_processing',
+            field=models.PositiveIntegerField(choices=[(0, 'NLP Tranining'), (1, 'Repository Auto Translation'), (2, 'Evaluate Cross Validation'), (3, 'Clone Version')], verbose_name='Type Processing'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0123_alter_repositoryqueuetask_type_processing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepositoryVersionLanguageStats',
+            fields=[
+                ('repository_version_language', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='common.repositoryversionlanguage')),
+                ('intents', models.JSONField(default=dict, help_text='Number of examples of the language per intent', verbose_name='examples per intent')),
+                ('entities', models.JSONField(default=dict, help_text='Number of entities marked in the examples per entity', verbose_name='examples entities per entity')),
+                ('translations', models.JSONField(default=dict, help_text='Number of translations of the examples per target language', verbose_name='translations per language')),
+                ('translated_intents', models.JSONField(default=dict, help_text='Number of examples translated into the language per intent', verbose_name='translated examples per intent')),
+                ('translated_entities', models.JSONField(default=dict, help_text='Number of entities marked in the translations per entity', verbose_name='translated examples entities per entity')),
+                ('is_dirty', models.BooleanField(default=True, verbose_name='is dirty')),
+                ('last_update', models.DateTimeField(auto_now=True, verbose_name='last update')),
+            ],
+            options={
+                'verbose_name': 'repository version language stats',
+                'verbose_name_plural': 'repository version language stats',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0124_repositoryversionlanguagestats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repositoryqueuetask',
+            name='processed',
+            field=models.PositiveIntegerField(default=0, help_text='Number of items already processed', verbose_name='processed'),
+        ),
+        migrations.AddField(
+            model_name='repositoryqueuetask',
+            name='total',
+            field=models.PositiveIntegerField(default=0, help_text='Number of items to be processed', verbose_name='total'),
+        ),
+    ]
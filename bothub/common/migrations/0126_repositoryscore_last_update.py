@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0125_repositoryqueuetask_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repositoryscore',
+            name='last_update',
+            field=models.DateTimeField(null=True, verbose_name='last update'),
+        ),
+    ]
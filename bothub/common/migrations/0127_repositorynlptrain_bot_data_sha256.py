@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0126_repositoryscore_last_update'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repositorynlptrain',
+            name='bot_data_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='bot data sha256'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from typing import Tuple
 import uuid
+from collections import Counter, defaultdict
 from functools import reduce
 
 import requests
@@ -7,8 +8,8 @@ from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.mail import send_mail
 from django.core.validators import RegexValidator, _lazy_re_compile
-from django.db import models
-from django.db.models import Sum, Q, IntegerField, Case, When, Count
+from django.db import connection, models
+from django.db.models import Sum, Q, F, IntegerField, Case, When, Count
 from django.dispatch import receiver
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
@@ -366,6 +367,7 @@ class Repository(models.Model):
     __use_competing_intents = None
     __use_name_entities = None
     __use_analyze_char = None
+    __is_private = None
 
     def __init__(self, *args, **kwargs):
         super(Repository, self).__init__(*args, **kwargs)
@@ -373,6 +375,7 @@ class Repository(models.Model):
         self.__use_competing_intents = self.use_competing_intents
         self.__use_name_entities = self.use_name_entities
         self.__use_analyze_char = self.use_analyze_char
+        self.__is_private = self.is_private
 
     def save(
         self, force_insert=False, force_update=False, using=None, update_fields=None
@@ -389,10 +392,16 @@ class Repository(models.Model):
 
         super(Repository, self).save(force_insert, force_update, using, update_fields)
 
+        if self.is_private != self.__is_private:
+            from bothub.authentication.cache import invalidate_repository_authorizations
+
+            invalidate_repository_authorizations(self.pk)
+
         self.__algorithm = self.algorithm
         self.__use_competing_intents = self.use_competing_intents
         self.__use_name_entities = self.use_name_entities
         self.__use_analyze_char = self.use_analyze_char
+        self.__is_private = self.is_private
 
     def have_at_least_one_test_phrase_registered(
         self, language: str, repository_version_id=None
@@ -637,11 +646,12 @@ class Repository(models.Model):
 
     @property
     def languages_status(self):
-        return dict(
-            map(
-                lambda language: (language, self.language_status(language)),
-                settings.SUPPORTED_LANGUAGES.keys(),
-            )
+        return RepositoryVersionLanguageStats.languages_status(
+            RepositoryVersionLanguage.objects.filter(
+                repository_version__repository=self,
+                repository_version__is_default=True,
+            ),
+            self.language,
         )
 
     def current_versions(
@@ -815,56 +825,22 @@ class Repository(models.Model):
         return query
 
     def language_status(self, language):
-        is_base_language = self.language == language
-        examples = self.examples(language)
-        base_examples = self.examples(self.language)
-        base_translations_count = RepositoryTranslatedExample.objects.filter(
-            original_example__in=base_examples, language=language
-        ).count()
-
-        base_examples_count = base_examples.count()
-        base_translations_percentage = (
-            base_translations_count
-            / (base_examples_count if base_examples_count > 0 else 1)
-        ) * 100
-
-        return {
-            "is_base_language": is_base_language,
-            "examples": {
-                "count": examples.count(),
-                "entities": list(
-                    set(
-                        filter(
-                            lambda x: x,
-                            examples.values_list(
-                                "entities__entity", flat=True
-                            ).distinct(),
-                        )
-                    )
-                ),
-            },
-            "base_translations": {
-                "count": base_translations_count,
-                "percentage": base_translations_percentage,
-            },
-        }
+        return RepositoryVersionLanguageStats.languages_status(
+            RepositoryVersionLanguage.objects.filter(
+                repository_version__repository=self,
+                repository_version__is_default=True,
+                language__in=[language, self.language],
+            ),
+            self.language,
+            [language],
+        )[language]
 
     def current_version(self, language=None, is_default=True):  # pragma: no cover
-        language = language or self.language
-
-        repository_version, created = self.versions.get_or_create(is_default=is_default)
-
-        if created:
-            repository_version.created_by = self.owner
-            repository_version.save()
+        from bothub.common.versions import get_version_language
 
-        (
-            repository_version_language,
-            created,
-        ) = RepositoryVersionLanguage.objects.get_or_create(
-            repository_version=repository_version, language=language
+        return get_version_language(
+            self, language or self.language, is_default=is_default
         )
-        return repository_version_language
 
     def last_trained_update(self, language=None):  # pragma: no cover
         language = language or self.language
@@ -885,35 +861,18 @@ class Repository(models.Model):
         return query.first()
 
     def get_specific_version_id(self, repository_version, language=None):
-        query = RepositoryVersionLanguage.objects.filter(
-            repository_version__repository=self,
-            repository_version__pk=repository_version,
-        )
-        if language:
-            query = query.filter(language=language)
+        from bothub.common.versions import get_version_language
 
-        query = query.first()
-
-        if not query:
-            query, created = RepositoryVersionLanguage.objects.get_or_create(
-                repository_version=RepositoryVersion.objects.get(pk=repository_version),
-                language=language,
-            )
-        return query
+        return get_version_language(
+            self, language, repository_version=repository_version
+        )
 
     def get_user_authorization(self, user):
         if user.is_anonymous:
             return RepositoryAuthorization(repository=self)
-        repo_auth, created = RepositoryAuthorization.objects.get_or_create(
-            user=user.repository_owner, repository=self
-        )
-        if self.owner.is_organization:
-            org_auth = self.owner.organization.get_organization_authorization(user)
+        from bothub.authentication.cache import get_user_authorization
 
-            if repo_auth.role < org_auth.role:
-                repo_auth.role = org_auth.role
-                repo_auth.save(update_fields=["role"])
-        return repo_auth
+        return get_user_authorization(self, user)
 
     def get_absolute_url(self):
         return "{}dashboard/{}/{}/".format(
@@ -1044,56 +1003,18 @@ class RepositoryVersion(models.Model):
 
     @property
     def languages_status(self):
-        return dict(
-            map(
-                lambda language: (language, self.language_status(language)),
-                settings.SUPPORTED_LANGUAGES.keys(),
-            )
+        return RepositoryVersionLanguageStats.languages_status(
+            self.version_languages, self.repository.language
         )
 
     def language_status(self, language):
-        is_base_language = self.repository.language == language
-        queryset = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=self
-        )
-        examples = self.repository.examples(
-            language, queryset=queryset, version_default=self.is_default
-        )
-        base_examples = self.repository.examples(
-            self.repository.language, queryset=queryset, version_default=self.is_default
-        )
-        base_translations = RepositoryTranslatedExample.objects.filter(
-            original_example__in=base_examples, language=language
-        )
-
-        examples_count = examples.count()
-        base_examples_count = base_examples.count()
-        base_translations_count = base_translations.count()
-        base_translations_percentage = (
-            base_translations_count
-            / (base_examples_count if base_examples_count > 0 else 1)
-        ) * 100
-
-        return {
-            "is_base_language": is_base_language,
-            "examples": {
-                "count": examples_count,
-                "entities": list(
-                    set(
-                        filter(
-                            lambda x: x,
-                            examples.values_list(
-                                "entities__entity", flat=True
-                            ).distinct(),
-                        )
-                    )
-                ),
-            },
-            "base_translations": {
-                "count": base_translations_count,
-                "percentage": base_translations_percentage,
-            },
-        }
+        return RepositoryVersionLanguageStats.languages_status(
+            self.version_languages.filter(
+                language__in=[language, self.repository.language]
+            ),
+            self.repository.language,
+            [language],
+        )[language]
 
 
 class RepositoryVersionLanguage(models.Model):
@@ -1111,6 +1032,7 @@ class RepositoryVersionLanguage(models.Model):
     MIN_EXAMPLES_PER_INTENT = 2
     MIN_EXAMPLES_PER_ENTITY = 2
     RECOMMENDED_INTENTS = 2
+    TRAINING_EXAMPLES_BATCH_SIZE = 2000
 
     language = models.CharField(
         _("language"), max_length=5, validators=[languages.validate_language]
@@ -1153,6 +1075,74 @@ class RepositoryVersionLanguage(models.Model):
         )
         return examples.distinct()
 
+    def training_examples(self, intent=None, batch_size=TRAINING_EXAMPLES_BATCH_SIZE):
+        """
+        Yields the same examples as the examples property, already in the rasa
+        format ({"text", "intent", "entities"}). They are read in keyset paginated
+        batches with two queries per batch, so neither the memory nor the number
+        of queries grows with each example.
+        """
+        examples = RepositoryExample.objects.filter(
+            repository_version_language=self
+        ).values("pk", "text", intent_text=F("intent__text"))
+        translations = (
+            RepositoryTranslatedExample.objects.filter(
+                language=self.language, repository_version_language=self
+            )
+            .exclude(original_example__repository_version_language=self)
+            .values("pk", "text", intent_text=F("original_example__intent__text"))
+        )
+        if intent:
+            examples = examples.filter(intent__text=intent)
+            translations = translations.filter(original_example__intent__text=intent)
+
+        yield from self._training_examples_batches(
+            examples, RepositoryExampleEntity.objects, "repository_example_id", batch_size
+        )
+        yield from self._training_examples_batches(
+            translations,
+            RepositoryTranslatedExampleEntity.objects,
+            "repository_translated_example_id",
+            batch_size,
+        )
+
+    @staticmethod
+    def _training_examples_batches(examples, entities, example_field, batch_size):
+        last_id = 0
+        while True:
+            batch = list(examples.filter(pk__gt=last_id).order_by("pk")[:batch_size])
+            if not batch:
+                return
+            last_id = batch[-1]["pk"]
+
+            batch_entities = defaultdict(list)
+            for entity in (
+                entities.filter(**{f"{example_field}__in": [row["pk"] for row in batch]})
+                .order_by("pk")
+                .values(example_field, "start", "end", "entity__value", "entity__group__value")
+            ):
+                batch_entities[entity[example_field]].append(entity)
+
+            for row in batch:
+                text = row["text"]
+                example_entities = []
+                for entity in batch_entities[row["pk"]]:
+                    data = {
+                        "start": entity["start"],
+                        "end": entity["end"],
+                        "value": text[entity["start"] : entity["end"]],
+                        "entity": entity["entity__value"],
+                    }
+                    if entity["entity__group__value"] is not None:
+                        data["role"] = entity["entity__group__value"]
+                    example_entities.append(data)
+
+                yield {
+                    "text": text,
+                    "intent": row["intent_text"],
+                    "entities": example_entities,
+                }
+
     @property
     def _search_weak_intents_and_entities(self):
         from bothub.common.documents import RepositoryExampleDocument
@@ -1265,48 +1255,25 @@ class RepositoryVersionLanguage(models.Model):
 
         warnings = []
 
-        intents = self.examples.values_list("intent__text", flat=True)
+        stats = self.dataset_stats
 
-        if "" in intents:
+        if "" in stats.all_intents:
             warnings.append(_("All examples need to have a intent."))
 
-        weak_intents = (
-            self.examples.values("intent__text")
-            .order_by("intent__text")
-            .annotate(intent_count=models.Count("intent__text"))
-            .exclude(intent_count__gte=self.MIN_EXAMPLES_PER_INTENT)
-        )
-
-        if weak_intents.exists():
-            for i in weak_intents:
+        for intent, intent_count in sorted(stats.all_intents.items()):
+            if intent_count < self.MIN_EXAMPLES_PER_INTENT:
                 warnings.append(
                     _(
                         'The "{}" intention has only {} sentence\nAdd 1 more sentence to that intention (minimum is {})'
-                    ).format(
-                        i.get("intent__text"),
-                        i.get("intent_count"),
-                        self.MIN_EXAMPLES_PER_INTENT,
-                    )
+                    ).format(intent, intent_count, self.MIN_EXAMPLES_PER_INTENT)
                 )
 
-        weak_entities = (
-            self.examples.filter(entities__isnull=False)
-            .order_by("entities__entity__value")
-            .values("entities__entity__value")
-            .annotate(entities_count=models.Count("entities__entity__value"))
-            .exclude(entities_count__gte=self.MIN_EXAMPLES_PER_ENTITY)
-        )
-
-        if weak_entities.exists():
-            for e in weak_entities:
+        for entity, entities_count in sorted(stats.all_entities.items()):
+            if entities_count < self.MIN_EXAMPLES_PER_ENTITY:
                 warnings.append(
                     _(
                         'The entity "{}" has only {} sentence\nAdd 1 more sentence to that entity (minimum is {})'
-                    ).format(
-                        e.get("entities__entity__value"),
-                        e.get("entities_count"),
-                        self.MIN_EXAMPLES_PER_ENTITY,
-                    )
+                    ).format(entity, entities_count, self.MIN_EXAMPLES_PER_ENTITY)
                 )
 
         return warnings
@@ -1329,22 +1296,32 @@ class RepositoryVersionLanguage(models.Model):
             if self.last_update <= self.training_end_at:
                 return False
 
-        if not self.added.exists() and not self.translated_added.exists():
-            return False
-
-        if self.examples.count() == 0:
+        if self.dataset_stats.all_examples_count == 0:
             return False
 
         return len(requirements) == 0
 
+    @property
+    def dataset_stats(self):
+        return RepositoryVersionLanguageStats.get_for(
+            RepositoryVersionLanguage.objects.filter(pk=self.pk)
+        )[self.pk]
+
     @property
     def intents(self):
-        return list(set(self.examples.values_list("intent", flat=True)))
+        intents = list(self.dataset_stats.all_intents)
+        if not intents:
+            return []
+        return list(
+            RepositoryIntent.objects.filter(
+                repository_version_id=self.repository_version_id, text__in=intents
+            ).values_list("pk", flat=True)
+        )
 
     @property
     def warnings(self):
         w = []
-        if 0 < len(self.intents) < self.RECOMMENDED_INTENTS:
+        if 0 < len(self.dataset_stats.all_intents) < self.RECOMMENDED_INTENTS:
             w.append(
                 _(
                     "You only added 1 intention\nAdd 1 more intention (it is necessary to have at least {} intentions for the algorithm to identify)"
@@ -1409,19 +1386,22 @@ class RepositoryVersionLanguage(models.Model):
         )
         return trainer
 
-    def update_trainer(self, bot_data, rasa_version):
+    def update_trainer(self, bot_data, rasa_version, bot_data_sha256=""):
         trainer, created = RepositoryNLPTrain.objects.get_or_create(
             repositoryversionlanguage=self, rasa_version=rasa_version
         )
         trainer.bot_data = bot_data
-        trainer.save(update_fields=["bot_data"])
+        trainer.bot_data_sha256 = bot_data_sha256
+        trainer.save(update_fields=["bot_data", "bot_data_sha256"])
 
-    def save_training(self, bot_data, rasa_version):
+    def save_training(self, bot_data, rasa_version, bot_data_sha256=""):
         last_time = timezone.now()
 
         self.training_end_at = last_time
         self.last_update = last_time
-        self.update_trainer(bot_data, rasa_version=rasa_version)
+        self.update_trainer(
+            bot_data, rasa_version=rasa_version, bot_data_sha256=bot_data_sha256
+        )
         self.total_training_end += 1
         self.save(
             update_fields=["total_training_end", "training_end_at", "last_update"]
@@ -1443,6 +1423,11 @@ class RepositoryNLPTrain(models.Model):
         unique_together = ["repositoryversionlanguage", "rasa_version"]
 
     bot_data = models.TextField(_("bot data"), blank=True)
+    # sha256 of the trained model kept in the artifact store, bot_data is
+    # empty then
+    bot_data_sha256 = models.CharField(
+        _("bot data sha256"), max_length=64, blank=True, db_index=True
+    )
     repositoryversionlanguage = models.ForeignKey(
         RepositoryVersionLanguage, models.CASCADE, related_name="trainers"
     )
@@ -1450,6 +1435,220 @@ class RepositoryNLPTrain(models.Model):
     created_at = models.DateTimeField(_("created at"), auto_now_add=True)
 
 
+class RepositoryVersionLanguageStats(models.Model):
+    """
+    Dataset statistics of a version language, kept up to date by the save and
+    delete signals of examples, translations and entities. Those signals only
+    flag the stats of the affected version as dirty, the next read recomputes
+    them (see the rebuild_version_language_stats command to rebuild them all).
+    """
+
+    class Meta:
+        verbose_name = _("repository version language stats")
+        verbose_name_plural = _("repository version language stats")
+
+    repository_version_language = models.OneToOneField(
+        RepositoryVersionLanguage,
+        models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+    )
+    intents = models.JSONField(
+        _("examples per intent"),
+        default=dict,
+        help_text=_("Number of examples of the language per intent"),
+    )
+    entities = models.JSONField(
+        _("examples entities per entity"),
+        default=dict,
+        help_text=_("Number of entities marked in the examples per entity"),
+    )
+    translations = models.JSONField(
+        _("translations per language"),
+        default=dict,
+        help_text=_("Number of translations of the examples per target language"),
+    )
+    translated_intents = models.JSONField(
+        _("translated examples per intent"),
+        default=dict,
+        help_text=_("Number of examples translated into the language per intent"),
+    )
+    translated_entities = models.JSONField(
+        _("translated examples entities per entity"),
+        default=dict,
+        help_text=_("Number of entities marked in the translations per entity"),
+    )
+    is_dirty = models.BooleanField(_("is dirty"), default=True)
+    last_update = models.DateTimeField(_("last update"), auto_now=True)
+
+    @property
+    def examples_count(self):
+        return sum(self.intents.values())
+
+    @property
+    def all_intents(self):
+        """Examples per intent of the version language examples property"""
+        return dict(Counter(self.intents) + Counter(self.translated_intents))
+
+    @property
+    def all_entities(self):
+        return dict(Counter(self.entities) + Counter(self.translated_entities))
+
+    @property
+    def all_examples_count(self):
+        return sum(self.all_intents.values())
+
+    @staticmethod
+    def _count(queryset, field):
+        return {
+            key: count
+            for key, count in queryset.values_list(field)
+            .annotate(count=Count("pk"))
+            .order_by()
+        }
+
+    def rebuild(self):
+        # The flag is cleared before counting, so a change made meanwhile
+        # flags the stats again instead of being lost
+        RepositoryVersionLanguageStats.objects.filter(pk=self.pk).update(
+            is_dirty=False
+        )
+
+        version_language_id = self.repository_version_language_id
+        language = self.repository_version_language.language
+        translated = RepositoryTranslatedExample.objects.filter(
+            repository_version_language_id=version_language_id, language=language
+        ).exclude(original_example__repository_version_language_id=version_language_id)
+
+        self.intents = self._count(
+            RepositoryExample.objects.filter(
+                repository_version_language_id=version_language_id
+            ),
+            "intent__text",
+        )
+        self.entities = self._count(
+            RepositoryExampleEntity.objects.filter(
+                repository_example__repository_version_language_id=version_language_id
+            ),
+            "entity__value",
+        )
+        self.translations = self._count(
+            RepositoryTranslatedExample.objects.filter(
+                original_example__repository_version_language_id=version_language_id
+            ),
+            "language",
+        )
+        self.translated_intents = self._count(
+            translated, "original_example__intent__text"
+        )
+        self.translated_entities = self._count(
+            RepositoryTranslatedExampleEntity.objects.filter(
+                repository_translated_example__in=translated
+            ),
+            "entity__value",
+        )
+        self.is_dirty = False
+
+        if self._state.adding:
+            RepositoryVersionLanguageStats.objects.bulk_create(
+                [self], ignore_conflicts=True
+            )
+        else:
+            self.save(
+                update_fields=[
+                    "intents",
+                    "entities",
+                    "translations",
+                    "translated_intents",
+                    "translated_entities",
+                    "last_update",
+                ]
+            )
+
+    @classmethod
+    def get_for(cls, version_languages):
+        """
+        Returns a dict with the up to date stats of each version language in
+        ``version_languages`` (a RepositoryVersionLanguage queryset) by its id.
+        """
+        stats = {
+            version_language_stats.pk: version_language_stats
+            for version_language_stats in cls.objects.filter(
+                repository_version_language__in=version_languages
+            ).select_related("repository_version_language")
+        }
+        for version_language in version_languages.exclude(pk__in=list(stats)):
+            stats[version_language.pk] = cls(
+                repository_version_language=version_language
+            )
+
+        for version_language_stats in stats.values():
+            if version_language_stats.is_dirty:
+                version_language_stats.rebuild()
+        return stats
+
+    @classmethod
+    def mark_dirty(cls, repository_versions):
+        """
+        Flags the stats of every language of ``repository_versions`` (ids or a
+        RepositoryVersion subquery) to be recomputed on the next read.
+        """
+        cls.objects.filter(
+            repository_version_language__repository_version__in=repository_versions
+        ).update(is_dirty=True)
+
+    @classmethod
+    def languages_status(cls, version_languages, base_language, languages=None):
+        """
+        Builds the languages_status dict of ``languages`` (all the supported ones
+        by default) from the stats of ``version_languages``.
+        """
+        stats = cls.get_for(version_languages).values()
+
+        entities = RepositoryEntity.objects.filter(
+            repository_version__in={
+                version_language_stats.repository_version_language.repository_version_id
+                for version_language_stats in stats
+            }
+        ).values_list("repository_version_id", "value", "pk")
+        entities_ids = {(version, value): pk for version, value, pk in entities}
+
+        examples_count = Counter()
+        examples_entities = defaultdict(set)
+        base_translations_count = Counter()
+        for version_language_stats in stats:
+            version_language = version_language_stats.repository_version_language
+            examples_count[version_language.language] += (
+                version_language_stats.examples_count
+            )
+            examples_entities[version_language.language].update(
+                entities_ids.get((version_language.repository_version_id, entity))
+                for entity in version_language_stats.entities
+            )
+            if version_language.language == base_language:
+                base_translations_count.update(version_language_stats.translations)
+
+        base_examples_count = examples_count[base_language]
+        return {
+            language: {
+                "is_base_language": language == base_language,
+                "examples": {
+                    "count": examples_count[language],
+                    "entities": list(filter(lambda x: x, examples_entities[language])),
+                },
+                "base_translations": {
+                    "count": base_translations_count[language],
+                    "percentage": (
+                        base_translations_count[language]
+                        / (base_examples_count if base_examples_count > 0 else 1)
+                    )
+                    * 100,
+                },
+            }
+            for language in (languages or settings.SUPPORTED_LANGUAGES.keys())
+        }
+
+
 class RepositoryQueueTask(models.Model):
     class Meta:
         verbose_name = _("repository nlp queue train")
@@ -1471,10 +1670,12 @@ class RepositoryQueueTask(models.Model):
     TYPE_PROCESSING_TRAINING = 0
     TYPE_PROCESSING_AUTO_TRANSLATE = 1
     TYPE_PROCESSING_EVALUATE_CROSS_VALIDATION = 2
+    TYPE_PROCESSING_CLONE_VERSION = 3
     TYPE_PROCESSING_CHOICES = [
         (TYPE_PROCESSING_TRAINING, _("NLP Tranining")),
         (TYPE_PROCESSING_AUTO_TRANSLATE, _("Repository Auto Translation")),
         (TYPE_PROCESSING_EVALUATE_CROSS_VALIDATION, _("Evaluate Cross Validation")),
+        (TYPE_PROCESSING_CLONE_VERSION, _("Clone Version")),
     ]
 
     repositoryversionlanguage = models.ForeignKey(
@@ -1493,6 +1694,12 @@ class RepositoryQueueTask(models.Model):
     type_processing = models.PositiveIntegerField(
         _("Type Processing"), choices=TYPE_PROCESSING_CHOICES
     )
+    total = models.PositiveIntegerField(
+        _("total"), default=0, help_text=_("Number of items to be processed")
+    )
+    processed = models.PositiveIntegerField(
+        _("processed"), default=0, help_text=_("Number of items already processed")
+    )
 
 
 class RepositoryNLPLog(models.Model):
@@ -1528,7 +1735,10 @@ class RepositoryNLPLog(models.Model):
 
     @property
     def log_intent_field_indexing(self):
-        intents = self.intents(self)
+        # Uses the prefetched intents when indexing in bulk
+        intents = sorted(
+            self.repository_nlp_log.all(), key=lambda intent: not intent.is_default
+        )
         intent_reduced_list = []
         for intent in intents:
             reduced_intent_obj = dict_to_obj(
@@ -1589,6 +1799,36 @@ class RepositoryReports(models.Model):
     count_reports = models.IntegerField(default=0)
     report_date = models.DateField(_("report date"))
 
+    @classmethod
+    def increment(cls, counts):
+        """
+        Adds ``counts``, a dict of {(version language id, user id, date): count},
+        to the reports with a single upsert.
+        """
+        if not counts:
+            return
+
+        values = []
+        params = []
+        # Sorted so concurrent upserts lock the rows in the same order
+        for (version_language_id, user_id, report_date), count in sorted(
+            counts.items()
+        ):
+            values.append("(%s, %s, %s, %s)")
+            params.extend([version_language_id, user_id, report_date, count])
+
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} "
+                "(repository_version_language_id, user_id, report_date, count_reports) "
+                f"VALUES {', '.join(values)} "
+                "ON CONFLICT (repository_version_language_id, user_id, report_date) "
+                f"DO UPDATE SET count_reports = {table}.count_reports "
+                "+ EXCLUDED.count_reports",
+                params,
+            )
+
 
 class RepositoryIntent(models.Model):
     class Meta:
@@ -2476,6 +2716,7 @@ class RepositoryScore(models.Model):
     intents_size_recommended = models.TextField(null=True)
     evaluate_size_score = models.FloatField(default=0.0)
     evaluate_size_recommended = models.TextField(null=True)
+    last_update = models.DateTimeField(_("last update"), null=True)
 
 
 class QAKnowledgeBase(models.Model):
@@ -2655,10 +2896,82 @@ def send_request_rejected_email(instance, **kwargs):
 @receiver(models.signals.post_save, sender=RepositoryNLPLog)
 def save_log_nlp(instance, created, **kwargs):
     if created:
-        report, created = RepositoryReports.objects.get_or_create(
-            repository_version_language=instance.repository_version_language,
-            user=instance.user,
-            report_date=timezone.now().date(),
-        )
-        report.count_reports += 1
-        report.save(update_fields=["count_reports"])
+        from bothub.common.reports import increment_report
+
+        increment_report(instance.repository_version_language_id, instance.user_id)
+
+
+@receiver(models.signals.post_save, sender=RepositoryVersion)
+@receiver(models.signals.post_delete, sender=RepositoryVersion)
+def invalidate_version_languages_cache(instance, **kwargs):
+    from bothub.common.versions import invalidate_version_languages
+
+    invalidate_version_languages(instance.repository_id)
+
+
+@receiver(models.signals.post_save, sender=RepositoryAuthorization)
+@receiver(models.signals.post_delete, sender=RepositoryAuthorization)
+def invalidate_authorization_cache(instance, **kwargs):
+    from bothub.authentication.cache import (
+        invalidate_authorizations,
+        invalidate_user_authorizations,
+    )
+
+    invalidate_authorizations([instance.uuid])
+    invalidate_user_authorizations(instance.user_id, [instance.repository_id])
+
+
+@receiver(models.signals.post_save, sender=OrganizationAuthorization)
+@receiver(models.signals.post_delete, sender=OrganizationAuthorization)
+def invalidate_organization_authorization_cache(instance, signal, **kwargs):
+    from bothub.authentication.cache import (
+        invalidate_organization_authorizations,
+        invalidate_organization_user_authorizations,
+        sync_organization_authorization,
+    )
+
+    if signal is models.signals.post_save:
+        sync_organization_authorization(instance)
+    invalidate_organization_authorizations(instance.organization_id, instance.user_id)
+    invalidate_organization_user_authorizations(
+        instance.organization_id, instance.user_id
+    )
+
+
+@receiver(models.signals.post_save, sender=RepositoryExample)
+@receiver(models.signals.post_delete, sender=RepositoryExample)
+@receiver(models.signals.post_save, sender=RepositoryTranslatedExample)
+@receiver(models.signals.post_delete, sender=RepositoryTranslatedExample)
+def mark_example_stats_dirty(instance, **kwargs):
+    RepositoryVersionLanguageStats.mark_dirty(
+        RepositoryVersionLanguage.objects.filter(
+            pk=instance.repository_version_language_id
+        ).values("repository_version")
+    )
+
+
+@receiver(models.signals.post_save, sender=RepositoryExampleEntity)
+@receiver(models.signals.post_delete, sender=RepositoryExampleEntity)
+def mark_example_entity_stats_dirty(instance, **kwargs):
+    RepositoryVersionLanguageStats.mark_dirty(
+        RepositoryVersionLanguage.objects.filter(
+            added=instance.repository_example_id
+        ).values("repository_version")
+    )
+
+
+@receiver(models.signals.post_save, sender=RepositoryTranslatedExampleEntity)
+@receiver(models.signals.post_delete, sender=RepositoryTranslatedExampleEntity)
+def mark_translated_entity_stats_dirty(instance, **kwargs):
+    RepositoryVersionLanguageStats.mark_dirty(
+        RepositoryVersionLanguage.objects.filter(
+            translated_added=instance.repository_translated_example_id
+        ).values("repository_version")
+    )
+
+
+@receiver(models.signals.post_save, sender=RepositoryIntent)
+@receiver(models.signals.post_save, sender=RepositoryEntity)
+def mark_version_stats_dirty(instance, created, **kwargs):
+    if not created:
+        RepositoryVersionLanguageStats.mark_dirty([instance.repository_version_id])
@@ -0,0 +1,85 @@
+import logging
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from bothub.common.models import RepositoryReports
+
+logger = logging.getLogger(__name__)
+
+REPORTS_BUFFER_KEY = "repository_reports:buffer"
+
+
+def _buffer_field(version_language_id, user_id, report_date):
+    return f"{version_language_id}:{user_id}:{report_date.isoformat()}"
+
+
+def _parse_buffer_field(field):
+    version_language_id, user_id, report_date = field.decode().split(":")
+    return (int(version_language_id), int(user_id), date.fromisoformat(report_date))
+
+
+def increment_reports(counts):
+    """
+    Adds ``counts``, a dict of {(version language id, user id, date): count},
+    to the daily reports. With REPOSITORY_REPORTS_BUFFER the counts are kept
+    in Redis and written by flush_reports, otherwise they are upserted now.
+    """
+    if not counts:
+        return
+
+    if settings.REPOSITORY_REPORTS_BUFFER:
+        # Only counts the logs once they are committed
+        transaction.on_commit(lambda: _buffer_reports(counts))
+    else:
+        RepositoryReports.increment(counts)
+
+
+def _add_to_buffer(counts):
+    pipeline = get_redis_connection("default").pipeline(transaction=False)
+    for key, count in counts.items():
+        pipeline.hincrby(REPORTS_BUFFER_KEY, _buffer_field(*key), count)
+    pipeline.execute()
+
+
+def _buffer_reports(counts):
+    try:
+        _add_to_buffer(counts)
+    except Exception as e:
+        logger.warning(f"Could not buffer the reports, saving them now: {e}")
+        RepositoryReports.increment(counts)
+
+
+def increment_report(version_language_id, user_id, count=1):
+    increment_reports({(version_language_id, user_id, timezone.now().date()): count})
+
+
+def flush_reports():
+    """
+    Moves the counts buffered in Redis to RepositoryReports, returns how many
+    reports were updated.
+
+    The buffer is read and deleted in the same MULTI, so overlapping flushes
+    never apply the same counts twice. If they can't be written they are
+    added back to the buffer for the next flush.
+    """
+    pipeline = get_redis_connection("default").pipeline(transaction=True)
+    pipeline.hgetall(REPORTS_BUFFER_KEY)
+    pipeline.delete(REPORTS_BUFFER_KEY)
+    buffered, deleted = pipeline.execute()
+
+    counts = {
+        _parse_buffer_field(field): int(count) for field, count in buffered.items()
+    }
+    if not counts:
+        return 0
+
+    try:
+        RepositoryReports.increment(counts)
+    except Exception:
+        _add_to_buffer(counts)
+        raise
+    return len(counts)
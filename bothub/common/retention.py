@@ -0,0 +1,136 @@
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from bothub.common.models import RepositoryNLPLog, RepositoryNLPLogIntent
+
+logger = logging.getLogger(__name__)
+
+_PARTITION_BOUND = re.compile(r"FROM \('(?P<start>[^']+)'\) TO \('(?P<end>[^']+)'\)")
+
+
+def expired_partitions(table, cutoff):
+    """
+    Names of the partitions of ``table`` (partitioned by a date range) whose
+    rows are all older than ``cutoff``
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+            "FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = %s",
+            [table],
+        )
+        partitions = cursor.fetchall()
+
+    expired = []
+    for name, bound in partitions:
+        match = _PARTITION_BOUND.search(bound or "")
+        end = match and parse_datetime(match.group("end"))
+        if end and end <= cutoff:
+            expired.append(name)
+    return sorted(expired)
+
+
+class NLPLogsRetention:
+    """
+    Deletes the NLP logs (and their intents) created before ``cutoff`` with
+    set based DELETEs of NLP_LOG_DELETE_CHUNK_SIZE logs by id range, waiting
+    NLP_LOG_DELETE_SLEEP seconds between the chunks to spare the database.
+
+    With NLP_LOG_PARTITIONED the logs table is expected to be partitioned by
+    created_at ranges, the partitions older than the cutoff are dropped
+    instead of deleted row by row.
+
+    No signals are sent, the elasticsearch documents of the logs are removed
+    by their own index lifecycle policy (ELASTICSEARCH_DELETE_ILM_NAME).
+    """
+
+    def __init__(self, cutoff, chunk_size=None, sleep=None):
+        self.cutoff = cutoff
+        self.chunk_size = chunk_size or settings.NLP_LOG_DELETE_CHUNK_SIZE
+        self.sleep = settings.NLP_LOG_DELETE_SLEEP if sleep is None else sleep
+        self.deleted = 0
+        self.dropped_partitions = []
+        self.elapsed = 0
+
+    def run(self):
+        started_at = time.monotonic()
+        if settings.NLP_LOG_PARTITIONED:
+            for partition in expired_partitions(
+                RepositoryNLPLog._meta.db_table, self.cutoff
+            ):
+                self.drop_partition(partition)
+        self.delete_chunks()
+        self.elapsed = time.monotonic() - started_at
+
+        logger.info(
+            f"Deleted {self.deleted} nlp logs in {self.elapsed:.1f}s "
+            f"({self.rate:.0f} logs/s), "
+            f"dropped {len(self.dropped_partitions)} partitions"
+        )
+        return self
+
+    @property
+    def rate(self):
+        return self.deleted / self.elapsed if self.elapsed else 0
+
+    def delete_chunks(self):
+        logs = RepositoryNLPLog.objects.filter(created_at__lt=self.cutoff)
+        last_id = 0
+        while True:
+            ids = list(
+                logs.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[: self.chunk_size]
+            )
+            if not ids:
+                break
+
+            chunk = logs.filter(id__gt=last_id, id__lte=ids[-1])
+            with transaction.atomic():
+                RepositoryNLPLogIntent.objects.filter(
+                    repository_nlp_log__in=chunk
+                )._raw_delete(chunk.db)
+                self.deleted += chunk._raw_delete(chunk.db)
+            last_id = ids[-1]
+
+            logger.info(f" > deleted {self.deleted} nlp logs")
+            if self.sleep:
+                time.sleep(self.sleep)
+
+    def drop_partition(self, partition):
+        partition = connection.ops.quote_name(partition)
+        intents = connection.ops.quote_name(RepositoryNLPLogIntent._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT min(id), max(id), count(*) FROM {partition}")
+            min_id, max_id, count = cursor.fetchone()
+
+            # The intents reference the logs, they go first
+            for start in range(min_id or 0, (max_id or -1) + 1, self.chunk_size):
+                cursor.execute(
+                    f"DELETE FROM {intents} WHERE repository_nlp_log_id IN "
+                    f"(SELECT id FROM {partition} WHERE id >= %s AND id < %s)",
+                    [start, start + self.chunk_size],
+                )
+                if self.sleep:
+                    time.sleep(self.sleep)
+            cursor.execute(f"DROP TABLE {partition}")
+
+        self.deleted += count
+        self.dropped_partitions.append(partition)
+
+
+def delete_expired_nlp_logs(days=None):
+    """Deletes the NLP logs older than NLP_LOG_RETENTION_DAYS days"""
+    cutoff = timezone.now().replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ) - timezone.timedelta(days=days or settings.NLP_LOG_RETENTION_DAYS)
+    return NLPLogsRetention(cutoff).run()
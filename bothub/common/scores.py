@@ -0,0 +1,244 @@
+import numpy as np
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from bothub.common.models import (
+    RepositoryEvaluate,
+    RepositoryExample,
+    RepositoryIntent,
+    RepositoryScore,
+    RepositoryVersion,
+    RepositoryVersionLanguage,
+)
+
+SCORE_BATCH_SIZE = 1000
+
+SCORE_FIELDS = [
+    "intents_balance_score",
+    "intents_balance_recommended",
+    "intents_size_score",
+    "intents_size_recommended",
+    "evaluate_size_score",
+    "evaluate_size_recommended",
+    "last_update",
+]
+
+
+def score_normal(x, optimal):
+    """Vectorized bothub.utils.score_normal"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = np.exp(-((x - optimal) ** 2) / (2 * (optimal / 2) ** 2)) * 100
+    return np.where(optimal == 0, 100.0, result)
+
+
+def score_cumulated(x, optimal):
+    """Vectorized bothub.utils.score_cumulated"""
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        result = 100 / (1 + np.exp(-(-5 + x * (10 / optimal))))
+    return np.where(optimal == 0, 100.0, result)
+
+
+def compute_scores(intents_versions, intents_counts, evaluate_counts):
+    """
+    Scores the datasets of many versions at once, the same scores of
+    bothub.utils intentions_balance_score, intentions_size_score and
+    evaluate_size_score.
+
+    ``intents_versions`` and ``intents_counts`` hold the index of the version
+    and the number of examples of every intent, ``evaluate_counts`` the
+    number of evaluate sentences of each version. Returns a dict of arrays
+    with a score of each version.
+    """
+    versions_count = len(evaluate_counts)
+    intents_versions = np.asarray(intents_versions, dtype=int)
+    intents_counts = np.asarray(intents_counts, dtype=float)
+    evaluate_counts = np.asarray(evaluate_counts, dtype=float)
+
+    intentions = np.bincount(intents_versions, minlength=versions_count)
+    train_count = np.bincount(
+        intents_versions, weights=intents_counts, minlength=versions_count
+    )
+    scored = intentions >= 2
+    # Avoid the divisions by zero of the versions that are not scored
+    intentions_safe = np.maximum(intentions, 2)
+
+    excl_mean = (train_count[intents_versions] - intents_counts) / (
+        intentions_safe[intents_versions] - 1
+    )
+    balance = (
+        np.bincount(
+            intents_versions,
+            weights=score_normal(intents_counts, excl_mean),
+            minlength=versions_count,
+        )
+        / intentions_safe
+    )
+
+    size_optimal = np.trunc(
+        106.6556 + (19.75708 - 106.6556) / (1 + (intentions / 8.791823) ** 1.898546)
+    )
+    intents_optimal = size_optimal[intents_versions]
+    size = (
+        np.bincount(
+            intents_versions,
+            weights=np.where(
+                intents_counts >= intents_optimal,
+                100.0,
+                score_cumulated(intents_counts, intents_optimal),
+            ),
+            minlength=versions_count,
+        )
+        / intentions_safe
+    )
+
+    evaluate_optimal = np.trunc(
+        692.4702 + (-1.396326 - 692.4702) / (1 + (train_count / 5646.078) ** 0.7374176)
+    )
+    evaluate = np.where(
+        evaluate_counts >= evaluate_optimal,
+        100.0,
+        score_cumulated(evaluate_counts, evaluate_optimal),
+    )
+
+    return {
+        "scored": scored,
+        "intents_balance_score": np.where(scored, balance, 0.0),
+        "intents_balance_average": (train_count / intentions_safe).astype(int),
+        "intents_size_score": np.where(scored, size, 0.0),
+        "intents_size_optimal": size_optimal.astype(int),
+        "evaluate_size_score": np.where(scored, evaluate, 0.0),
+        "evaluate_size_optimal": evaluate_optimal.astype(int),
+    }
+
+
+def get_versions(full=False):
+    """
+    Default versions of the classifier repositories to be scored, only the
+    ones whose dataset changed since the last score without ``full``
+    """
+    versions = RepositoryVersion.objects.filter(
+        is_default=True, repository__repository_type="classifier"
+    )
+    if full:
+        return versions
+
+    return versions.annotate(
+        last_score=Subquery(
+            RepositoryScore.objects.filter(repository=OuterRef("repository")).values(
+                "last_update"
+            )[:1]
+        )
+    ).filter(
+        Q(last_score__isnull=True)
+        | Exists(
+            RepositoryVersionLanguage.objects.filter(
+                repository_version=OuterRef("pk"),
+                last_update__gt=OuterRef("last_score"),
+            )
+        )
+        | Exists(
+            RepositoryIntent.objects.filter(
+                repository_version=OuterRef("pk"),
+                created_at__gt=OuterRef("last_score"),
+            )
+        )
+        | Exists(
+            RepositoryEvaluate.objects.filter(
+                repository_version_language__repository_version=OuterRef("pk"),
+                created_at__gt=OuterRef("last_score"),
+            )
+        )
+    )
+
+
+def update_repository_scores(full=False):
+    """
+    Scores the datasets (in the repository language) of the default version
+    of the classifier repositories, in batches of SCORE_BATCH_SIZE versions
+    with a grouped query for the examples per intent and another for the
+    evaluate sentences. Returns the number of scored repositories.
+    """
+    now = timezone.now()
+    versions = list(get_versions(full).order_by("pk").values_list("pk", "repository"))
+    for i in range(0, len(versions), SCORE_BATCH_SIZE):
+        score_versions(dict(versions[i : i + SCORE_BATCH_SIZE]), now)
+    return len(versions)
+
+
+def score_versions(versions, now):
+    """Scores ``versions``, a dict of {version id: repository id}"""
+    index = {version: i for i, version in enumerate(versions)}
+    in_repository_language = {
+        "repository_version_language__language": F(
+            "repository_version_language__repository_version__repository__language"
+        )
+    }
+
+    examples_count = {
+        (version, intent): count
+        for version, intent, count in RepositoryExample.objects.filter(
+            repository_version_language__repository_version__in=versions.keys(),
+            **in_repository_language,
+        )
+        .values_list("repository_version_language__repository_version", "intent__text")
+        .annotate(count=Count("pk"))
+        .order_by()
+    }
+    intents = list(
+        RepositoryIntent.objects.filter(
+            repository_version__in=versions.keys()
+        ).values_list("repository_version", "text")
+    )
+    evaluate_counts = np.zeros(len(versions))
+    for version, count in (
+        RepositoryEvaluate.objects.filter(
+            repository_version_language__repository_version__in=versions.keys(),
+            **in_repository_language,
+        )
+        .values_list("repository_version_language__repository_version")
+        .annotate(count=Count("pk"))
+        .order_by()
+    ):
+        evaluate_counts[index[version]] = count
+
+    scores = compute_scores(
+        [index[version] for version, text in intents],
+        [examples_count.get((version, text), 0) for version, text in intents],
+        evaluate_counts,
+    )
+
+    existing = {
+        score.repository_id: score
+        for score in RepositoryScore.objects.filter(
+            repository__in=versions.values()
+        ).only("pk", "repository")
+    }
+    created = {}
+    for version, i in index.items():
+        repository = versions[version]
+        score = existing.get(repository) or created.get(repository)
+        if score is None:
+            score = created[repository] = RepositoryScore(repository_id=repository)
+
+        score.last_update = now
+        score.intents_balance_score = float(scores["intents_balance_score"][i])
+        score.intents_size_score = float(scores["intents_size_score"][i])
+        score.evaluate_size_score = float(scores["evaluate_size_score"][i])
+        if scores["scored"][i]:
+            score.intents_balance_recommended = (
+                "The avarage sentences per intention is "
+                f"{scores['intents_balance_average'][i]}"
+            )
+            score.intents_size_recommended = (
+                f"{scores['intents_size_optimal'][i]} sentences per intention"
+            )
+            score.evaluate_size_recommended = (
+                f"{scores['evaluate_size_optimal'][i]} evaluation sentences"
+            )
+        else:
+            score.intents_balance_recommended = ""
+            score.intents_size_recommended = ""
+            score.evaluate_size_recommended = ""
+
+    RepositoryScore.objects.bulk_create(created.values())
+    RepositoryScore.objects.bulk_update(existing.values(), SCORE_FIELDS)
@@ -1,25 +1,62 @@
+import threading
+import time
+from collections import defaultdict
+
 from django.db import transaction
 from django.conf import settings
-from bothub.common.tasks import handle_save
+from bothub.common.tasks import handle_saves
 from django_elasticsearch_dsl.registries import registry
 from django_elasticsearch_dsl.signals import RealTimeSignalProcessor
 
 
 class CelerySignalProcessor(RealTimeSignalProcessor):
+    """
+    Reindexes the saved instances from a celery task. The instances saved in
+    a transaction are collected and sent in a single task once it commits, so
+    bulk changes are indexed with bulk requests instead of one task per row.
+    """
+
+    _local = threading.local()
+
     def handle_save(self, sender, instance, **kwargs):
-        app_label = instance._meta.app_label
-        model_name = instance._meta.model_name
         model = instance._meta.concrete_model
 
         if settings.USE_ELASTICSEARCH and (
             model in registry._models or model in registry._related_models
         ):
-            transaction.on_commit(
-                lambda: handle_save.apply_async(
-                    args=[instance.pk, app_label, model_name],
-                    queue=settings.ELASTICSEARCH_CUSTOM_QUEUE,
-                )
-            )
+            self.add_pending(instance._meta.label_lower, instance.pk)
+
+    def add_pending(self, label, pk):
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            # Autocommit, the instance is already committed
+            self.send({label: {pk}})
+            return
+
+        flush = getattr(self._local, "flush", None)
+        # The flush of a rolled back transaction is dropped from the commit
+        # callbacks, so what it collected is discarded along with it
+        if flush is None or not any(
+            callback[1] is flush for callback in connection.run_on_commit
+        ):
+            pending = defaultdict(set)
+
+            def flush():
+                self._local.flush = None
+                self.send(pending)
+
+            self._local.pending = pending
+            self._local.flush = flush
+            transaction.on_commit(flush)
+
+        self._local.pending[label].add(pk)
+
+    @staticmethod
+    def send(pending):
+        handle_saves.apply_async(
+            args=[{label: list(pks) for label, pks in pending.items()}, time.time()],
+            queue=settings.ELASTICSEARCH_CUSTOM_QUEUE,
+        )
 
     def handle_pre_delete(self, sender, instance, **kwargs):
         """
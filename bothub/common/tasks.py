@@ -1,25 +1,35 @@
 import json
+import logging
 import random
+import time
 import requests
-from datetime import timedelta
-from urllib.parse import urlencode
+from collections import defaultdict
 from django.apps import apps
 from django.conf import settings
-from django.db import transaction
-from django.db.models import Q, Count
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models, transaction
+from django.db.models import Count, Exists, OuterRef, Q
 from django.utils import timezone
 from django.utils import translation
 from django.utils.translation import gettext_lazy as _
 
+import elasticapm
 from django_elasticsearch_dsl.registries import registry
 
 from bothub import translate
 from bothub.celery import app
+from bothub.common.documents import (
+    RepositoryExampleDocument,
+    RepositoryNLPLogDocument,
+)
 from bothub.common.models import (
+    RepositoryAuthorization,
     RepositoryQueueTask,
     RepositoryReports,
     RepositoryVersion,
     RepositoryVersionLanguage,
+    RepositoryVersionLanguageStats,
     RepositoryExample,
     RepositoryExampleEntity,
     RepositoryEntityGroup,
@@ -30,16 +40,16 @@ from bothub.common.models import (
     RepositoryEvaluateEntity,
     RepositoryIntent,
     Repository,
-    RepositoryNLPLog,
     RepositoryScore,
 )
-from bothub.utils import (
-    intentions_balance_score,
-    intentions_size_score,
-    evaluate_size_score,
-    request_nlp,
-)
+from bothub.common.reports import flush_reports
+from bothub.common.retention import delete_expired_nlp_logs
+from bothub.common.scores import update_repository_scores
+from bothub.common.trainings import check_trainings
+from bothub.common.usecase.repositorylog.export import ExportRepositoryLogUseCase
+from bothub.utils import request_nlp
 
+logger = logging.getLogger(__name__)
 
 if settings.USE_GRPC:
     from bothub.api.grpc.connect_grpc_client import ConnectGRPCClient as ConnectClient
@@ -58,49 +68,349 @@ def handle_save(pk, app_label, model_name):
         registry.update_related(instance)
 
 
+def _related_documents_pks(instances):
+    """
+    Returns a dict with the pks of the documents to reindex because of the
+    changes in the related ``instances``, by document class.
+    """
+    documents_pks = defaultdict(set)
+    for instance in instances:
+        for document in registry._get_related_doc(instance):
+            try:
+                related = document().get_instances_from_related(instance)
+            except ObjectDoesNotExist:
+                related = None
+
+            if isinstance(related, models.Model):
+                documents_pks[document].add(related.pk)
+            elif isinstance(related, models.QuerySet):
+                documents_pks[document].update(related.values_list("pk", flat=True))
+            elif related is not None:
+                documents_pks[document].update(obj.pk for obj in related)
+    return documents_pks
+
+
+def _bulk_update_documents(document, pks):
+    document_instance = document()
+    pks = sorted(pks)
+    for start in range(0, len(pks), settings.ELASTICSEARCH_BULK_CHUNK_SIZE):
+        document_instance.update(
+            document_instance.get_queryset().filter(
+                pk__in=pks[start : start + settings.ELASTICSEARCH_BULK_CHUNK_SIZE]
+            ),
+            parallel=settings.ELASTICSEARCH_PARALLEL_BULK,
+            chunk_size=settings.ELASTICSEARCH_BULK_CHUNK_SIZE,
+        )
+
+
+@app.task(name="es_handle_saves")
+def handle_saves(instances, queued_at=None):
+    """
+    Reindexes the instances saved in a transaction, ``instances`` is a dict
+    with the pks saved by model label, see CelerySignalProcessor.
+    """
+    if not settings.USE_ELASTICSEARCH:
+        return
+
+    queue_lag = time.time() - queued_at if queued_at else 0
+    documents_pks = defaultdict(set)
+    for label, pks in instances.items():
+        model = apps.get_model(label)
+        for document in registry._models.get(model, []):
+            if not document.django.ignore_signals:
+                documents_pks[document].update(pks)
+        if model in registry._related_models:
+            for start in range(0, len(pks), settings.ELASTICSEARCH_BULK_CHUNK_SIZE):
+                related_pks = _related_documents_pks(
+                    model.objects.filter(
+                        pk__in=pks[start : start + settings.ELASTICSEARCH_BULK_CHUNK_SIZE]
+                    )
+                )
+                for document, document_pks in related_pks.items():
+                    documents_pks[document].update(document_pks)
+
+    start = time.perf_counter()
+    for document, pks in documents_pks.items():
+        _bulk_update_documents(document, pks)
+
+    batch_size = sum(len(pks) for pks in documents_pks.values())
+    elasticapm.label(
+        es_indexing_queue_lag=queue_lag,
+        es_indexing_batch_size=batch_size,
+    )
+    logger.info(
+        f"Indexed {batch_size} documents in {time.perf_counter() - start:.3f}s, "
+        f"queue lag {queue_lag:.3f}s",
+        extra={
+            "es_indexing_queue_lag": queue_lag,
+            "es_indexing_batch_size": batch_size,
+        },
+    )
+
+
+@app.task(name="es_handle_version_examples")
+def handle_version_examples(repository_version_id):
+    if settings.USE_ELASTICSEARCH:
+        document = RepositoryExampleDocument()
+        document.update(
+            document.get_queryset().filter(
+                repository_version_language__repository_version_id=repository_version_id
+            )
+        )
+
+
+@app.task(name="es_handle_nlp_logs")
+def handle_nlp_logs(nlp_log_ids):
+    if settings.USE_ELASTICSEARCH:
+        document = RepositoryNLPLogDocument()
+        document.update(document.get_queryset().filter(pk__in=nlp_log_ids))
+
+
+@app.task()
+def flush_repository_reports():
+    return flush_reports()
+
+
 @app.task()
 def trainings_check_task():
-    trainers = RepositoryQueueTask.objects.filter(
-        Q(status=RepositoryQueueTask.STATUS_PENDING)
-        | Q(status=RepositoryQueueTask.STATUS_PROCESSING)
+    check_trainings()
+
+
+CLONE_VERSION_BATCH_SIZE = 1000
+
+
+def _clone_entities(original_version, clone):
+    """
+    Creates in the clone the entities (and their groups) used by the original
+    version examples and translations.
+    Returns a dict mapping the original entity ids to the cloned ones.
+    """
+    used_entities = RepositoryExampleEntity.objects.filter(
+        repository_example__repository_version_language__repository_version=original_version
+    ).values("entity_id")
+    used_translated_entities = RepositoryTranslatedExampleEntity.objects.filter(
+        repository_translated_example__original_example__repository_version_language__repository_version=original_version
+    ).values("entity_id")
+    entities = list(
+        RepositoryEntity.objects.filter(
+            Q(pk__in=used_entities) | Q(pk__in=used_translated_entities)
+        ).values("pk", "value", "group__value")
+    )
+
+    group_values = {entity["group__value"] for entity in entities} - {None}
+    RepositoryEntityGroup.objects.bulk_create(
+        [
+            RepositoryEntityGroup(repository_version=clone, value=value)
+            for value in group_values
+        ],
+        ignore_conflicts=True,
+    )
+    groups = dict(
+        RepositoryEntityGroup.objects.filter(
+            repository_version=clone, value__in=group_values
+        ).values_list("value", "pk")
+    )
+
+    RepositoryEntity.objects.bulk_create(
+        [
+            RepositoryEntity(
+                repository_version=clone,
+                value=entity["value"],
+                group_id=groups.get(entity["group__value"]),
+            )
+            for entity in entities
+        ],
+        ignore_conflicts=True,
+    )
+    clone_entities = dict(
+        RepositoryEntity.objects.filter(
+            repository_version=clone, value__in={entity["value"] for entity in entities}
+        ).values_list("value", "pk")
+    )
+    return {entity["pk"]: clone_entities[entity["value"]] for entity in entities}
+
+
+def _clone_intents(original_version, clone):
+    """
+    Creates in the clone the intents used by the original version examples.
+    Returns a dict mapping the original intent ids to the cloned ones.
+    """
+    intents = dict(
+        RepositoryIntent.objects.filter(
+            pk__in=RepositoryExample.objects.filter(
+                repository_version_language__repository_version=original_version
+            ).values("intent_id")
+        ).values_list("pk", "text")
+    )
+
+    RepositoryIntent.objects.bulk_create(
+        [
+            RepositoryIntent(repository_version=clone, text=text)
+            for text in set(intents.values())
+        ],
+        ignore_conflicts=True,
+    )
+    clone_intents = dict(
+        RepositoryIntent.objects.filter(
+            repository_version=clone, text__in=intents.values()
+        ).values_list("text", "pk")
+    )
+    return {pk: clone_intents[text] for pk, text in intents.items()}
+
+
+def _clone_examples(original_version, clone, clone_version_languages):
+    """
+    Copies the examples, their translations and the entities of both in
+    batches of CLONE_VERSION_BATCH_SIZE examples.
+    Returns the ids of the clone version languages that received data.
+    """
+    intents = _clone_intents(original_version, clone)
+    entities = _clone_entities(original_version, clone)
+    original_languages = dict(
+        original_version.version_languages.values_list("pk", "language")
     )
-    for train in trainers:
-        services = {
-            RepositoryQueueTask.QUEUE_AIPLATFORM: "ai-platform",
-            RepositoryQueueTask.QUEUE_CELERY: "celery",
+    updated_version_languages = set()
+
+    def version_language_id(language):
+        if language not in clone_version_languages:
+            clone_version_languages[language] = clone.get_version_language(language)
+        version_language = clone_version_languages[language]
+        updated_version_languages.add(version_language.pk)
+        return version_language.pk
+
+    examples = (
+        RepositoryExample.objects.filter(
+            repository_version_language__repository_version=original_version
+        )
+        .order_by("pk")
+        .values("pk", "repository_version_language_id", "text", "intent_id")
+    )
+
+    last_id = 0
+    while True:
+        batch = list(examples.filter(pk__gt=last_id)[:CLONE_VERSION_BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1]["pk"]
+        now = timezone.now()
+
+        clone_examples = RepositoryExample.objects.bulk_create(
+            [
+                RepositoryExample(
+                    repository_version_language_id=version_language_id(
+                        original_languages[example["repository_version_language_id"]]
+                    ),
+                    text=example["text"],
+                    intent_id=intents[example["intent_id"]],
+                    last_update=now,
+                )
+                for example in batch
+            ]
+        )
+        example_ids = {
+            example["pk"]: clone_example.pk
+            for example, clone_example in zip(batch, clone_examples)
         }
-        result = requests.get(
-            url=f"{settings.BOTHUB_NLP_BASE_URL}v2/task-queue/",
-            params=urlencode(
-                {
-                    "id_task": train.id_queue,
-                    "from_queue": services.get(train.from_queue),
-                }
-            ),
+
+        RepositoryExampleEntity.objects.bulk_create(
+            [
+                RepositoryExampleEntity(
+                    repository_example_id=example_ids[entity["repository_example_id"]],
+                    start=entity["start"],
+                    end=entity["end"],
+                    entity_id=entities[entity["entity_id"]],
+                )
+                for entity in RepositoryExampleEntity.objects.filter(
+                    repository_example_id__in=example_ids
+                ).values("repository_example_id", "start", "end", "entity_id")
+            ]
         )
-        if result:
-            result = result.json()
-        else:
-            continue
 
-        status = int(result.get("status"))
+        translations = list(
+            RepositoryTranslatedExample.objects.filter(
+                original_example_id__in=example_ids
+            ).values("pk", "original_example_id", "language", "text")
+        )
+        clone_translations = RepositoryTranslatedExample.objects.bulk_create(
+            [
+                RepositoryTranslatedExample(
+                    repository_version_language_id=version_language_id(
+                        translation["language"]
+                    ),
+                    original_example_id=example_ids[translation["original_example_id"]],
+                    language=translation["language"],
+                    text=translation["text"],
+                )
+                for translation in translations
+            ]
+        )
+        translation_ids = {
+            translation["pk"]: clone_translation.pk
+            for translation, clone_translation in zip(translations, clone_translations)
+        }
 
-        if status != train.status:
-            fields = ["status", "ml_units"]
-            train.status = status
-            if train.status == RepositoryQueueTask.STATUS_SUCCESS:
-                train.end_training = timezone.now()
-                fields.append("end_training")
-            train.ml_units = result.get("ml_units")
-            train.save(update_fields=fields)
-            continue
+        RepositoryTranslatedExampleEntity.objects.bulk_create(
+            [
+                RepositoryTranslatedExampleEntity(
+                    repository_translated_example_id=translation_ids[
+                        entity["repository_translated_example_id"]
+                    ],
+                    start=entity["start"],
+                    end=entity["end"],
+                    entity_id=entities[entity["entity_id"]],
+                )
+                for entity in RepositoryTranslatedExampleEntity.objects.filter(
+                    repository_translated_example_id__in=translation_ids
+                ).values("repository_translated_example_id", "start", "end", "entity_id")
+            ]
+        )
+
+    return updated_version_languages
 
-        # Verifica o treinamento que esta em execução, caso o tempo de criação seja maior que 2 horas
-        # ele torna a task como falha
-        if train.created_at + timedelta(hours=2) <= timezone.now():
-            train.status = RepositoryQueueTask.STATUS_FAILED
-            train.end_training = timezone.now()
-            train.save(update_fields=["status", "end_training"])
+
+def _clone_evaluates(original_version, clone_version_languages):
+    for original_version_language in original_version.version_languages:
+        clone_version_language = clone_version_languages[
+            original_version_language.language
+        ]
+        evaluates = list(
+            RepositoryEvaluate.objects.filter(
+                repository_version_language=original_version_language
+            ).values("pk", "text", "intent")
+        )
+        clone_evaluates = RepositoryEvaluate.objects.bulk_create(
+            [
+                RepositoryEvaluate(
+                    repository_version_language=clone_version_language,
+                    text=evaluate["text"],
+                    intent=evaluate["intent"],
+                )
+                for evaluate in evaluates
+            ],
+            batch_size=CLONE_VERSION_BATCH_SIZE,
+        )
+        evaluate_ids = {
+            evaluate["pk"]: clone_evaluate.pk
+            for evaluate, clone_evaluate in zip(evaluates, clone_evaluates)
+        }
+
+        RepositoryEvaluateEntity.objects.bulk_create(
+            [
+                RepositoryEvaluateEntity(
+                    repository_evaluate_id=evaluate_ids[
+                        evaluate_entity["repository_evaluate_id"]
+                    ],
+                    start=evaluate_entity["start"],
+                    end=evaluate_entity["end"],
+                    entity_id=evaluate_entity["entity_id"],
+                )
+                for evaluate_entity in RepositoryEvaluateEntity.objects.filter(
+                    repository_evaluate_id__in=evaluate_ids
+                ).values("repository_evaluate_id", "start", "end", "entity_id")
+            ],
+            batch_size=CLONE_VERSION_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
 
 
 @app.task(name="clone_version")
@@ -118,153 +428,67 @@ def clone_version(
 
     # Copy version_languages and direct fields
     bulk_version_languages = [
-        RepositoryVersionLanguage(**version, pk=None, repository_version=clone)
+        RepositoryVersionLanguage(**dict(version, id=None, repository_version_id=clone.pk))
         for version in original_version.version_languages.values()
     ]
     RepositoryVersionLanguage.objects.bulk_create(
         bulk_version_languages, ignore_conflicts=True
     )
-
-    # Copy version_languages relations (examples, intents, etc)
-    for original_version_language in original_version.version_languages:
-        clone_version_language = clone.get_version_language(
-            original_version_language.language
-        )
-
-        clone_version_language.update_trainer(
-            original_version_language.get_bot_data.bot_data,
-            original_version_language.get_bot_data.rasa_version,
-        )
-
-        examples = RepositoryExample.objects.filter(
-            repository_version_language=original_version_language
+    clone_version_languages = {
+        version_language.language: version_language
+        for version_language in clone.version_languages
+    }
+
+    task_queues = [
+        version_language.create_task(
+            id_queue=app.current_task.request.id or "",
+            from_queue=RepositoryQueueTask.QUEUE_CELERY,
+            type_processing=RepositoryQueueTask.TYPE_PROCESSING_CLONE_VERSION,
         )
+        for version_language in clone_version_languages.values()
+    ]
+    RepositoryQueueTask.objects.filter(pk__in=[task.pk for task in task_queues]).update(
+        status=RepositoryQueueTask.STATUS_PROCESSING
+    )
 
-        for original_example in examples:
-            intent, created = RepositoryIntent.objects.get_or_create(
-                text=original_example.intent.text,
-                repository_version=clone_version_language.repository_version,
-            )
-            example_id = RepositoryExample.objects.create(
-                repository_version_language=clone_version_language,
-                text=original_example.text,
-                intent=intent,
-                created_at=original_example.created_at,
-                last_update=original_example.last_update,
-            )
-
-            example_entities = RepositoryExampleEntity.objects.filter(
-                repository_example=original_example
-            )
-
-            for example_entity in example_entities:
-                if example_entity.entity.group:
-                    group, created_group = RepositoryEntityGroup.objects.get_or_create(
-                        repository_version=clone,
-                        value=example_entity.entity.group.value,
-                    )
-                    entity, created_entity = RepositoryEntity.objects.get_or_create(
-                        repository_version=clone,
-                        value=example_entity.entity.value,
-                        group=group,
-                    )
-                    RepositoryExampleEntity.objects.create(
-                        repository_example=example_id,
-                        start=example_entity.start,
-                        end=example_entity.end,
-                        entity=entity,
-                        created_at=example_entity.created_at,
-                    )
-                else:
-                    entity, created = RepositoryEntity.objects.get_or_create(
-                        repository_version=clone, value=example_entity.entity.value
-                    )
-                    RepositoryExampleEntity.objects.create(
-                        repository_example=example_id,
-                        start=example_entity.start,
-                        end=example_entity.end,
-                        entity=entity,
-                        created_at=example_entity.created_at,
-                    )
-
-            translated_examples = RepositoryTranslatedExample.objects.filter(
-                original_example=original_example
-            )
-
-            for translated_example in translated_examples:
-                translated = RepositoryTranslatedExample.objects.create(
-                    repository_version_language=clone.get_version_language(
-                        translated_example.language
-                    ),
-                    original_example=example_id,
-                    language=translated_example.language,
-                    text=translated_example.text,
-                    created_at=translated_example.created_at,
-                    clone_repository=True,
-                )
-
-                translated_entity_examples = RepositoryTranslatedExampleEntity.objects.filter(
-                    repository_translated_example=translated_example
+    try:
+        with transaction.atomic():
+            # Copy version_languages relations (examples, intents, etc)
+            for original_version_language in original_version.version_languages:
+                trainer = original_version_language.get_bot_data
+                # The clones share the stored artifact of the trained model
+                clone_version_languages[
+                    original_version_language.language
+                ].update_trainer(
+                    trainer.bot_data, trainer.rasa_version, trainer.bot_data_sha256
                 )
 
-                for translated_entity in translated_entity_examples:
-                    if translated_entity.entity.group:
-                        (
-                            group,
-                            created_group,
-                        ) = RepositoryEntityGroup.objects.get_or_create(
-                            repository_version=clone,
-                            value=translated_entity.entity.group.value,
-                        )
-                        entity, created_entity = RepositoryEntity.objects.get_or_create(
-                            repository_version=clone,
-                            value=translated_entity.entity.value,
-                            group=group,
-                        )
-                        RepositoryTranslatedExampleEntity.objects.create(
-                            repository_translated_example=translated,
-                            start=translated_entity.start,
-                            end=translated_entity.end,
-                            entity=entity,
-                            created_at=translated_entity.created_at,
-                        )
-                    else:
-                        entity, created_entity = RepositoryEntity.objects.get_or_create(
-                            repository_version=clone,
-                            value=translated_entity.entity.value,
-                        )
-                        RepositoryTranslatedExampleEntity.objects.create(
-                            repository_translated_example=translated,
-                            start=translated_entity.start,
-                            end=translated_entity.end,
-                            entity=entity,
-                            created_at=translated_entity.created_at,
-                        )
-
-        evaluates = RepositoryEvaluate.objects.filter(
-            repository_version_language=original_version_language
-        )
-
-        for evaluate in evaluates:
-            evaluate_id = RepositoryEvaluate.objects.create(
-                repository_version_language=clone_version_language,
-                text=evaluate.text,
-                intent=evaluate.intent,
-                created_at=evaluate.created_at,
-            )
-
-            bulk_evaluate_entities = [
-                RepositoryEvaluateEntity(
-                    **evaluate_entity, pk=None, repository_evaluate=evaluate_id
-                )
-                for evaluate_entity in evaluate.entities.all().values()
-            ]
-            RepositoryEvaluateEntity.objects.bulk_create(
-                bulk_evaluate_entities, ignore_conflicts=True
+            updated_version_languages = _clone_examples(
+                original_version, clone, clone_version_languages
             )
+            _clone_evaluates(original_version, clone_version_languages)
+
+            RepositoryVersionLanguage.objects.filter(
+                pk__in=updated_version_languages
+            ).update(last_update=timezone.now())
+            RepositoryVersionLanguageStats.mark_dirty([clone.pk])
+
+            clone.is_deleted = False
+            clone.save(update_fields=["is_deleted"])
+    except Exception:
+        RepositoryQueueTask.objects.filter(
+            pk__in=[task.pk for task in task_queues]
+        ).update(status=RepositoryQueueTask.STATUS_FAILED, end_training=timezone.now())
+        raise
+
+    RepositoryQueueTask.objects.filter(pk__in=[task.pk for task in task_queues]).update(
+        status=RepositoryQueueTask.STATUS_SUCCESS, end_training=timezone.now()
+    )
 
-    clone.is_deleted = False
-    clone.save(update_fields=["is_deleted"])
+    if settings.USE_ELASTICSEARCH:
+        handle_version_examples.apply_async(
+            args=[clone.pk], queue=settings.ELASTICSEARCH_CUSTOM_QUEUE
+        )
     return True
 
 
@@ -340,43 +564,90 @@ def clone_repository(
 
 @app.task()
 def delete_nlp_logs():
-    BATCH_SIZE = 5000
-    logs = RepositoryNLPLog.objects.filter(
-        created_at__lt=timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        - timezone.timedelta(days=90)
+    retention = delete_expired_nlp_logs()
+    return {
+        "deleted": retention.deleted,
+        "dropped_partitions": len(retention.dropped_partitions),
+        "logs_per_second": round(retention.rate, 2),
+    }
+
+
+@app.task(name="export_nlp_logs", bind=True)
+def export_nlp_logs(self, search, user_id, file_format="xlsx"):
+    """
+    Exports the NLP logs matching ``search`` (the body of an elasticsearch
+    search) scrolling over all of them, NLP_LOG_EXPORT_SCAN_SIZE per page,
+    instead of the first REPOSITORY_NLP_LOG_LIMIT ones
+    """
+    for param in ["from", "size", "sort"]:
+        search.pop(param, None)
+    logs = (
+        RepositoryNLPLogDocument.search()
+        .update_from_dict(search)
+        .params(size=settings.NLP_LOG_EXPORT_SCAN_SIZE)
+        .scan()
     )
 
-    num_updated = 0
-    max_id = -1
-    while True:
-        batch = list(logs.filter(id__gt=max_id).order_by("id")[:BATCH_SIZE])
+    def progress(rows):
+        if rows % settings.NLP_LOG_EXPORT_SCAN_SIZE == 0:
+            self.update_state(state="PROGRESS", meta={"user": user_id, "rows": rows})
 
-        if not batch:
-            break
+    export = ExportRepositoryLogUseCase().export(logs, file_format, progress)
+    return {"user": user_id, **export}
 
-        max_id = batch[-1].id
-        with transaction.atomic():
-            for log in batch:
-                log.delete()
 
-        num_updated += len(batch)
-        print(f" > deleted {num_updated} nlp logs")
+COUNT_AUTHORIZATIONS_BATCH_SIZE = 1000
+COUNT_AUTHORIZATIONS_LAST_RUN_KEY = "repositories_count_authorizations:last_run"
 
 
 @app.task()
-def repositories_count_authorizations():
-    for repository in Repository.objects.all():
-        count = repository.authorizations.filter(
-            user__in=RepositoryReports.objects.filter(
-                repository_version_language__repository_version__repository=repository,
-                report_date__year=timezone.now().year,
-                report_date__month=timezone.now().month,
-            )
-            .distinct()
-            .values_list("user", flat=True)
-        ).count()
-        repository.count_authorizations = count
-        repository.save(update_fields=["count_authorizations"])
+def repositories_count_authorizations(incremental=False):
+    """
+    Counts the authorizations of the users with reports in the current month
+    of each repository, with one grouped query. The incremental mode only
+    recounts the repositories with reports since the last run of the month.
+    """
+    today = timezone.now().date()
+    month_start = today.replace(day=1)
+
+    repositories = Repository.objects.all()
+    last_run = cache.get(COUNT_AUTHORIZATIONS_LAST_RUN_KEY)
+    if incremental and last_run and last_run >= month_start:
+        repositories = repositories.filter(
+            versions__repositoryversionlanguage__repository_reports__report_date__gte=last_run
+        ).distinct()
+
+    counts = dict(
+        RepositoryAuthorization.objects.filter(
+            Exists(
+                RepositoryReports.objects.filter(
+                    repository_version_language__repository_version__repository=OuterRef(
+                        "repository"
+                    ),
+                    user=OuterRef("user"),
+                    report_date__gte=month_start,
+                )
+            ),
+            repository__in=repositories,
+        )
+        .values("repository")
+        .annotate(count=Count("pk"))
+        .values_list("repository", "count")
+    )
+
+    changed = [
+        Repository(pk=pk, count_authorizations=counts.get(pk, 0))
+        for pk, count_authorizations in repositories.values_list(
+            "pk", "count_authorizations"
+        )
+        if counts.get(pk, 0) != count_authorizations
+    ]
+    Repository.objects.bulk_update(
+        changed, ["count_authorizations"], batch_size=COUNT_AUTHORIZATIONS_BATCH_SIZE
+    )
+
+    cache.set(COUNT_AUTHORIZATIONS_LAST_RUN_KEY, today, None)
+    return len(changed)
 
 
 @app.task(name="auto_translation")
@@ -385,174 +656,117 @@ def auto_translation(
 ):
 
     repository_version = RepositoryVersion.objects.get(pk=repository_version)
+    version_language = repository_version.get_version_language(language=target_language)
 
-    task_queue = repository_version.get_version_language(
-        language=target_language
-    ).create_task(
+    task_queue = version_language.create_task(
         id_queue=app.current_task.request.id,
         from_queue=RepositoryQueueTask.QUEUE_CELERY,
         type_processing=RepositoryQueueTask.TYPE_PROCESSING_AUTO_TRANSLATE,
     )
+
+    examples = RepositoryExample.objects.filter(
+        repository_version_language__repository_version=repository_version,
+        repository_version_language__language=source_language,
+    ).exclude(translations__language=target_language)
     if len(selected_ids) > 0:
-        examples = (
-            RepositoryExample.objects.filter(
-                repository_version_language__repository_version=repository_version,
-                repository_version_language__language=source_language,
-                pk__in=selected_ids
-            )
-            .annotate(
-                translation_count=Count(
-                    "translations", filter=Q(translations__language=target_language)
-                )
+        examples = examples.filter(pk__in=selected_ids)
+    examples = list(examples.order_by("pk").values_list("pk", "text"))
+
+    task_queue.total = len(examples)
+    task_queue.save(update_fields=["total"])
+
+    # Enough texts to keep every translation worker busy
+    chunk_size = settings.TRANSLATION_BATCH_SIZE * settings.TRANSLATION_MAX_WORKERS
+    for i in range(0, len(examples), chunk_size):
+        chunk = dict(examples[i : i + chunk_size])
+
+        entities = defaultdict(list)
+        for example_id, start, end, entity_id in RepositoryExampleEntity.objects.filter(
+            repository_example__in=chunk.keys()
+        ).values_list("repository_example", "start", "end", "entity"):
+            entities[example_id].append((chunk[example_id][start:end], entity_id))
+
+        texts_translated = dict(
+            zip(
+                chunk.keys(),
+                translate.translate_texts(
+                    list(chunk.values()), source_language, target_language
+                ),
             )
-            .filter(translation_count=0)
         )
-    else:
-        examples = (
-            RepositoryExample.objects.filter(
-                repository_version_language__repository_version=repository_version,
-                repository_version_language__language=source_language,
-            )
-            .annotate(
-                translation_count=Count(
-                    "translations", filter=Q(translations__language=target_language)
-                )
+        entity_texts = {
+            entity_text
+            for example_entities in entities.values()
+            for entity_text, entity_id in example_entities
+        }
+        entity_texts_translated = dict(
+            zip(
+                entity_texts,
+                translate.translate_texts(
+                    list(entity_texts),
+                    source_language,
+                    "pt" if target_language == "pt_br" else target_language,
+                ),
             )
-            .filter(translation_count=0)
         )
 
-    for example in examples:
-        if example.translations.filter(language=target_language).count() > 0:
-            # Checks if there is already a translation for this example, it occurs if it is running and the user
-            # purposely adds a translation
-            continue
-
-        example_translated = translate.translate(
-            text=example.get_text(language=source_language),
-            source_lang=source_language,
-            target_language=target_language,
-        )
-
-        translated = RepositoryTranslatedExample.objects.create(
-            original_example=example, language=target_language, text=example_translated
-        )
-        entities = example.get_entities(language=source_language)
-
-        for entity in entities:
-            entity_text = example.get_text(language=source_language)[
-                entity.start : entity.end
-            ]
-            entity_translated = translate.translate(
-                text=entity_text,
-                source_lang=source_language,
-                target_language="pt" if target_language == "pt_br" else target_language,
+        with transaction.atomic():
+            # Translations added by the users while the task is running are kept
+            translated_ids = set(
+                RepositoryTranslatedExample.objects.filter(
+                    original_example__in=chunk.keys(), language=target_language
+                ).values_list("original_example", flat=True)
             )
-            if entity_translated in example_translated:
-                start = example_translated.find(entity_translated)
-                end = start + len(entity_translated)
-                RepositoryTranslatedExampleEntity.objects.create(
-                    repository_translated_example=translated,
-                    start=start,
-                    end=end,
-                    entity=entity.entity,
-                )
-
-    task_queue.status = RepositoryQueueTask.STATUS_SUCCESS
-    task_queue.end_training = timezone.now()
-    task_queue.save(update_fields=["status", "end_training"])
-
-
-@app.task()
-def repository_score():  # pragma: no cover
-    for version in RepositoryVersion.objects.filter(
-        is_default=True, repository__repository_type="classifier"
-    ):
-        dataset = {}
-        intents = []
-        train = {}
-        train_total = 0
-
-        repository_examples = RepositoryExample.objects.filter(
-            repository_version_language__repository_version=version,
-            repository_version_language__language=version.repository.language,
-        )
-
-        filtered_examples = list(
-            map(
-                lambda intent: {
-                    "value": intent.text,
-                    "examples__count": version.repository.examples(
-                        queryset=repository_examples, version_default=version.is_default
+            example_ids = [pk for pk in chunk if pk not in translated_ids]
+
+            translations = RepositoryTranslatedExample.objects.bulk_create(
+                [
+                    RepositoryTranslatedExample(
+                        repository_version_language=version_language,
+                        original_example_id=example_id,
+                        language=target_language,
+                        text=texts_translated[example_id],
                     )
-                    .filter(intent=intent)
-                    .count(),
-                },
-                version.version_intents.all(),
+                    for example_id in example_ids
+                ]
             )
-        )
 
-        repository_evaluate = RepositoryEvaluate.objects.filter(
-            repository_version_language__repository_version=version,
-            repository_version_language__language=version.repository.language,
-        )
+            translated_entities = []
+            for translated in translations:
+                example_translated = translated.text
+                for entity_text, entity_id in entities[translated.original_example_id]:
+                    entity_translated = entity_texts_translated[entity_text]
+                    if entity_translated in example_translated:
+                        start = example_translated.find(entity_translated)
+                        translated_entities.append(
+                            RepositoryTranslatedExampleEntity(
+                                repository_translated_example=translated,
+                                start=start,
+                                end=start + len(entity_translated),
+                                entity_id=entity_id,
+                            )
+                        )
+            RepositoryTranslatedExampleEntity.objects.bulk_create(translated_entities)
 
-        filtered_evaluate_sentences = dict(
-            map(
-                lambda x: (
-                    x,
-                    version.repository.evaluations(
-                        language=x,
-                        queryset=repository_evaluate,
-                        version_default=version.is_default,
-                    ).count(),
-                ),
-                version.repository.available_languages(
-                    queryset=RepositoryExample.objects.filter(
-                        repository_version_language__repository_version=version,
-                        repository_version_language__language=version.repository.language,
-                    ),
-                    version_default=version.is_default,
-                ),
+            now = timezone.now()
+            RepositoryExample.objects.filter(pk__in=example_ids).update(last_update=now)
+            RepositoryVersionLanguage.objects.filter(pk=version_language.pk).update(
+                last_update=now
             )
-        )
+            # Each chunk is kept if a later one fails, with its stats recomputed
+            RepositoryVersionLanguageStats.mark_dirty([repository_version.pk])
 
-        for example in filtered_examples:
-            train[example["value"]] = example["examples__count"]
-            intents.append(example["value"])
-            train_total += example["examples__count"]
+            task_queue.processed += len(chunk)
+            task_queue.save(update_fields=["processed"])
 
-        dataset["intentions"] = intents
-        dataset["train_count"] = train_total
-        dataset["train"] = train
-        dataset["evaluate_count"] = filtered_evaluate_sentences[
-            version.repository.language
-        ]
-
-        intentions_balance = intentions_balance_score(dataset)
-        intentions_size = intentions_size_score(dataset)
-        evaluate_size = evaluate_size_score(dataset)
+    task_queue.status = RepositoryQueueTask.STATUS_SUCCESS
+    task_queue.end_training = timezone.now()
+    task_queue.save(update_fields=["status", "end_training"])
 
-        score, created = RepositoryScore.objects.get_or_create(
-            repository=version.repository
-        )
 
-        score.intents_balance_score = float(intentions_balance.get("score"))
-        score.intents_balance_recommended = intentions_balance.get("recommended")
-        score.intents_size_score = float(intentions_size.get("score"))
-        score.intents_size_recommended = intentions_size.get("recommended")
-        score.evaluate_size_score = float(evaluate_size.get("score"))
-        score.evaluate_size_recommended = evaluate_size.get("recommended")
-
-        score.save(
-            update_fields=[
-                "intents_balance_score",
-                "intents_balance_recommended",
-                "intents_size_score",
-                "intents_size_recommended",
-                "evaluate_size_score",
-                "evaluate_size_recommended",
-            ]
-        )
+@app.task()
+def repository_score(full=False):
+    update_repository_scores(full)
 
 
 @app.task(name="word_suggestions")
@@ -1,11 +1,37 @@
+import base64
+import io
+import os
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
+
 import requests_mock
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
 from django.utils import timezone
+from django_redis import get_redis_connection
 
+from bothub import translate
+from bothub.authentication.cache import UserAuthorizationsMemo
 from bothub.authentication.models import User
+from bothub.storage import (
+    FileSystemStorage,
+    S3MultipartWriter,
+    Storage,
+    StorageWriter,
+)
+from bothub.utils import (
+    evaluate_size_score,
+    intentions_balance_score,
+    intentions_size_score,
+    send_bot_data_file_aws,
+)
 from . import languages
+from .helpers import ChatGPTTokenText, get_tokenizer
 from .exceptions import DoesNotHaveTranslation
 from .exceptions import TrainingNotAllowed
 from .models import (
@@ -13,6 +39,9 @@ from .models import (
     RepositoryIntent,
     RepositoryEvaluate,
     RepositoryQueueTask,
+    RepositoryVersion,
+    RepositoryVersionLanguageStats,
+    RepositoryScore,
     QAKnowledgeBase,
     QAtext,
     Organization,
@@ -26,6 +55,21 @@ from .models import RepositoryExampleEntity
 from .models import RepositoryTranslatedExample
 from .models import RepositoryTranslatedExampleEntity
 from .models import RequestRepositoryAuthorization
+from .models import RepositoryNLPLog
+from .models import RepositoryNLPLogIntent
+from .models import RepositoryNLPTrain
+from .models import RepositoryReports
+from .reports import flush_reports, increment_reports, REPORTS_BUFFER_KEY
+from .retention import NLPLogsRetention, expired_partitions
+from .scores import compute_scores
+from .tasks import (
+    auto_translation,
+    export_nlp_logs,
+    repositories_count_authorizations,
+    repository_score,
+)
+from .trainings import check_trainings
+from .versions import VERSION_LANGUAGES_CACHE_KEY
 
 
 class RepositoryVersionTestCase(TestCase):
@@ -56,6 +100,77 @@ class RepositoryVersionTestCase(TestCase):
         self.assertEqual(update1, self.repository.current_version("en"))
 
 
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class VersionLanguagesCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        owner = User.objects.create_user("fake@user.com", "user", "123456")
+        self.repository = Repository.objects.create(
+            owner=owner, slug="test", language=languages.LANGUAGE_EN
+        )
+
+    def test_current_version_cached(self):
+        version_language = self.repository.current_version()
+
+        with self.assertNumQueries(1):
+            cached = self.repository.current_version()
+            self.assertEqual(cached, version_language)
+            self.assertEqual(cached.repository_version.repository, self.repository)
+
+    def test_specific_version_cached(self):
+        version = self.repository.current_version().repository_version
+        version_language = self.repository.get_specific_version_id(
+            version.pk, languages.LANGUAGE_PT
+        )
+        self.assertEqual(version_language.language, languages.LANGUAGE_PT)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.repository.get_specific_version_id(
+                    str(version.pk), languages.LANGUAGE_PT
+                ),
+                version_language,
+            )
+
+    def test_default_version_switch(self):
+        old_default = self.repository.current_version().repository_version
+
+        RepositoryVersion.objects.filter(repository=self.repository).update(
+            is_default=False
+        )
+        new_default = RepositoryVersion.objects.create(
+            repository=self.repository, name="new"
+        )
+        self.assertEqual(
+            self.repository.current_version().repository_version, new_default
+        )
+
+        new_default.delete()
+        old_default.is_default = True
+        old_default.save()
+        self.assertEqual(
+            self.repository.current_version().repository_version, old_default
+        )
+
+    def test_stale_cache(self):
+        other = Repository.objects.create(
+            owner=self.repository.owner, slug="other"
+        ).current_version()
+        cache.set(
+            VERSION_LANGUAGES_CACHE_KEY.format(self.repository.pk),
+            {f"default:{languages.LANGUAGE_EN}": other.pk},
+        )
+
+        version_language = self.repository.current_version()
+        self.assertNotEqual(version_language, other)
+        self.assertEqual(
+            version_language.repository_version.repository_id, self.repository.pk
+        )
+
+
 class TranslateTestCase(TestCase):
     EXPECTED_RASA_NLU_DATA = {
         "text": "meu nome é User",
@@ -737,6 +852,53 @@ class RepositoryAuthorizationTestCase(TestCase):
         )
         self.assertEqual(user_authorization.role, collaborator_repository_auth.role)
 
+    def test_user_authorization_cached(self):
+        # Created and then cached
+        self.repository.get_user_authorization(self.user)
+        self.repository.get_user_authorization(self.user)
+
+        with self.assertNumQueries(0):
+            authorization = self.repository.get_user_authorization(self.user)
+            self.assertEqual(authorization.level, RepositoryAuthorization.LEVEL_READER)
+
+        authorization.role = RepositoryAuthorization.ROLE_CONTRIBUTOR
+        authorization.save()
+        self.assertEqual(
+            self.repository.get_user_authorization(self.user).role,
+            RepositoryAuthorization.ROLE_CONTRIBUTOR,
+        )
+
+    def test_user_authorizations_memo(self):
+        with UserAuthorizationsMemo():
+            authorization = self.repository.get_user_authorization(self.user)
+            with mock.patch("bothub.authentication.cache._cache_get") as cache_get:
+                self.assertEqual(
+                    self.repository.get_user_authorization(self.user).pk,
+                    authorization.pk,
+                )
+            cache_get.assert_not_called()
+
+    def test_organization_role_synced(self):
+        self.organization_repository.get_user_authorization(self.collaborator)
+        self.organization_repository.get_user_authorization(self.collaborator)
+
+        self.organization.organization_authorizations.create(
+            user=self.collaborator, role=OrganizationAuthorization.ROLE_CONTRIBUTOR
+        )
+
+        self.assertEqual(
+            self.organization_repository.get_user_authorization(
+                self.collaborator
+            ).role,
+            OrganizationAuthorization.ROLE_CONTRIBUTOR,
+        )
+        self.assertEqual(
+            RepositoryAuthorization.objects.get(
+                user=self.collaborator, repository=self.organization_repository
+            ).role,
+            OrganizationAuthorization.ROLE_CONTRIBUTOR,
+        )
+
 
 class RepositoryVersionTrainingTestCase(TestCase):
     def setUp(self):
@@ -1627,3 +1789,938 @@ class RepositoryFormattedIntentsTestCase(TestCase):
         self.assertEqual(intents[0].get("value"), self.example_intent_1.text)
         self.assertEqual(intents[0].get("id"), self.example_intent_1.pk)
         self.assertEqual(intents[0].get("examples__count"), 2)
+
+
+class ChatGPTTokenTextTestCase(TestCase):
+    def test_tokenizer_is_shared(self):
+        self.assertIs(get_tokenizer(), get_tokenizer())
+
+    def test_count_tokens(self):
+        validator = ChatGPTTokenText()
+        validator.max_tokens = 4
+        count, chunks = validator.count_tokens("Hello world. Hello world. Bye")
+
+        self.assertEqual(count, 8)
+        self.assertEqual(chunks, ["Hello world. "])
+
+    def test_count_tokens_without_sentences(self):
+        self.assertEqual(ChatGPTTokenText().count_tokens("Hello world"), (0, []))
+
+
+class RepositoryVersionLanguageStatsTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner@user.com", "owner")
+
+        self.repository = Repository.objects.create(
+            owner=self.owner.repository_owner,
+            name="Test",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+        self.version_language = self.repository.current_version()
+        self.repository_version = self.version_language.repository_version
+
+        self.intent = RepositoryIntent.objects.create(
+            text="greet", repository_version=self.repository_version
+        )
+        self.example = RepositoryExample.objects.create(
+            repository_version_language=self.version_language,
+            text="hi kate",
+            intent=self.intent,
+        )
+        RepositoryExampleEntity.objects.create(
+            repository_example=self.example, start=3, end=7, entity="name"
+        )
+        RepositoryExample.objects.create(
+            repository_version_language=self.version_language,
+            text="hello",
+            intent=self.intent,
+        )
+        translated = RepositoryTranslatedExample.objects.create(
+            original_example=self.example, language=languages.LANGUAGE_PT, text="oi kate"
+        )
+        RepositoryTranslatedExampleEntity.objects.create(
+            repository_translated_example=translated, start=3, end=7, entity="name"
+        )
+
+    def get_stats(self, language):
+        version_language = self.repository.current_version(language)
+        return RepositoryVersionLanguageStats.get_for(
+            self.repository_version.version_languages.filter(pk=version_language.pk)
+        )[version_language.pk]
+
+    def test_counts(self):
+        stats = self.get_stats(languages.LANGUAGE_EN)
+        self.assertEqual(stats.intents, {"greet": 2})
+        self.assertEqual(stats.entities, {"name": 1})
+        self.assertEqual(stats.translations, {languages.LANGUAGE_PT: 1})
+        self.assertEqual(stats.examples_count, 2)
+
+        translated_stats = self.get_stats(languages.LANGUAGE_PT)
+        self.assertEqual(translated_stats.intents, {})
+        self.assertEqual(translated_stats.translated_intents, {"greet": 1})
+        self.assertEqual(translated_stats.translated_entities, {"name": 1})
+        self.assertEqual(translated_stats.all_examples_count, 1)
+
+    def test_mark_dirty_on_change(self):
+        self.get_stats(languages.LANGUAGE_EN)
+        stats = RepositoryVersionLanguageStats.objects.get(pk=self.version_language.pk)
+        self.assertFalse(stats.is_dirty)
+
+        RepositoryExample.objects.create(
+            repository_version_language=self.version_language,
+            text="good morning",
+            intent=self.intent,
+        )
+        stats.refresh_from_db()
+        self.assertTrue(stats.is_dirty)
+
+        stats = self.get_stats(languages.LANGUAGE_EN)
+        self.assertEqual(stats.intents, {"greet": 3})
+        stats.refresh_from_db()
+        self.assertFalse(stats.is_dirty)
+
+        self.example.delete()
+        self.assertEqual(self.get_stats(languages.LANGUAGE_EN).intents, {"greet": 2})
+
+    def test_rename_intent(self):
+        self.get_stats(languages.LANGUAGE_EN)
+        self.intent.text = "hello"
+        self.intent.save()
+        self.assertEqual(self.get_stats(languages.LANGUAGE_EN).intents, {"hello": 2})
+
+    def test_languages_status(self):
+        self.repository.languages_status
+        with self.assertNumQueries(3):
+            languages_status = self.repository.languages_status
+
+        self.assertEqual(languages_status[languages.LANGUAGE_EN]["examples"]["count"], 2)
+        self.assertEqual(
+            languages_status[languages.LANGUAGE_EN]["examples"]["entities"],
+            [RepositoryEntity.objects.get(value="name").pk],
+        )
+        self.assertEqual(
+            languages_status[languages.LANGUAGE_PT]["base_translations"],
+            {"count": 1, "percentage": 50.0},
+        )
+
+
+class RepositoryReportsTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner@user.com", "owner")
+
+        self.repository = Repository.objects.create(
+            owner=self.owner.repository_owner,
+            name="Test",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+        self.version_language = self.repository.current_version()
+        self.key = (self.version_language.pk, self.owner.pk, timezone.now().date())
+
+    def create_log(self):
+        return RepositoryNLPLog.objects.create(
+            text="hi",
+            user_agent="python-requests/2.20.1",
+            from_backend=False,
+            repository_version_language=self.version_language,
+            nlp_log="{}",
+            user=self.owner,
+        )
+
+    def test_log_increments_report(self):
+        self.create_log()
+        self.create_log()
+        self.assertEqual(RepositoryReports.objects.get().count_reports, 2)
+
+    def test_increment_reports(self):
+        increment_reports({self.key: 3})
+        increment_reports({self.key: 2})
+        report = RepositoryReports.objects.get()
+        self.assertEqual(report.count_reports, 5)
+        self.assertEqual(report.report_date, self.key[2])
+
+    def test_buffered_reports(self):
+        get_redis_connection("default").delete(REPORTS_BUFFER_KEY)
+
+        with self.settings(REPOSITORY_REPORTS_BUFFER=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.create_log()
+                increment_reports({self.key: 2})
+        self.assertFalse(RepositoryReports.objects.exists())
+
+        self.assertEqual(flush_reports(), 1)
+        self.assertEqual(RepositoryReports.objects.get().count_reports, 3)
+        self.assertEqual(flush_reports(), 0)
+
+    def test_buffered_reports_kept_when_not_written(self):
+        get_redis_connection("default").delete(REPORTS_BUFFER_KEY)
+
+        with self.settings(REPOSITORY_REPORTS_BUFFER=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                increment_reports({self.key: 2})
+
+        with mock.patch.object(
+            RepositoryReports, "increment", side_effect=DatabaseError()
+        ):
+            with self.assertRaises(DatabaseError):
+                flush_reports()
+        self.assertFalse(RepositoryReports.objects.exists())
+
+        # Applied once, by the flush after the failed one
+        self.assertEqual(flush_reports(), 1)
+        self.assertEqual(flush_reports(), 0)
+        self.assertEqual(RepositoryReports.objects.get().count_reports, 2)
+
+
+@override_settings(
+    GOOGLE_API_TRANSLATION_KEY="key",
+    TRANSLATION_BATCH_SIZE=2,
+    TRANSLATION_MAX_WORKERS=2,
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class AutoTranslationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.owner = User.objects.create_user("owner@user.com", "owner")
+
+        self.repository = Repository.objects.create(
+            owner=self.owner.repository_owner,
+            name="Test",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+        self.version = self.repository.current_version().repository_version
+        self.intent = RepositoryIntent.objects.create(
+            text="greet", repository_version=self.version
+        )
+        self.example = self.create_example("hello douglas")
+        RepositoryExampleEntity.objects.create(
+            repository_example=self.example, start=6, end=13, entity="name"
+        )
+        self.translated_example = self.create_example("hi")
+        RepositoryTranslatedExample.objects.create(
+            original_example=self.translated_example,
+            language=languages.LANGUAGE_PT,
+            text="oi",
+        )
+        self.other_examples = [
+            self.create_example(text) for text in ["bye", "good bye", "see you"]
+        ]
+
+    def create_example(self, text):
+        return RepositoryExample.objects.create(
+            repository_version_language=self.repository.current_version(),
+            text=text,
+            intent=self.intent,
+        )
+
+    def translate(self, request_mock):
+        # Fake translation of the texts, in upper case
+        request_mock.post(
+            "https://translation.googleapis.com/language/translate/v2",
+            json=lambda request, context: {
+                "data": {
+                    "translations": [
+                        {"translatedText": text.upper()}
+                        for text in request.json()["q"]
+                    ]
+                }
+            },
+        )
+        auto_translation.apply(
+            args=[self.version.pk, languages.LANGUAGE_EN, languages.LANGUAGE_PT, []]
+        )
+
+    @requests_mock.Mocker()
+    def test_translate(self, request_mock):
+        self.translate(request_mock)
+
+        translated = self.example.get_translation(languages.LANGUAGE_PT)
+        self.assertEqual(translated.text, "HELLO DOUGLAS")
+        self.assertEqual(
+            [entity.to_dict for entity in translated.entities.all()],
+            [{"start": 6, "end": 13, "entity": "name"}],
+        )
+        self.assertEqual(
+            self.translated_example.get_translation(languages.LANGUAGE_PT).text, "oi"
+        )
+        for example in self.other_examples:
+            self.assertEqual(
+                example.get_translation(languages.LANGUAGE_PT).text,
+                example.text.upper(),
+            )
+
+        task = RepositoryQueueTask.objects.get(
+            type_processing=RepositoryQueueTask.TYPE_PROCESSING_AUTO_TRANSLATE
+        )
+        self.assertEqual(task.status, RepositoryQueueTask.STATUS_SUCCESS)
+        self.assertEqual((task.total, task.processed), (4, 4))
+        # 4 texts in 2 batches and the entity
+        self.assertEqual(request_mock.call_count, 3)
+
+    @requests_mock.Mocker()
+    def test_cached_translations(self, request_mock):
+        self.translate(request_mock)
+        RepositoryTranslatedExample.objects.all().delete()
+        self.create_example("douglas")
+
+        self.translate(request_mock)
+
+        self.assertEqual(RepositoryTranslatedExample.objects.count(), 6)
+        # Only "douglas" as an example isn't cached, its entity was
+        self.assertEqual(request_mock.call_count, 4)
+
+    @override_settings(TRANSLATION_MAX_WORKERS=1)
+    def test_chunks_kept_when_a_later_one_fails(self):
+        RepositoryVersionLanguageStats.get_for(
+            self.version.version_languages.all()
+        )
+        RepositoryVersionLanguageStats.objects.update(is_dirty=False)
+
+        with mock.patch(
+            "bothub.common.tasks.translate.translate_texts",
+            side_effect=[["OLA DOUGLAS", "TCHAU"], ["DOUGLAS"], Exception()],
+        ):
+            with self.assertRaises(Exception):
+                auto_translation.apply(
+                    args=[
+                        self.version.pk,
+                        languages.LANGUAGE_EN,
+                        languages.LANGUAGE_PT,
+                        [],
+                    ],
+                    throw=True,
+                )
+
+        self.assertEqual(
+            self.example.get_translation(languages.LANGUAGE_PT).text, "OLA DOUGLAS"
+        )
+        self.assertTrue(
+            RepositoryVersionLanguageStats.objects.filter(is_dirty=True).exists()
+        )
+
+
+@override_settings(
+    GOOGLE_API_TRANSLATION_KEY="key",
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class TranslationQuotaTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def request(self, request_mock):
+        request_mock.post(
+            "https://translation.googleapis.com/language/translate/v2",
+            [
+                {"json": {"error": {"code": 403}}},
+                {"json": {"data": {"translations": [{"translatedText": "oi"}]}}},
+            ],
+        )
+        return translate.translate_texts(["hi"], "en", "pt")
+
+    @requests_mock.Mocker()
+    def test_waits_when_rate_limited(self, request_mock):
+        with mock.patch("bothub.translate.time.sleep") as sleep:
+            self.assertEqual(self.request(request_mock), ["oi"])
+        sleep.assert_called_once()
+
+    @requests_mock.Mocker()
+    def test_retries_after_the_wait_of_another_worker(self, request_mock):
+        with mock.patch("bothub.translate.time.sleep") as sleep, mock.patch(
+            "bothub.translate.quota_resumed_at", float("inf")
+        ):
+            self.assertEqual(self.request(request_mock), ["oi"])
+        sleep.assert_not_called()
+
+
+@override_settings(BOTHUB_NLP_BASE_URL="http://nlp/")
+class TrainingsCheckTestCase(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user("owner@user.com", "owner")
+        repository = Repository.objects.create(
+            owner=owner.repository_owner, slug="test", language=languages.LANGUAGE_EN
+        )
+        version_language = repository.current_version()
+        self.tasks = [
+            version_language.create_task(
+                id_queue=id_queue,
+                from_queue=RepositoryQueueTask.QUEUE_CELERY,
+                type_processing=RepositoryQueueTask.TYPE_PROCESSING_TRAINING,
+            )
+            for id_queue in ["finished", "running", "stuck", "unknown"]
+        ]
+        RepositoryQueueTask.objects.filter(id_queue="stuck").update(
+            created_at=timezone.now() - timedelta(hours=3)
+        )
+        self.statuses = {
+            "finished": {"status": RepositoryQueueTask.STATUS_SUCCESS, "ml_units": 1.5},
+            "running": {"status": RepositoryQueueTask.STATUS_PENDING},
+            "stuck": {"status": RepositoryQueueTask.STATUS_PENDING},
+        }
+
+    def assertStatuses(self):
+        tasks = {
+            task.id_queue: task for task in RepositoryQueueTask.objects.all()
+        }
+        self.assertEqual(tasks["finished"].status, RepositoryQueueTask.STATUS_SUCCESS)
+        self.assertEqual(tasks["finished"].ml_units, 1.5)
+        self.assertIsNotNone(tasks["finished"].end_training)
+        self.assertEqual(tasks["running"].status, RepositoryQueueTask.STATUS_PENDING)
+        self.assertEqual(tasks["stuck"].status, RepositoryQueueTask.STATUS_FAILED)
+        self.assertEqual(tasks["unknown"].status, RepositoryQueueTask.STATUS_PENDING)
+
+    def status_response(self, request, context):
+        id_task = request.qs["id_task"][0]
+        if id_task not in self.statuses:
+            context.status_code = 500
+            return {}
+        return self.statuses[id_task]
+
+    @requests_mock.Mocker()
+    def test_check_each_task(self, request_mock):
+        request_mock.get("http://nlp/v2/task-queue/", json=self.status_response)
+
+        self.assertEqual(check_trainings(), 2)
+
+        self.assertStatuses()
+        self.assertEqual(request_mock.call_count, 4)
+
+    @override_settings(TRAININGS_CHECK_BATCH_SIZE=3)
+    @requests_mock.Mocker()
+    def test_check_batch(self, request_mock):
+        request_mock.post(
+            "http://nlp/v2/task-queue/batch/",
+            json=lambda request, context: {
+                "tasks": [
+                    dict(self.statuses[task["id_task"]], id_task=task["id_task"])
+                    for task in request.json()["tasks"]
+                    if task["id_task"] in self.statuses
+                ]
+            },
+        )
+
+        self.assertEqual(check_trainings(), 2)
+
+        self.assertStatuses()
+        self.assertEqual(request_mock.call_count, 2)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class RepositoriesCountAuthorizationsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner@user.com", "owner")
+        self.users = [
+            User.objects.create_user(f"user{i}@user.com", f"user{i}")
+            for i in range(3)
+        ]
+        self.repositories = [
+            Repository.objects.create(
+                owner=self.owner.repository_owner,
+                slug=f"test-{i}",
+                language=languages.LANGUAGE_EN,
+            )
+            for i in range(3)
+        ]
+        for repository in self.repositories:
+            for user in self.users:
+                repository.get_user_authorization(user)
+
+    def report(self, repository, user, report_date=None, language=None):
+        RepositoryReports.objects.create(
+            repository_version_language=repository.current_version(language),
+            user=user,
+            count_reports=1,
+            report_date=report_date or timezone.now().date(),
+        )
+
+    def counts(self):
+        return [
+            repository.count_authorizations
+            for repository in Repository.objects.filter(
+                pk__in=[repository.pk for repository in self.repositories]
+            ).order_by("slug")
+        ]
+
+    def test_count(self):
+        self.report(self.repositories[0], self.users[0])
+        self.report(self.repositories[0], self.users[0], language=languages.LANGUAGE_PT)
+        self.report(self.repositories[0], self.users[1])
+        self.report(self.repositories[1], self.users[2])
+        # Reports of the previous month aren't counted
+        self.report(
+            self.repositories[2],
+            self.users[0],
+            timezone.now().date().replace(day=1) - timedelta(days=1),
+        )
+
+        with self.assertNumQueries(3):
+            repositories_count_authorizations()
+
+        self.assertEqual(self.counts(), [2, 1, 0])
+
+    def test_incremental(self):
+        self.report(self.repositories[0], self.users[0])
+        repositories_count_authorizations(incremental=True)
+        self.assertEqual(self.counts(), [1, 0, 0])
+
+        Repository.objects.filter(pk=self.repositories[0].pk).update(
+            count_authorizations=10
+        )
+        self.report(self.repositories[1], self.users[1])
+        repositories_count_authorizations(incremental=True)
+        # Only the repositories with reports since the last run are counted
+        self.assertEqual(self.counts(), [1, 1, 0])
+
+
+class RepositoryScoreTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner@user.com", "owner")
+        self.repositories = [
+            Repository.objects.create(
+                owner=self.owner.repository_owner,
+                slug=f"test-{i}",
+                language=languages.LANGUAGE_EN,
+            )
+            for i in range(3)
+        ]
+        for repository, intents in zip(
+            self.repositories, [{"greet": 3, "bye": 1}, {"greet": 2}, {}]
+        ):
+            self.add_examples(repository, intents)
+
+    def add_examples(self, repository, intents):
+        version_language = repository.current_version()
+        for intent, count in intents.items():
+            intent, created = RepositoryIntent.objects.get_or_create(
+                text=intent, repository_version=version_language.repository_version
+            )
+            for i in range(count):
+                RepositoryExample.objects.create(
+                    repository_version_language=version_language,
+                    text=f"{intent.text} {i} {RepositoryExample.objects.count()}",
+                    intent=intent,
+                )
+
+    def expected_score(self, intents, evaluate_count=0):
+        dataset = {
+            "intentions": list(intents),
+            "train": intents,
+            "train_count": sum(intents.values()),
+            "evaluate_count": evaluate_count,
+        }
+        return [
+            score(dataset)
+            for score in [
+                intentions_balance_score,
+                intentions_size_score,
+                evaluate_size_score,
+            ]
+        ]
+
+    def assertScore(self, repository, expected):
+        score = RepositoryScore.objects.get(repository=repository)
+        for (value, recommended), expected_score in zip(
+            [
+                (score.intents_balance_score, score.intents_balance_recommended),
+                (score.intents_size_score, score.intents_size_recommended),
+                (score.evaluate_size_score, score.evaluate_size_recommended),
+            ],
+            expected,
+        ):
+            self.assertAlmostEqual(value, expected_score["score"])
+            self.assertEqual(recommended, expected_score["recommended"])
+
+    def test_compute_scores(self):
+        datasets = [
+            ({"a": 10, "b": 30, "c": 0}, 5),
+            ({"a": 200, "b": 1}, 1000),
+            ({"a": 0, "b": 0}, 0),
+            ({"a": 3}, 2),
+            ({}, 0),
+        ]
+        intents_versions, intents_counts = [], []
+        for i, (intents, evaluate_count) in enumerate(datasets):
+            intents_versions += [i] * len(intents)
+            intents_counts += list(intents.values())
+
+        scores = compute_scores(
+            intents_versions,
+            intents_counts,
+            [evaluate_count for intents, evaluate_count in datasets],
+        )
+
+        for i, (intents, evaluate_count) in enumerate(datasets):
+            balance, size, evaluate = self.expected_score(intents, evaluate_count)
+            self.assertAlmostEqual(
+                scores["intents_balance_score"][i], balance["score"]
+            )
+            self.assertAlmostEqual(scores["intents_size_score"][i], size["score"])
+            self.assertAlmostEqual(scores["evaluate_size_score"][i], evaluate["score"])
+
+    def test_repository_score(self):
+        RepositoryEvaluate.objects.create(
+            repository_version_language=self.repositories[0].current_version(),
+            intent="greet",
+            text="hello",
+        )
+
+        with self.assertNumQueries(6):
+            repository_score()
+
+        self.assertScore(
+            self.repositories[0], self.expected_score({"greet": 3, "bye": 1}, 1)
+        )
+        self.assertScore(self.repositories[1], self.expected_score({"greet": 2}))
+        self.assertScore(self.repositories[2], self.expected_score({}))
+
+    def test_only_changed_repositories(self):
+        repository_score()
+        RepositoryScore.objects.update(intents_balance_score=-1)
+
+        self.add_examples(self.repositories[1], {"bye": 2})
+        repository_score()
+
+        self.assertEqual(
+            list(
+                RepositoryScore.objects.order_by("repository__slug").values_list(
+                    "intents_balance_score", flat=True
+                )
+            ),
+            [-1, self.expected_score({"greet": 2, "bye": 2})[0]["score"], -1],
+        )
+
+        repository_score(full=True)
+        self.assertFalse(RepositoryScore.objects.filter(intents_balance_score=-1))
+
+
+class NLPLogsRetentionTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner@user.com", "owner")
+
+        self.repository = Repository.objects.create(
+            owner=self.owner.repository_owner,
+            name="Test",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+        self.version_language = self.repository.current_version()
+        self.cutoff = timezone.now() - timedelta(days=90)
+
+    def create_log(self, created_at):
+        log = RepositoryNLPLog.objects.create(
+            text="hi",
+            user_agent="python-requests/2.20.1",
+            from_backend=False,
+            repository_version_language=self.version_language,
+            nlp_log="{}",
+            user=self.owner,
+        )
+        RepositoryNLPLog.objects.filter(pk=log.pk).update(created_at=created_at)
+        RepositoryNLPLogIntent.objects.create(
+            intent="greet", confidence=0.9, is_default=True, repository_nlp_log=log
+        )
+        return log
+
+    def test_delete_expired_logs(self):
+        for days in range(5):
+            self.create_log(self.cutoff - timedelta(days=days + 1))
+        recent = self.create_log(self.cutoff + timedelta(days=1))
+
+        retention = NLPLogsRetention(self.cutoff, chunk_size=2, sleep=0)
+        # The ids, the savepoint, both deletes and its release per chunk,
+        # plus the last empty fetch
+        with self.assertNumQueries(3 * 5 + 1):
+            retention.delete_chunks()
+
+        self.assertEqual(retention.deleted, 5)
+        self.assertEqual(
+            list(RepositoryNLPLog.objects.values_list("pk", flat=True)), [recent.pk]
+        )
+        self.assertEqual(
+            list(
+                RepositoryNLPLogIntent.objects.values_list(
+                    "repository_nlp_log", flat=True
+                )
+            ),
+            [recent.pk],
+        )
+
+    def test_expired_partitions(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE retention_test (id int, created_at timestamptz) "
+                "PARTITION BY RANGE (created_at)"
+            )
+            cursor.execute(
+                "CREATE TABLE retention_test_old PARTITION OF retention_test "
+                "FOR VALUES FROM ('2020-01-01') TO ('2020-02-01')"
+            )
+            cursor.execute(
+                "CREATE TABLE retention_test_new PARTITION OF retention_test "
+                "FOR VALUES FROM ('2020-02-01') TO ('2020-03-01')"
+            )
+
+        cutoff = datetime(2020, 2, 15, tzinfo=timezone.utc)
+        self.assertEqual(
+            expired_partitions("retention_test", cutoff), ["retention_test_old"]
+        )
+
+
+@override_settings(AWS_SEND=True)
+class TransferTrainAWSTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner@user.com", "owner")
+
+        self.repository = Repository.objects.create(
+            owner=self.owner.repository_owner,
+            name="Test",
+            slug="test",
+            language=languages.LANGUAGE_EN,
+        )
+        self.version_language = self.repository.current_version()
+        self.trainings = [
+            RepositoryNLPTrain.objects.create(
+                repositoryversionlanguage=self.version_language,
+                rasa_version=f"1.{i}",
+                bot_data=base64.b64encode(b"model").decode(),
+            )
+            for i in range(5)
+        ]
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = os.path.join(directory.name, "checkpoint")
+
+    def transfer(self, send, **options):
+        with mock.patch(
+            "bothub.common.management.commands.transfer_train_aws."
+            "send_bot_data_file_aws",
+            side_effect=send,
+        ):
+            call_command(
+                "transfer_train_aws",
+                batch_size=2,
+                workers=2,
+                checkpoint=self.checkpoint,
+                **options,
+            )
+
+    def bot_data(self):
+        return list(
+            RepositoryNLPTrain.objects.order_by("pk").values_list("bot_data", flat=True)
+        )
+
+    def test_transfer(self):
+        sent = []
+
+        def send(id, bot_data):
+            sent.append(bot_data)
+            return f"https://bucket/{id}"
+
+        self.transfer(send)
+
+        self.assertEqual(sent, [b"model"] * 5)
+        self.assertEqual(
+            self.bot_data(),
+            [f"https://bucket/{training.pk}" for training in self.trainings],
+        )
+        with open(self.checkpoint) as checkpoint:
+            self.assertEqual(checkpoint.read(), str(self.trainings[-1].pk))
+
+    def test_resume(self):
+        with open(self.checkpoint, "w") as checkpoint:
+            checkpoint.write(str(self.trainings[2].pk))
+
+        self.transfer(lambda id, bot_data: f"https://bucket/{id}")
+
+        self.assertEqual(
+            self.bot_data(),
+            [training.bot_data for training in self.trainings[:3]]
+            + [f"https://bucket/{training.pk}" for training in self.trainings[3:]],
+        )
+
+    def test_failed_kept_until_restart(self):
+        failed = self.trainings[1].pk
+
+        def send(id, bot_data):
+            if id == failed:
+                raise ConnectionError()
+            return f"https://bucket/{id}"
+
+        self.transfer(send)
+        self.assertEqual(
+            RepositoryNLPTrain.objects.get(pk=failed).bot_data,
+            self.trainings[1].bot_data,
+        )
+
+        self.transfer(lambda id, bot_data: f"https://bucket/{id}", restart=True)
+        self.assertEqual(
+            RepositoryNLPTrain.objects.get(pk=failed).bot_data,
+            f"https://bucket/{failed}",
+        )
+
+
+class StorageTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(STORAGE_SERVICE_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.storage = FileSystemStorage()
+
+    def read(self, key):
+        with self.storage.open(key) as file:
+            return file.read()
+
+    def test_upload(self):
+        self.storage.upload("bytes", b"content")
+        self.storage.upload("file", io.BytesIO(b"content"))
+        self.storage.upload("iterator", (chunk for chunk in [b"con", b"", b"tent"]))
+
+        for key in ["bytes", "file", "iterator"]:
+            self.assertEqual(self.read(key), b"content")
+            self.assertEqual(self.storage.size(key), 7)
+
+    def test_incomplete_backend(self):
+        class IncompleteStorage(Storage):
+            def exists(self, key):
+                return False
+
+        class IncompleteWriter(StorageWriter):
+            def write(self, b):
+                return len(b)
+
+        with self.assertRaises(TypeError):
+            IncompleteStorage()
+        with self.assertRaises(TypeError):
+            IncompleteWriter()
+
+    def test_writer_discarded_on_error(self):
+        self.storage.upload("file", b"content")
+
+        with self.assertRaises(ValueError):
+            with self.storage.writer("file") as writer:
+                writer.write(b"partial")
+                raise ValueError()
+
+        self.assertEqual(self.read("file"), b"content")
+        self.assertEqual(os.listdir(self.storage.root), ["file"])
+
+    @override_settings(AWS_MULTIPART_CHUNKSIZE=1)
+    def test_s3_multipart_writer(self):
+        client = mock.Mock()
+        client.create_multipart_upload.return_value = {"UploadId": "upload"}
+        client.upload_part.side_effect = lambda **kwargs: {
+            "ETag": str(kwargs["PartNumber"])
+        }
+
+        with mock.patch("bothub.storage.MIN_PART_SIZE", 4):
+            with S3MultipartWriter(client, "bucket", "key") as writer:
+                writer.write(b"con")
+                client.upload_part.assert_not_called()
+                writer.write(b"tent")
+
+        self.assertEqual(
+            [call.kwargs["Body"] for call in client.upload_part.call_args_list],
+            [b"cont", b"ent"],
+        )
+        client.complete_multipart_upload.assert_called_once_with(
+            Bucket="bucket",
+            Key="key",
+            UploadId="upload",
+            MultipartUpload={
+                "Parts": [
+                    {"ETag": "1", "PartNumber": 1},
+                    {"ETag": "2", "PartNumber": 2},
+                ]
+            },
+        )
+        client.put_object.assert_not_called()
+
+    def test_s3_small_content_sent_at_once(self):
+        client = mock.Mock()
+
+        with S3MultipartWriter(client, "bucket", "key", "text/csv") as writer:
+            writer.write(b"content")
+
+        client.create_multipart_upload.assert_not_called()
+        client.put_object.assert_called_once_with(
+            Bucket="bucket", Key="key", Body=b"content", ContentType="text/csv"
+        )
+
+    def test_s3_multipart_aborted_on_error(self):
+        client = mock.Mock()
+        client.create_multipart_upload.return_value = {"UploadId": "upload"}
+        client.upload_part.return_value = {"ETag": "1"}
+
+        with mock.patch("bothub.storage.MIN_PART_SIZE", 4), override_settings(
+            AWS_MULTIPART_CHUNKSIZE=1
+        ):
+            with self.assertRaises(ValueError):
+                with S3MultipartWriter(client, "bucket", "key") as writer:
+                    writer.write(b"content")
+                    raise ValueError()
+
+        client.abort_multipart_upload.assert_called_once_with(
+            Bucket="bucket", Key="key", UploadId="upload"
+        )
+        client.complete_multipart_upload.assert_not_called()
+
+    @override_settings(
+        STORAGE_SERVICE="filesystem",
+        AWS_ACCESS_KEY_ID="key",
+        AWS_SECRET_ACCESS_KEY="secret",
+        AWS_BUCKET_NAME="bucket",
+    )
+    def test_send_bot_data_file(self):
+        url = send_bot_data_file_aws(1, b"model")
+        self.assertTrue(url.startswith("file://"))
+
+        with open(url[len("file://") :], "rb") as file:
+            self.assertEqual(file.read(), b"model")
+
+        # The root is a file, so the storage can't write under it
+        self.storage.upload("file", b"content")
+        with override_settings(STORAGE_SERVICE_ROOT=self.storage.path("file")):
+            self.assertEqual(send_bot_data_file_aws(1, b"model"), "")
+
+
+@override_settings(NLP_LOG_EXPORT_SCAN_SIZE=2)
+class ExportNLPLogsTestCase(TestCase):
+    def test_export_all_logs(self):
+        search = mock.Mock()
+        search.update_from_dict.return_value.params.return_value.scan.return_value = (
+            iter(["log"] * 5)
+        )
+
+        def export(logs, file_format, progress):
+            rows = 0
+            for rows, log in enumerate(logs, start=1):
+                progress(rows)
+            return {"file_name": f"logs.{file_format}", "rows": rows}
+
+        with mock.patch(
+            "bothub.common.tasks.RepositoryNLPLogDocument.search", return_value=search
+        ), mock.patch(
+            "bothub.common.tasks.ExportRepositoryLogUseCase.export", side_effect=export
+        ), mock.patch.object(
+            export_nlp_logs, "update_state"
+        ) as update_state:
+            result = export_nlp_logs.apply(
+                args=[{"query": {"match_all": {}}, "from": 0, "size": 10}, 1, "csv"]
+            ).get()
+
+        search.update_from_dict.assert_called_once_with({"query": {"match_all": {}}})
+        search.update_from_dict.return_value.params.assert_called_once_with(size=2)
+        self.assertEqual(result, {"user": 1, "file_name": "logs.csv", "rows": 5})
+        self.assertEqual(
+            [call.kwargs["meta"] for call in update_state.call_args_list],
+            [{"user": 1, "rows": 2}, {"user": 1, "rows": 4}],
+        )
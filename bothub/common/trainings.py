@@ -0,0 +1,161 @@
+import logging
+from concurrent import futures
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from bothub.common.models import RepositoryQueueTask
+
+logger = logging.getLogger(__name__)
+
+TASK_QUEUE_SERVICES = {
+    RepositoryQueueTask.QUEUE_AIPLATFORM: "ai-platform",
+    RepositoryQueueTask.QUEUE_CELERY: "celery",
+}
+
+# Running tasks older than this are considered failed
+TRAINING_TIMEOUT = timedelta(hours=2)
+
+_session = None
+
+
+def get_session():
+    """
+    requests session shared by the polls of the process, keeping up to
+    TRAININGS_CHECK_MAX_WORKERS connections to the NLP open
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=settings.TRAININGS_CHECK_MAX_WORKERS
+        )
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def fetch_status(task):
+    """
+    Returns {id_task: status} of ``task`` from the task-queue endpoint of the
+    NLP, empty when it couldn't be fetched
+    """
+    try:
+        response = get_session().get(
+            f"{settings.BOTHUB_NLP_BASE_URL}v2/task-queue/",
+            params={
+                "id_task": task.id_queue,
+                "from_queue": TASK_QUEUE_SERVICES.get(task.from_queue),
+            },
+            timeout=settings.TRAININGS_CHECK_TIMEOUT,
+        )
+        response.raise_for_status()
+        return {task.id_queue: response.json()}
+    except (requests.RequestException, ValueError) as e:
+        logger.warning(f"Could not check the task {task.id_queue}: {e}")
+        return {}
+
+
+def fetch_statuses(tasks):
+    """
+    Returns {id_task: status} of ``tasks`` from the batch task-queue endpoint
+    of the NLP, one request carries all of them:
+
+        POST v2/task-queue/batch/
+        {"tasks": [{"id_task": "...", "from_queue": "celery"}, ...]}
+        -> {"tasks": [{"id_task": "...", "status": 2, "ml_units": 0.5}, ...]}
+
+    Empty when they couldn't be fetched
+    """
+    try:
+        response = get_session().post(
+            f"{settings.BOTHUB_NLP_BASE_URL}v2/task-queue/batch/",
+            json={
+                "tasks": [
+                    {
+                        "id_task": task.id_queue,
+                        "from_queue": TASK_QUEUE_SERVICES.get(task.from_queue),
+                    }
+                    for task in tasks
+                ]
+            },
+            timeout=settings.TRAININGS_CHECK_TIMEOUT,
+        )
+        response.raise_for_status()
+        return {result.get("id_task"): result for result in response.json()["tasks"]}
+    except (requests.RequestException, ValueError, KeyError) as e:
+        logger.warning(f"Could not check {len(tasks)} tasks: {e}")
+        return {}
+
+
+def poll_statuses(tasks):
+    """
+    Fetches the status of ``tasks`` concurrently on up to
+    TRAININGS_CHECK_MAX_WORKERS requests, in batches of
+    TRAININGS_CHECK_BATCH_SIZE tasks or one request per task when it is 0
+    """
+    batch_size = settings.TRAININGS_CHECK_BATCH_SIZE
+    if batch_size:
+        fetch, requests_args = fetch_statuses, [
+            tasks[i : i + batch_size] for i in range(0, len(tasks), batch_size)
+        ]
+    else:
+        fetch, requests_args = fetch_status, tasks
+
+    statuses = {}
+    if not requests_args:
+        return statuses
+    with futures.ThreadPoolExecutor(
+        max_workers=min(settings.TRAININGS_CHECK_MAX_WORKERS, len(requests_args))
+    ) as executor:
+        for result in executor.map(fetch, requests_args):
+            statuses.update(result)
+    return statuses
+
+
+def check_trainings():
+    """
+    Updates the pending and processing queue tasks with their status in the
+    NLP, the tasks running for longer than TRAINING_TIMEOUT are failed.
+    Returns the number of updated tasks.
+    """
+    tasks = list(
+        RepositoryQueueTask.objects.filter(
+            Q(status=RepositoryQueueTask.STATUS_PENDING)
+            | Q(status=RepositoryQueueTask.STATUS_PROCESSING)
+        ).exclude(type_processing=RepositoryQueueTask.TYPE_PROCESSING_CLONE_VERSION)
+    )
+    statuses = poll_statuses(tasks)
+
+    now = timezone.now()
+    updated = []
+    for task in tasks:
+        result = statuses.get(task.id_queue)
+        if result is None:
+            continue
+
+        try:
+            status = int(result.get("status"))
+        except (TypeError, ValueError):
+            continue
+
+        if status != task.status:
+            task.status = status
+            if status == RepositoryQueueTask.STATUS_SUCCESS:
+                task.end_training = now
+            if result.get("ml_units") is not None:
+                task.ml_units = result.get("ml_units")
+            updated.append(task)
+        elif task.created_at + TRAINING_TIMEOUT <= now:
+            task.status = RepositoryQueueTask.STATUS_FAILED
+            task.end_training = now
+            updated.append(task)
+
+    RepositoryQueueTask.objects.bulk_update(
+        updated, ["status", "ml_units", "end_training"]
+    )
+    return len(updated)
@@ -1,72 +1,107 @@
+import csv
 import io
-
-from rest_framework import status
-from rest_framework.response import Response
+import uuid
 
 from openpyxl import Workbook
-from openpyxl.writer.excel import save_virtual_workbook
 
-from .storage import s3FileDatabase
+from bothub.storage import get_storage
+
+EXPORT_HEADERS = [
+    'Text',
+    'Created At',
+    'Intent',
+    'Confidence',
+    'Entities',
+    'Entities List',
+]
+
+# Rows of a xlsx sheet, the header included
+XLSX_MAX_ROWS = 1048576
+
+EXPORT_CONTENT_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+}
+
+# User that started each export task, only its exports can be polled
+EXPORT_TASK_CACHE_KEY = 'nlp_log_export:{}'
+
+
+def log_row(repository_log) -> list:
+    """Row of the export of ``repository_log``, in the EXPORT_HEADERS order"""
+    entities = repository_log.nlp_log.entities.to_dict()
+    entities_names = []
+    entities_list = []
+    for entity_type, type_entities in entities.items():
+        for entity in type_entities:
+            if entity['entity'] not in entities_names:
+                entities_names.append(entity['entity'])
+            entities_list.append(f"{entity['entity']}:{entity['value']}")
+
+    return [
+        repository_log.nlp_log.text,
+        repository_log.created_at,
+        repository_log.nlp_log.intent.name,
+        repository_log.nlp_log.intent.confidence,
+        ', '.join(entities_names),
+        ', '.join(entities_list),
+    ]
 
 
 class ExportRepositoryLogUseCase:
 
-    def _create_xlsx_workbook(
-            self,
-            repository_logs
-    ) -> Workbook:
-
-        wb = Workbook()
-        ws = wb.active
-
-        ws['A1'] = 'Text'
-        ws['B1'] = 'Created At'
-        ws['C1'] = 'Intent'
-        ws['D1'] = 'Confidence'
-        ws['E1'] = 'Entities'
-        ws['F1'] = 'Entities List'
-
-        if repository_logs is None:
-            return wb
-
-        row = 2
-        for repository_log in repository_logs:
-            entities = repository_log.nlp_log.entities.to_dict()
-            entities_list = []
-            for entity_type, entities in entities.items():
-                for entity in entities:
-                    entities_list.append(f"{entity['entity']}:{entity['value']}")
-            entities_str = ', '.join(entities_list)
-
-            ws['A{}'.format(row)] = repository_log.nlp_log.text
-            ws['B{}'.format(row)] = repository_log.created_at
-            ws['C{}'.format(row)] = repository_log.nlp_log.intent.name
-            ws['D{}'.format(row)] = repository_log.nlp_log.intent.confidence
-            ws['F{}'.format(row)] = entities_str
-            row += 1
-
-        return wb
-
-    def xlsx_storage(
-            self,
-            xlsx_file
-    ) -> str:
-        file_database = s3FileDatabase()
-        xlsx_file_object = io.BytesIO(xlsx_file)
-        created_file = file_database.add_file(xlsx_file_object)
-        temp_url = file_database.create_presigned_url(created_file.file_name)
-        return temp_url
-
-    def create_xlsx_response(
-            self,
-            repository_logs
-    ) -> Response:
-
-        wb = self._create_xlsx_workbook(repository_logs)
-        temp_url = self.xlsx_storage(save_virtual_workbook(wb))
-        response = Response(
-            data={"file": temp_url},
-            status=status.HTTP_200_OK
-        )
-
-        return response
+    def write_xlsx(self, repository_logs, file, progress=None) -> int:
+        """
+        Writes the logs to ``file`` with a write-only workbook, which keeps
+        the rows on disk instead of in memory, a new sheet is started every
+        XLSX_MAX_ROWS rows. Returns the number of logs written.
+        """
+        wb = Workbook(write_only=True)
+        ws = None
+        rows = 0
+        for rows, repository_log in enumerate(repository_logs, start=1):
+            if (rows - 1) % (XLSX_MAX_ROWS - 1) == 0:
+                ws = wb.create_sheet()
+                ws.append(EXPORT_HEADERS)
+
+            row = log_row(repository_log)
+            # Excel does not support timezones
+            if getattr(row[1], 'tzinfo', None) is not None:
+                row[1] = row[1].replace(tzinfo=None)
+            ws.append(row)
+            if progress:
+                progress(rows)
+
+        if ws is None:
+            wb.create_sheet().append(EXPORT_HEADERS)
+        wb.save(file)
+        return rows
+
+    def write_csv(self, repository_logs, file, progress=None) -> int:
+        """Writes the logs to ``file`` as CSV, returns the number written"""
+        text_file = io.TextIOWrapper(file, encoding='utf-8', newline='')
+        writer = csv.writer(text_file)
+        writer.writerow(EXPORT_HEADERS)
+        rows = 0
+        for rows, repository_log in enumerate(repository_logs, start=1):
+            writer.writerow(log_row(repository_log))
+            if progress:
+                progress(rows)
+        text_file.flush()
+        text_file.detach()
+        return rows
+
+    def export(self, repository_logs, file_format='xlsx', progress=None) -> dict:
+        """
+        Writes the logs (any iterable, consumed once) to the storage as they
+        are read, sent in multipart parts, so exports of any size run in
+        constant memory. ``progress`` is called with the number of logs
+        written so far. Returns the file_name and the number of rows.
+        """
+        write = {'xlsx': self.write_xlsx, 'csv': self.write_csv}[file_format]
+        file_name = f'export_logs-{uuid.uuid4()}.{file_format}'
+        with get_storage().writer(
+            file_name, EXPORT_CONTENT_TYPES[file_format]
+        ) as file:
+            rows = write(repository_logs, file, progress)
+        return {'file_name': file_name, 'rows': rows}
@@ -1,60 +1,102 @@
+import csv
+import io
+import tempfile
 import unittest
-from unittest.mock import Mock
-from django.http import HttpResponse
-from openpyxl import Workbook
-from ..export import ExportRepositoryLogUseCase
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
+from django.test import override_settings
+from openpyxl import load_workbook
+from bothub.storage import get_storage
+from ..export import EXPORT_HEADERS, ExportRepositoryLogUseCase
 
 
-class TestExportRepositoryLogUseCase(unittest.TestCase):
+def repository_log(text):
+    log = Mock(
+        nlp_log=Mock(
+            text=text,
+            intent=Mock(confidence=0.9),
+            entities=Mock(),
+        ),
+        created_at=datetime(2023, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+    )
+    log.nlp_log.intent.name = 'greet'
+    log.nlp_log.entities.to_dict.return_value = {
+        'other': [
+            {'entity': 'name', 'value': 'john'},
+            {'entity': 'name', 'value': 'doe'},
+            {'entity': 'city', 'value': 'recife'},
+        ]
+    }
+    return log
+
+
+class TestStreamingExportRepositoryLogUseCase(unittest.TestCase):
 
     def setUp(self):
         self.use_case = ExportRepositoryLogUseCase()
-        self.mock_repository_logs = [
-            Mock(
-                nlp_log=Mock(
-                    text='text',
-                    intent=Mock(
-                        name='intent',
-                        confidence='confidence'
-                    ),
-                    entities='entities'
-                ), created_at='created_at'
-            )
-        ]
-        for log in self.mock_repository_logs:
-            log.nlp_log.intent.name = 'intent_name'
+        self.logs = [repository_log('hi'), repository_log('hello')]
 
-    def test_create_xlsx_workbook(self):
-        # Chama a função _create_xlsx_workbook
-        result = self.use_case._create_xlsx_workbook(self.mock_repository_logs)
-        self.assertIsInstance(result, Workbook)
-
-    def test_create_xlsx_response(self):
-        result = self.use_case.create_xlsx_response(self.mock_repository_logs)
-        self.assertIsInstance(result, HttpResponse)
-        self.assertEqual(
-            result['Content-Type'],
-            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        self.assertEqual(
-            result['Content-Disposition'],
-            'attachment; filename=repository_logs.xlsx'
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            STORAGE_SERVICE='filesystem', STORAGE_SERVICE_ROOT=directory.name
         )
+        settings.enable()
+        self.addCleanup(settings.disable)
 
-    def test_create_xlsx_workbook_with_none(self):
+    def read(self, file_name):
+        with get_storage().open(file_name) as file:
+            return file.read()
 
-        result = self.use_case._create_xlsx_workbook(None)
-        self.assertIsInstance(result, Workbook)
+    def test_export_xlsx(self):
+        progress = Mock()
+        export = self.use_case.export(iter(self.logs), 'xlsx', progress)
 
-    def test_create_xlsx_response_with_none(self):
+        self.assertEqual(export['rows'], 2)
+        self.assertTrue(export['file_name'].endswith('.xlsx'))
+        self.assertEqual(progress.call_count, 2)
 
-        result = self.use_case.create_xlsx_response(None)
-        self.assertIsInstance(result, HttpResponse)
+        ws = load_workbook(io.BytesIO(self.read(export['file_name']))).active
+        rows = list(ws.values)
+        self.assertEqual(list(rows[0]), EXPORT_HEADERS)
         self.assertEqual(
-            result['Content-Type'],
-            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            list(rows[1]),
+            [
+                'hi',
+                datetime(2023, 1, 2, 3, 4, 5),
+                'greet',
+                0.9,
+                'name, city',
+                'name:john, name:doe, city:recife',
+            ],
         )
+        self.assertEqual(len(rows), 3)
+
+    def test_export_xlsx_sheets(self):
+        file = io.BytesIO()
+        with patch(
+            'bothub.common.usecase.repositorylog.export.XLSX_MAX_ROWS', 2
+        ):
+            self.use_case.write_xlsx(iter(self.logs), file)
+
+        wb = load_workbook(file)
         self.assertEqual(
-            result['Content-Disposition'],
-            'attachment; filename=repository_logs.xlsx'
+            [[row[0] for row in ws.values] for ws in wb.worksheets],
+            [['Text', 'hi'], ['Text', 'hello']],
         )
+
+    def test_export_csv(self):
+        export = self.use_case.export(iter(self.logs), 'csv')
+
+        self.assertEqual(export['rows'], 2)
+        rows = list(csv.reader(io.StringIO(self.read(export['file_name']).decode())))
+        self.assertEqual(rows[0], EXPORT_HEADERS)
+        self.assertEqual([row[0] for row in rows[1:]], ['hi', 'hello'])
+        self.assertEqual(rows[1][4], 'name, city')
+
+    def test_export_without_logs(self):
+        export = self.use_case.export(iter([]), 'xlsx')
+
+        self.assertEqual(export['rows'], 0)
+        ws = load_workbook(io.BytesIO(self.read(export['file_name']))).active
+        self.assertEqual([list(row) for row in ws.values], [EXPORT_HEADERS])
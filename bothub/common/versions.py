@@ -0,0 +1,153 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from bothub.common.models import RepositoryVersion, RepositoryVersionLanguage
+
+logger = logging.getLogger(__name__)
+
+# {"<version>:<language>": version language id} of each repository, the
+# version is "default" (or "other") for the current version of the repository
+VERSION_LANGUAGES_CACHE_KEY = "version_languages:{}"
+
+
+def _cache_get(key):
+    try:
+        return cache.get(key)
+    except Exception as e:  # pragma: no cover
+        logger.warning(f"Could not read the version languages cache: {e}")
+        return None
+
+
+def _cache_set(key, value):
+    try:
+        cache.set(key, value, settings.VERSION_LANGUAGES_CACHE_TIMEOUT)
+    except Exception as e:  # pragma: no cover
+        logger.warning(f"Could not write the version languages cache: {e}")
+
+
+def _cache_delete(key):
+    try:
+        cache.delete(key)
+    except Exception as e:  # pragma: no cover
+        logger.warning(f"Could not invalidate the version languages cache: {e}")
+
+
+def _resolve_current(repository, language, is_default):
+    version = (
+        repository.versions.filter(is_default=is_default)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if version is None:
+        version = repository.versions.create(
+            is_default=is_default, created_by=repository.owner
+        ).pk
+
+    version_language = (
+        RepositoryVersionLanguage.objects.filter(
+            repository_version=version, language=language
+        )
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if version_language is None:
+        version_language, created = RepositoryVersionLanguage.objects.get_or_create(
+            repository_version_id=version, language=language
+        )
+        version_language = version_language.pk
+    return version_language
+
+
+def _resolve_specific(repository, repository_version, language):
+    query = RepositoryVersionLanguage.objects.filter(
+        repository_version__repository=repository,
+        repository_version__pk=repository_version,
+    )
+    if language:
+        query = query.filter(language=language)
+
+    version_language = query.values_list("pk", flat=True).first()
+    if version_language is None:
+        version_language, created = RepositoryVersionLanguage.objects.get_or_create(
+            repository_version=RepositoryVersion.objects.get(pk=repository_version),
+            language=language,
+        )
+        version_language = version_language.pk
+    return version_language
+
+
+def get_version_language_id(
+    repository, language, repository_version=None, is_default=True
+):
+    """
+    Id of the version language of ``repository`` in ``language``, of the
+    version ``repository_version`` or of the current (default) one when not
+    given. The ids are read first and only created when missing, the
+    resolved ones are cached per repository until one of its versions is
+    created, changed or deleted.
+    """
+    key = VERSION_LANGUAGES_CACHE_KEY.format(repository.pk)
+    version = repository_version or ("default" if is_default else "other")
+    field = f"{version}:{language}"
+
+    version_languages = _cache_get(key) or {}
+    version_language = version_languages.get(field)
+    if version_language is None:
+        if repository_version:
+            version_language = _resolve_specific(
+                repository, repository_version, language
+            )
+        else:
+            version_language = _resolve_current(repository, language, is_default)
+        version_languages[field] = version_language
+        _cache_set(key, version_languages)
+    return version_language
+
+
+def _matches(version_language, repository, language, repository_version, is_default):
+    version = version_language.repository_version
+    if version.repository_id != repository.pk:
+        return False
+    if language and version_language.language != language:
+        return False
+    if repository_version:
+        return str(version.pk) == str(repository_version)
+    return version.is_default == is_default
+
+
+def get_version_language(
+    repository, language, repository_version=None, is_default=True
+):
+    """
+    Version language resolved by get_version_language_id, with its version,
+    in a single query on a warm cache. Its repository is ``repository``
+    itself, as with the related managers.
+    """
+    queryset = RepositoryVersionLanguage.objects.select_related("repository_version")
+    version_language = queryset.filter(
+        pk=get_version_language_id(repository, language, repository_version, is_default)
+    ).first()
+    if version_language is None or not _matches(
+        version_language, repository, language, repository_version, is_default
+    ):
+        # Changed without going through the signals, resolve it again
+        invalidate_version_languages(repository.pk)
+        version_language = queryset.get(
+            pk=get_version_language_id(
+                repository, language, repository_version, is_default
+            )
+        )
+    version_language.repository_version.repository = repository
+    return version_language
+
+
+def invalidate_version_languages(repository_id):
+    key = VERSION_LANGUAGES_CACHE_KEY.format(repository_id)
+    _cache_delete(key)
+    # A request running concurrently with the transaction could cache the old
+    # versions again before the change is committed, so drop them once more.
+    transaction.on_commit(lambda: _cache_delete(key))
@@ -1,14 +1,27 @@
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.core.exceptions import ValidationError
 from django.contrib.admin.views.decorators import staff_member_required
 
+from bothub.common.artifacts import get_artifact_store
 from bothub.common.models import RepositoryNLPTrain
 
 
 @staff_member_required
 def download_bot_data(self, update_id):  # pragma: no cover
     update = get_object_or_404(RepositoryNLPTrain, pk=update_id)
+    store = get_artifact_store()
+    if update.bot_data_sha256 and store:
+        url = store.url(update.bot_data_sha256)
+        if url:
+            return HttpResponseRedirect(url)
+        response = StreamingHttpResponse(
+            store.iter_chunks(update.bot_data_sha256), content_type="application/gzip"
+        )
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="{update.bot_data_sha256}.tar.gz"'
+        return response
     if update.bot_data is None or update.bot_data == "":
         raise ValidationError(f"Update #{update.pk} not trained at.")
     response = HttpResponseRedirect(
@@ -40,6 +40,9 @@ env = environ.Env(
     SEND_EMAILS=(bool, True),
     BOTHUB_WEBAPP_BASE_URL=(str, "http://localhost:8080/"),
     BOTHUB_NLP_BASE_URL=(str, "http://localhost:2657/"),
+    TRAININGS_CHECK_TIMEOUT=(int, 10),
+    TRAININGS_CHECK_MAX_WORKERS=(int, 10),
+    TRAININGS_CHECK_BATCH_SIZE=(int, 0),
     CSRF_COOKIE_DOMAIN=(cast_empty_str_to_none, None),
     CSRF_COOKIE_SECURE=(bool, False),
     SUPPORTED_LANGUAGES=(cast_supported_languages, "en|pt"),
@@ -50,6 +53,16 @@ env = environ.Env(
     BOTHUB_ENGINE_AWS_S3_BUCKET_NAME=(str, ""),
     BOTHUB_ENGINE_AWS_REGION_NAME=(str, "us-east-1"),
     BOTHUB_ENGINE_AWS_SEND=(bool, False),
+    BOTHUB_ENGINE_AWS_MAX_POOL_CONNECTIONS=(int, 10),
+    BOTHUB_ENGINE_AWS_MULTIPART_THRESHOLD=(int, 8388608),
+    BOTHUB_ENGINE_AWS_MULTIPART_CHUNKSIZE=(int, 8388608),
+    STORAGE_SERVICE=(str, "s3"),
+    STORAGE_SERVICE_ROOT=(str, "storage"),
+    MODEL_ARTIFACTS_STORAGE=(str, ""),
+    MODEL_ARTIFACTS_ROOT=(str, "artifacts"),
+    MODEL_ARTIFACTS_PREFIX=(str, "bot_data"),
+    MODEL_ARTIFACTS_CHUNK_SIZE=(int, 1048576),
+    MODEL_ARTIFACTS_URL_EXPIRATION=(int, 3600),
     BASE_URL=(str, "http://api.bothub.it"),
     BOTHUB_BOT_EMAIL=(str, "bot_repository@bothub.it"),
     BOTHUB_BOT_NAME=(str, "Bot Repository"),
@@ -60,10 +73,21 @@ env = environ.Env(
     CELERY_BROKER_URL=(str, "redis://localhost:6379/0"),
     TOKEN_SEARCH_REPOSITORIES=(str, None),
     GOOGLE_API_TRANSLATION_KEY=(str, None),
+    TRANSLATION_BATCH_SIZE=(int, 100),
+    TRANSLATION_MAX_WORKERS=(int, 4),
+    TRANSLATION_CACHE_TIMEOUT=(int, 2592000),
     N_WORDS_TO_GENERATE=(int, 4),
     SUGGESTION_LANGUAGES=(cast_supported_languages, "en|pt_br"),
     N_SENTENCES_TO_GENERATE=(int, 10),
     REDIS_TIMEOUT=(int, 3600),
+    QUERY_PROFILER=(bool, False),
+    QUERY_PROFILER_REPORT=(str, ""),
+    NLP_AUTHORIZATION_CACHE_TIMEOUT=(int, 3600),
+    NLP_AUTHORIZATION_LOCAL_CACHE_TIMEOUT=(int, 10),
+    NLP_AUTHORIZATION_LOCAL_CACHE_SIZE=(int, 4096),
+    VERSION_LANGUAGES_CACHE_TIMEOUT=(int, 3600),
+    USER_AUTHORIZATION_CACHE_TIMEOUT=(int, 3600),
+    INTERPRETERS_CHANGED_MARGIN=(int, 60),
     APM_DISABLE_SEND=(bool, False),
     APM_SERVICE_DEBUG=(bool, False),
     APM_SERVICE_NAME=(str, ""),
@@ -79,6 +103,14 @@ env = environ.Env(
     CONNECT_API_URL=(str, ""),
     REPOSITORY_RESTRICT_ACCESS_NLP_LOGS=(list, []),
     REPOSITORY_BLOCK_USER_LOGS=(list, []),
+    NLP_LOG_BATCH_MAX_SIZE=(int, 500),
+    NLP_LOG_RETENTION_DAYS=(int, 90),
+    NLP_LOG_DELETE_CHUNK_SIZE=(int, 5000),
+    NLP_LOG_DELETE_SLEEP=(float, 0.1),
+    NLP_LOG_PARTITIONED=(bool, False),
+    EXAMPLES_IMPORT_BATCH_SIZE=(int, 1000),
+    REPOSITORY_REPORTS_BUFFER=(bool, False),
+    REPOSITORY_REPORTS_FLUSH_INTERVAL=(int, 60),
     REPOSITORY_KNOWLEDGE_BASE_DESCRIPTION_LIMIT=(int, 450),
     REPOSITORY_EXAMPLE_TEXT_WORDS_LIMIT=(int, 200),
     ELASTICSEARCH_DSL=(str, "localhost:9200"),
@@ -86,6 +118,8 @@ env = environ.Env(
     ELASTICSEARCH_EXAMPLES=(bool, False),
     USE_ELASTICSEARCH=(bool, True),
     ELASTICSEARCH_CUSTOM_QUEUE=(str, "celery"),
+    ELASTICSEARCH_BULK_CHUNK_SIZE=(int, 500),
+    ELASTICSEARCH_PARALLEL_BULK=(bool, False),
     ELASTICSEARCH_REPOSITORYQANLPLOG_INDEX=(str, "ai_repository_qa_nlplog"),
     ELASTICSEARCH_REPOSITORYBASICEXAMPLE_INDEX=(str, "ai_repositorybasicexample"),
     ELASTICSEARCH_ZEROSHOT_INDEX=(str, "ai_zeroshot_log"),
@@ -193,6 +227,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "bothub.api.v2.middleware.UserLanguageMiddleware",
+    "bothub.api.v2.middleware.UserAuthorizationsMemoMiddleware",
+    "bothub.api.v2.middleware.QueryProfilerMiddleware",
 ]
 
 ROOT_URLCONF = "bothub.urls"
@@ -297,6 +333,16 @@ REST_FRAMEWORK = {
 
 REPOSITORY_NLP_LOG_LIMIT = env.int("REPOSITORY_NLP_LOG_LIMIT", default=10000)
 
+# Logs fetched per page by the exports, which scroll over all the logs
+NLP_LOG_EXPORT_SCAN_SIZE = env.int("NLP_LOG_EXPORT_SCAN_SIZE", default=1000)
+
+# Seconds the status of a log export can be polled after it is started
+NLP_LOG_EXPORT_TIMEOUT = env.int("NLP_LOG_EXPORT_TIMEOUT", default=86400)
+
+# Profile the queries of each request, see bothub.api.v2.middleware.QueryProfilerMiddleware
+QUERY_PROFILER = env.bool("QUERY_PROFILER")
+QUERY_PROFILER_REPORT = env.str("QUERY_PROFILER_REPORT")
+
 # cors headers
 
 CORS_ORIGIN_ALLOW_ALL = True
@@ -336,6 +382,12 @@ CONNECT_WEBAPP_BASE_URL = env.str("CONNECT_WEBAPP_BASE_URL")
 
 BOTHUB_NLP_BASE_URL = env.str("BOTHUB_NLP_BASE_URL")
 
+# Polling of the queue tasks status in the NLP, request timeout in seconds,
+# concurrent requests and tasks per request to the batch endpoint (0 disables it)
+TRAININGS_CHECK_TIMEOUT = env.int("TRAININGS_CHECK_TIMEOUT")
+TRAININGS_CHECK_MAX_WORKERS = env.int("TRAININGS_CHECK_MAX_WORKERS")
+TRAININGS_CHECK_BATCH_SIZE = env.int("TRAININGS_CHECK_BATCH_SIZE")
+
 
 # CSRF
 
@@ -458,6 +510,23 @@ AWS_ACCESS_KEY_ID = env.str("BOTHUB_ENGINE_AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = env.str("BOTHUB_ENGINE_AWS_SECRET_ACCESS_KEY")
 AWS_BUCKET_NAME = env.str("BOTHUB_ENGINE_AWS_S3_BUCKET_NAME")
 AWS_REGION_NAME = env.str("BOTHUB_ENGINE_AWS_REGION_NAME")
+# Connections kept open by the S3 client shared by the threads of a process
+AWS_MAX_POOL_CONNECTIONS = env.int("BOTHUB_ENGINE_AWS_MAX_POOL_CONNECTIONS")
+# Uploads larger than the threshold (in bytes) are sent in parts of chunksize
+AWS_MULTIPART_THRESHOLD = env.int("BOTHUB_ENGINE_AWS_MULTIPART_THRESHOLD")
+AWS_MULTIPART_CHUNKSIZE = env.int("BOTHUB_ENGINE_AWS_MULTIPART_CHUNKSIZE")
+# Where bothub.storage keeps the files, "s3" (in BOTHUB_ENGINE_AWS_S3_BUCKET_NAME)
+# or "filesystem" (under STORAGE_SERVICE_ROOT) as a stand-in in the tests
+STORAGE_SERVICE = env.str("STORAGE_SERVICE")
+STORAGE_SERVICE_ROOT = env.str("STORAGE_SERVICE_ROOT")
+
+# Content-addressed store of the trained models, "s3" or "filesystem" (under
+# MODEL_ARTIFACTS_ROOT), disabled when empty
+MODEL_ARTIFACTS_STORAGE = env.str("MODEL_ARTIFACTS_STORAGE")
+MODEL_ARTIFACTS_ROOT = env.str("MODEL_ARTIFACTS_ROOT")
+MODEL_ARTIFACTS_PREFIX = env.str("MODEL_ARTIFACTS_PREFIX")
+MODEL_ARTIFACTS_CHUNK_SIZE = env.int("MODEL_ARTIFACTS_CHUNK_SIZE")
+MODEL_ARTIFACTS_URL_EXPIRATION = env.int("MODEL_ARTIFACTS_URL_EXPIRATION")
 
 
 # Account System for bots deleted
@@ -501,6 +570,12 @@ TOKEN_SEARCH_REPOSITORIES = env.str("TOKEN_SEARCH_REPOSITORIES")
 # Google API Translation KEY
 GOOGLE_API_TRANSLATION_KEY = env.str("GOOGLE_API_TRANSLATION_KEY")
 
+# Machine translation requests, texts per request and concurrent requests,
+# the translations are cached by text for TRANSLATION_CACHE_TIMEOUT seconds
+TRANSLATION_BATCH_SIZE = env.int("TRANSLATION_BATCH_SIZE")
+TRANSLATION_MAX_WORKERS = env.int("TRANSLATION_MAX_WORKERS")
+TRANSLATION_CACHE_TIMEOUT = env.int("TRANSLATION_CACHE_TIMEOUT")
+
 
 BASE_MIGRATIONS_TYPES = ["bothub.common.migrate_classifiers.wit.WitType"]
 
@@ -543,6 +618,21 @@ CACHES = {
 # Set Redis timeout
 REDIS_TIMEOUT = env.int("REDIS_TIMEOUT")
 
+# NLP authorization (token) cache, the local one is kept per process
+NLP_AUTHORIZATION_CACHE_TIMEOUT = env.int("NLP_AUTHORIZATION_CACHE_TIMEOUT")
+NLP_AUTHORIZATION_LOCAL_CACHE_TIMEOUT = env.int("NLP_AUTHORIZATION_LOCAL_CACHE_TIMEOUT")
+NLP_AUTHORIZATION_LOCAL_CACHE_SIZE = env.int("NLP_AUTHORIZATION_LOCAL_CACHE_SIZE")
+
+# Cache of the version language resolved for each repository, version and language
+VERSION_LANGUAGES_CACHE_TIMEOUT = env.int("VERSION_LANGUAGES_CACHE_TIMEOUT")
+
+# Cache of the effective role of each user in each repository
+USER_AUTHORIZATION_CACHE_TIMEOUT = env.int("USER_AUTHORIZATION_CACHE_TIMEOUT")
+
+# Seconds the cursor of the changed interpreters is moved back, so trainings
+# committed after their training_end_at are still seen by the next call
+INTERPRETERS_CHANGED_MARGIN = env.int("INTERPRETERS_CHANGED_MARGIN")
+
 # Elastic Observability APM
 ELASTIC_APM = {
     "DISABLE_SEND": env.bool("APM_DISABLE_SEND"),
@@ -612,6 +702,8 @@ ELASTICSEARCH_DSL = {
 ELASTICSEARCH_EXAMPLES = env.bool("ELASTICSEARCH_EXAMPLES", default=False)
 USE_ELASTICSEARCH = env.bool("USE_ELASTICSEARCH", default=True)
 ELASTICSEARCH_CUSTOM_QUEUE = env("ELASTICSEARCH_CUSTOM_QUEUE", default="celery")
+ELASTICSEARCH_BULK_CHUNK_SIZE = env.int("ELASTICSEARCH_BULK_CHUNK_SIZE")
+ELASTICSEARCH_PARALLEL_BULK = env.bool("ELASTICSEARCH_PARALLEL_BULK")
 
 ELASTICSEARCH_DSL_INDEX_SETTINGS = {
     "number_of_shards": env.int("ELASTICSEARCH_NUMBER_OF_SHARDS", default=1),
@@ -665,6 +757,21 @@ ELASTICSEARCH_DSL_SIGNAL_PROCESSOR = ELASTICSEARCH_SIGNAL_PROCESSOR_CLASSES[
 
 REPOSITORY_BLOCK_USER_LOGS = env.list("REPOSITORY_BLOCK_USER_LOGS", default=[])
 
+NLP_LOG_BATCH_MAX_SIZE = env.int("NLP_LOG_BATCH_MAX_SIZE")
+
+# Retention of the NLP logs, deleted in chunks by the delete_nlp_logs task
+NLP_LOG_RETENTION_DAYS = env.int("NLP_LOG_RETENTION_DAYS")
+NLP_LOG_DELETE_CHUNK_SIZE = env.int("NLP_LOG_DELETE_CHUNK_SIZE")
+NLP_LOG_DELETE_SLEEP = env.float("NLP_LOG_DELETE_SLEEP")
+NLP_LOG_PARTITIONED = env.bool("NLP_LOG_PARTITIONED")
+
+# Number of examples validated and written together by the examples upload
+EXAMPLES_IMPORT_BATCH_SIZE = env.int("EXAMPLES_IMPORT_BATCH_SIZE")
+
+# Buffer the daily reports counters in Redis, flushed to the database by celery beat
+REPOSITORY_REPORTS_BUFFER = env.bool("REPOSITORY_REPORTS_BUFFER")
+REPOSITORY_REPORTS_FLUSH_INTERVAL = env.int("REPOSITORY_REPORTS_FLUSH_INTERVAL")
+
 TEST_REPOSITORY_ID = env("TEST_REPOSITORY_ID", default=None)
 
 USE_CONNECT_V2 = env.bool("USE_CONNECT_V2")
@@ -0,0 +1,352 @@
+import abc
+import io
+import os
+import shutil
+import tempfile
+import threading
+from typing import Optional
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from django.conf import settings
+
+# S3 only accepts parts of 5 MB, but the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+# Instance of each storage, created on the first use in the process
+_storages = {}
+
+
+def get_s3_client():
+    """
+    S3 client shared by the threads of the process (the boto3 clients are
+    thread-safe), keeping up to AWS_MAX_POOL_CONNECTIONS connections open
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = boto3.client(
+                    "s3",
+                    endpoint_url=settings.AWS_ACCESS_ENDPOINT_URL,
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_REGION_NAME,
+                    config=Config(
+                        max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS
+                    ),
+                )
+    return _s3_client
+
+
+def get_s3_transfer_config():
+    """Uploads larger than AWS_MULTIPART_THRESHOLD are sent in parts"""
+    return TransferConfig(
+        multipart_threshold=settings.AWS_MULTIPART_THRESHOLD,
+        multipart_chunksize=settings.AWS_MULTIPART_CHUNKSIZE,
+    )
+
+
+class IteratorReader(io.RawIOBase):
+    """Readable file-like object over an iterator of bytes"""
+
+    def __init__(self, iterator):
+        self.iterator = iter(iterator)
+        self.buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.buffer:
+            try:
+                self.buffer = next(self.iterator)
+            except StopIteration:
+                return 0
+        size = min(len(b), len(self.buffer))
+        b[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+def as_file(data):
+    """``data`` (bytes, a file-like object or an iterator of bytes) as a file"""
+    if isinstance(data, (bytes, bytearray)):
+        return io.BytesIO(data)
+    if hasattr(data, "read"):
+        return data
+    return io.BufferedReader(IteratorReader(data))
+
+
+class StorageWriter(io.RawIOBase, abc.ABC):
+    """
+    Writer of a storage, its content is stored by ``commit`` (on the exit of
+    its ``with`` block) and discarded if closed without it
+    """
+
+    committed = False
+
+    def __new__(cls, *args, **kwargs):
+        # The io classes are built without checking the abstract methods
+        if cls.__abstractmethods__:
+            raise TypeError(
+                "Can't instantiate abstract class {} with abstract methods {}".format(
+                    cls.__name__, ", ".join(sorted(cls.__abstractmethods__))
+                )
+            )
+        return super().__new__(cls)
+
+    def writable(self):
+        return True
+
+    @abc.abstractmethod
+    def write(self, b):
+        pass
+
+    @abc.abstractmethod
+    def commit(self):
+        pass
+
+    @abc.abstractmethod
+    def abort(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+            self.committed = True
+        self.close()
+
+    def close(self):
+        if not self.closed and not self.committed:
+            self.abort()
+        super().close()
+
+
+class Storage(abc.ABC):
+    """
+    Files of the application (trained models, exports...) by key, written
+    as streams so they are never fully held in memory
+    """
+
+    @abc.abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    def upload(self, key: str, data, content_type: Optional[str] = None):
+        """
+        Stores ``data``, bytes, a file-like object or an iterator of bytes,
+        read in chunks
+        """
+        with self.writer(key, content_type) as writer:
+            shutil.copyfileobj(as_file(data), writer, settings.AWS_MULTIPART_CHUNKSIZE)
+
+    @abc.abstractmethod
+    def writer(self, key: str, content_type: Optional[str] = None) -> StorageWriter:
+        """
+        Binary file-like object to write the content of ``key`` to, stored
+        on the exit of its ``with`` block and discarded on an exception:
+
+            with storage.writer(key) as file:
+                file.write(chunk)
+        """
+
+    @abc.abstractmethod
+    def open(self, key: str):
+        """Returns a file-like object with the content of ``key``"""
+
+    def size(self, key: str) -> Optional[int]:
+        return None
+
+    @abc.abstractmethod
+    def object_url(self, key: str) -> str:
+        """Permanent URL of ``key``"""
+
+    def url(self, key: str, expiration: int = 3600) -> str:
+        """Temporary URL to download ``key`` directly"""
+        return self.object_url(key)
+
+
+class FileSystemStorage(Storage):
+    """Stores the files under the STORAGE_SERVICE_ROOT directory, for tests"""
+
+    @property
+    def root(self) -> str:
+        return settings.STORAGE_SERVICE_ROOT
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def writer(self, key, content_type=None):
+        return FileSystemWriter(self.path(key))
+
+    def open(self, key):
+        return open(self.path(key), "rb")
+
+    def size(self, key):
+        return os.path.getsize(self.path(key))
+
+    def object_url(self, key):
+        return f"file://{os.path.abspath(self.path(key))}"
+
+
+class FileSystemWriter(StorageWriter):
+    """Written aside and moved, so readers never see a partial file"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False)
+
+    def write(self, b):
+        return self.file.write(b)
+
+    def commit(self):
+        self.file.close()
+        os.replace(self.file.name, self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.file.name)
+
+
+class S3Storage(Storage):
+    """
+    Stores the files in the BOTHUB_ENGINE_AWS_S3_BUCKET_NAME bucket with the
+    shared client, multipart from AWS_MULTIPART_THRESHOLD bytes
+    """
+
+    def __init__(self, bucket: Optional[str] = None):
+        self.bucket = bucket or settings.AWS_BUCKET_NAME
+
+    @property
+    def client(self):
+        return get_s3_client()
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ["404", "NoSuchKey"]:
+                return False
+            raise
+        return True
+
+    def upload(self, key, data, content_type=None):
+        if isinstance(data, (bytes, bytearray)) or hasattr(data, "read"):
+            # boto3 already reads the file-like objects in parts
+            self.client.upload_fileobj(
+                as_file(data),
+                self.bucket,
+                key,
+                ExtraArgs={"ContentType": content_type} if content_type else None,
+                Config=get_s3_transfer_config(),
+            )
+        else:
+            super().upload(key, data, content_type)
+
+    def writer(self, key, content_type=None):
+        return S3MultipartWriter(self.client, self.bucket, key, content_type)
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+
+    def size(self, key):
+        return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+
+    def object_url(self, key):
+        return "{}/{}/{}".format(self.client.meta.endpoint_url, self.bucket, key)
+
+    def url(self, key, expiration=3600):
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=expiration,
+        )
+
+
+class S3MultipartWriter(StorageWriter):
+    """
+    Sends what is written in parts of AWS_MULTIPART_CHUNKSIZE bytes as they
+    are filled, the content smaller than a part is sent at once on close
+    """
+
+    def __init__(self, client, bucket, key, content_type=None):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.extra_args = {"ContentType": content_type} if content_type else {}
+        self.part_size = max(settings.AWS_MULTIPART_CHUNKSIZE, MIN_PART_SIZE)
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.parts = []
+
+    def write(self, b):
+        self.buffer += b
+        while len(self.buffer) >= self.part_size:
+            self.upload_part(bytes(self.buffer[: self.part_size]))
+            del self.buffer[: self.part_size]
+        return len(b)
+
+    def upload_part(self, body):
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, **self.extra_args
+            )["UploadId"]
+        part_number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    def commit(self):
+        if self.upload_id is None:
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=bytes(self.buffer),
+                **self.extra_args,
+            )
+        else:
+            if self.buffer:
+                self.upload_part(bytes(self.buffer))
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+        self.buffer = bytearray()
+
+    def abort(self):
+        if self.upload_id is not None:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+            )
+        self.buffer = bytearray()
+
+
+STORAGE_SERVICE_CLASSES = {
+    "s3": S3Storage,
+    "filesystem": FileSystemStorage,
+}
+
+
+def get_storage() -> Storage:
+    """The STORAGE_SERVICE storage of the process"""
+    storage = settings.STORAGE_SERVICE
+    if storage not in _storages:
+        _storages[storage] = STORAGE_SERVICE_CLASSES[storage]()
+    return _storages[storage]
@@ -1,6 +1,16 @@
+import hashlib
+import logging
+import threading
 import time
+from concurrent import futures
+
 import requests
 from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_CACHE_KEY = "translation:{}:{}:{}"
 
 # enforce quotas (https://cloud.google.com/translate/quotas) (very naive implementation)
 
@@ -8,15 +18,90 @@ quota_char = 0
 quota_limit = 100000
 quota_wait = 100
 
+# Shared by the translation workers, held while waiting so all of them wait
+quota_lock = threading.Lock()
+quota_resumed_at = 0.0
+
 
 def translate(text, source_lang, target_language):
-    global quota_char
+    return translate_texts([text], source_lang, target_language)[0]
+
+
+def _cache_key(text, source_lang, target_language):
+    digest = hashlib.sha1(text.encode()).hexdigest()
+    return TRANSLATION_CACHE_KEY.format(source_lang, target_language, digest)
+
+
+def _cache_get_many(keys):
+    try:
+        return cache.get_many(keys)
+    except Exception as e:  # pragma: no cover
+        logger.warning(f"Could not read the translations cache: {e}")
+        return {}
+
+
+def _cache_set_many(values):
+    try:
+        cache.set_many(values, settings.TRANSLATION_CACHE_TIMEOUT)
+    except Exception as e:  # pragma: no cover
+        logger.warning(f"Could not write the translations cache: {e}")
+
+
+def translate_texts(texts, source_lang, target_language):
+    """
+    Returns the translations of ``texts``, in the same order. Each distinct
+    text is translated once and kept in the cache, the missing ones are sent
+    in batches of TRANSLATION_BATCH_SIZE texts on up to TRANSLATION_MAX_WORKERS
+    concurrent requests.
+    """
     # dont translate source language
     if target_language == source_lang:
-        return text
+        return list(texts)
+
+    keys = {text: _cache_key(text, source_lang, target_language) for text in texts}
+    cached = _cache_get_many(list(set(keys.values())))
+    translations = {text: cached[key] for text, key in keys.items() if key in cached}
+
+    missing = [text for text in keys if text not in translations]
+    batches = [
+        missing[i : i + settings.TRANSLATION_BATCH_SIZE]
+        for i in range(0, len(missing), settings.TRANSLATION_BATCH_SIZE)
+    ]
+    if batches:
+        with futures.ThreadPoolExecutor(
+            max_workers=min(settings.TRANSLATION_MAX_WORKERS, len(batches))
+        ) as executor:
+            for batch, translated in zip(
+                batches,
+                executor.map(
+                    lambda batch: _request_translations(
+                        batch, source_lang, target_language
+                    ),
+                    batches,
+                ),
+            ):
+                translations.update(zip(batch, translated))
+
+        _cache_set_many({keys[text]: translations[text] for text in missing})
+
+    return [translations[text] for text in texts]
+
+
+def _wait_quota():
+    """Waits for the quota to be renewed, called holding quota_lock"""
+    global quota_char, quota_resumed_at
+
+    time.sleep(quota_wait + 5)
+    print("Resuming after rate limit")
+    quota_char = 0
+    quota_resumed_at = time.monotonic()
+
+
+def _request_translations(texts, source_lang, target_language):
+    global quota_char
 
     data = {
-        "q": text,
+        "q": texts,
         "target": target_language,
         "format": "text",
         "source": source_lang,
@@ -30,13 +115,13 @@ def translate(text, source_lang, target_language):
 
     URL = f"https://translation.googleapis.com/language/translate/v2?key={settings.GOOGLE_API_TRANSLATION_KEY}"
 
-    quota_char += len(str(data))
-    if quota_char >= quota_limit:
-        print("Would hit rate limit - waiting %s seconds" % (quota_wait + 5))
-        time.sleep(quota_wait + 5)
-        print("Resuming after rate limit")
-        quota_char = 0
+    with quota_lock:
+        quota_char += len(str(data))
+        if quota_char >= quota_limit:
+            print("Would hit rate limit - waiting %s seconds" % (quota_wait + 5))
+            _wait_quota()
 
+    sent_at = time.monotonic()
     req = requests.post(URL, headers=headers, json=data)
     response = req.json()
 
@@ -45,10 +130,14 @@ def translate(text, source_lang, target_language):
         and "code" in response["error"]
         and response["error"]["code"] == 403
     ):
-        print("Rate limit hit - waiting %s seconds" % (quota_wait + 5))
-        time.sleep(quota_wait + 5)
-        quota_char = 0
-        print("Resuming after rate limit")
-        return translate(text, source_lang, target_language)
+        with quota_lock:
+            # Another worker already waited since this request was sent
+            if quota_resumed_at <= sent_at:
+                print("Rate limit hit - waiting %s seconds" % (quota_wait + 5))
+                _wait_quota()
+        return _request_translations(texts, source_lang, target_language)
 
-    return response.get("data").get("translations")[0].get("translatedText")
+    return [
+        translation.get("translatedText")
+        for translation in response.get("data").get("translations")
+    ]
@@ -1,10 +1,12 @@
-import io
+import codecs
+import json
 import math
 import random
 import re
 import string
+import threading
+import time
 import uuid
-import boto3
 import grpc
 import matplotlib.pyplot as plt
 import numpy as np
@@ -20,6 +22,8 @@ from django_filters import rest_framework as filters
 from rest_framework import status
 from rest_framework.exceptions import APIException, ValidationError
 
+from bothub.storage import get_storage
+
 
 entity_regex = re.compile(
     r"\[(?P<entity_text>[^\]]+)" r"\]\((?P<entity>[^:)]*?)" r"(?:\:(?P<value>[^)]+))?\)"
@@ -46,26 +50,11 @@ def send_bot_data_file_aws(id, bot_data):
     ):
         confmat_filename = f"repository_{str(id)}/bot_data_{uuid.uuid4()}.tar.gz"
 
-        botdata = io.BytesIO(bot_data)
-
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=settings.AWS_ACCESS_ENDPOINT_URL,
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION_NAME,
-        )
+        storage = get_storage()
         try:
-            s3_client.upload_fileobj(
-                botdata,
-                settings.AWS_BUCKET_NAME,
-                confmat_filename,
-                ExtraArgs={"ContentType": "application/gzip"},
-            )
-            confmat_url = "{}/{}/{}".format(
-                s3_client.meta.endpoint_url, settings.AWS_BUCKET_NAME, confmat_filename
-            )
-        except ClientError as e:
+            storage.upload(confmat_filename, bot_data, content_type="application/gzip")
+            confmat_url = storage.object_url(confmat_filename)
+        except (ClientError, OSError) as e:
             print(e)
 
     return confmat_url
@@ -126,6 +115,30 @@ def format_entity(text, entity, start, end):
     return text[0:start] + "[" + text[start:end] + "](" + entity + ")" + text[end:]
 
 
+def format_entities(text, entities):
+    """
+    Returns the text with all the ``entities`` (dicts with start, end and
+    entity) marked, built in one pass. Entities overlapping a previous one
+    can't be marked and are left out.
+    """
+    parts = []
+    position = 0
+    for entity in sorted(entities, key=lambda entity: entity["start"]):
+        if entity["start"] < position:
+            continue
+        parts += [
+            text[position : entity["start"]],
+            "[",
+            text[entity["start"] : entity["end"]],
+            "](",
+            entity["entity"],
+            ")",
+        ]
+        position = entity["end"]
+    parts.append(text[position:])
+    return "".join(parts)
+
+
 def find_entities_in_example(example):
     """Extracts entities from a markdown intent example."""
     entities = []
@@ -387,6 +400,118 @@ def get_user_and_organization(user_email: str, organization_id: int):
     return user, org
 
 
+class LocalLRUCache:
+    """
+    Small thread-safe in-process LRU cache whose entries expire after
+    ``timeout`` seconds. It sits in front of the shared django cache, so values
+    changed by another process are served stale for at most ``timeout`` seconds.
+    """
+
+    def __init__(self, maxsize: int, timeout: float):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0 or self.timeout <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def iter_json_array(chunks):
+    """
+    Yields the items of the JSON array read from ``chunks`` (str or utf-8
+    bytes, e.g. UploadedFile.chunks()) one at a time, without loading the
+    whole document. Raises json.JSONDecodeError for invalid documents.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+    end_of_input = False
+    expecting = "start"
+
+    while True:
+        position = _JSON_WHITESPACE.match(buffer, position).end()
+        needs_input = position == len(buffer)
+
+        if not needs_input:
+            char = buffer[position]
+            if expecting == "start":
+                if char != "[":
+                    raise json.JSONDecodeError("Expecting '['", buffer, position)
+                position += 1
+                expecting = "first"
+                continue
+            if expecting == "separator":
+                if char == "]":
+                    return
+                if char != ",":
+                    raise json.JSONDecodeError(
+                        "Expecting ',' delimiter", buffer, position
+                    )
+                position += 1
+                expecting = "item"
+                continue
+            if expecting == "first" and char == "]":
+                return
+
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if end_of_input:
+                    raise
+                item, end = None, None
+            # A value ending with the buffer could continue in the next chunk
+            if end is not None and (end < len(buffer) or end_of_input):
+                position = end
+                expecting = "separator"
+                yield item
+                continue
+            needs_input = True
+
+        if end_of_input:
+            raise json.JSONDecodeError("Unexpected end of the array", buffer, position)
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            end_of_input = True
+            chunk = text_decoder.decode(b"", final=True)
+        elif isinstance(chunk, bytes):
+            chunk = text_decoder.decode(chunk)
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
 class TimeBasedDocument(Document):
     def save(self, action="create", **kwargs):
         return super().save(action=action, **kwargs)
@@ -5,3 +5,11 @@ bind = "0.0.0.0:80"
 workers = os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1)
 worker_class = "gevent"
 raw_env = ["DJANGO_SETTINGS_MODULE=bothub.settings"]
+
+
+def on_starting(server):
+    # Load the tokenizers once in the master so every forked worker shares them
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "bothub.settings")
+    from bothub.common.helpers import preload_tokenizers
+
+    preload_tokenizers()